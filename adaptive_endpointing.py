@@ -0,0 +1,164 @@
+import os
+import time
+import dataclasses
+import logging
+from collections import deque
+from typing import Optional
+from prometheus_metrics import AGENT_ENDPOINTING_CUTOFFS, AGENT_ENDPOINTING_DELAY
+
+logger = logging.getLogger(__name__)
+
+# releases whose VoicePipelineAgent reads the delays from _opts and _deferred_validation, as _apply writes them
+ENDPOINTING_LIVEKIT_VERSIONS = ("0.12.",)
+
+
+def _quantile(values, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class AdaptiveEndpointing:
+    """
+    Tunes a session's endpointing delays to how long the user pauses mid-turn.
+
+    A pause is the silence between the point the pipeline starts counting its delay from (the VAD end
+    of speech, or the final transcript if it came first) and the user speaking again before the agent
+    answered. Speech resumed right after the agent started answering counts as a cut-off, and its
+    pause is recorded too.
+
+    Once `min_turns` turns have been seen, min_delay follows the `quantile` of recent pauses plus
+    `margin`. With the default quantile of 1.0 it stays above the longest recent pause, so only a
+    pause longer than any of those is taken for the end of the turn; it only drops below the starting
+    value after `min_pauses` pauses. Fast talkers are answered sooner and hesitant speakers get more
+    room. max_delay is used when the turn detector thinks the user is not done; it keeps headroom
+    above the longest pauses. Both delays stay within their bounds.
+    """
+    CUTOFF_WINDOW = 1.5
+
+    def __init__(
+        self,
+        min_delay: float = 0.5,
+        max_delay: float = 5.0,
+        min_bounds: tuple = None,
+        max_bounds: tuple = None,
+        quantile: float = None,
+        margin: float = None,
+        window: int = None,
+        min_turns: int = None,
+        min_pauses: int = None,
+    ):
+        self.default_min_delay = self.min_delay = min_delay
+        self.default_max_delay = self.max_delay = max_delay
+        self.min_bounds = min_bounds or (
+            float(os.getenv("ENDPOINTING_MIN_FLOOR", 0.2)), float(os.getenv("ENDPOINTING_MIN_CEILING", 1.5))
+        )
+        self.max_bounds = max_bounds or (
+            float(os.getenv("ENDPOINTING_MAX_FLOOR", 2.0)), float(os.getenv("ENDPOINTING_MAX_CEILING", 6.0))
+        )
+        self.quantile = quantile or float(os.getenv("ENDPOINTING_QUANTILE", 1.0))
+        self.margin = margin if margin is not None else float(os.getenv("ENDPOINTING_MARGIN", 0.1))
+        self.min_turns = min_turns or int(os.getenv("ENDPOINTING_MIN_TURNS", 3))
+        self.min_pauses = min_pauses if min_pauses is not None else int(os.getenv("ENDPOINTING_MIN_PAUSES", 8))
+        self.pauses = deque(maxlen=window or int(os.getenv("ENDPOINTING_WINDOW", 50)))
+        self.turns = 0
+        self.cutoffs = 0
+        self._stopped_at: Optional[float] = None
+        self._answered_at: Optional[float] = None
+        self._in_turn = False
+        self._agent = None
+
+    def on_user_stopped_speaking(self, now: float = None):
+        self._stopped_at = time.perf_counter() if now is None else now
+        self._in_turn = True
+
+    def on_user_started_speaking(self, now: float = None):
+        now = time.perf_counter() if now is None else now
+        if self._stopped_at is None:
+            return
+        pause = now - self._stopped_at
+        self._stopped_at = None
+        if self._answered_at is None:
+            self.pauses.append(pause)
+            self._update()
+        elif now - self._answered_at <= self.CUTOFF_WINDOW:
+            # the user was still talking: the last turn was closed too early
+            self.cutoffs += 1
+            AGENT_ENDPOINTING_CUTOFFS.inc()
+            self.pauses.append(pause)
+            self._update()
+        self._answered_at = None
+
+    def on_agent_started_speaking(self, now: float = None):
+        now = time.perf_counter() if now is None else now
+        if not self._in_turn:
+            return
+        self._answered_at = now
+        self._in_turn = False
+        self.turns += 1
+        self._update()
+
+    def _update(self):
+        if self.turns < self.min_turns:
+            return
+        longest = max(self.pauses, default=0.0)
+        low, high = self.min_bounds
+        pause = _quantile(self.pauses, self.quantile) if self.pauses else 0.0
+        if len(self.pauses) < self.min_pauses:
+            # too few pauses to tell a fast talker from a short sample
+            low = max(low, self.default_min_delay)
+        self.min_delay = round(min(high, max(low, pause + self.margin)), 3)
+        low, high = self.max_bounds
+        self.max_delay = round(min(high, max(low, self.min_delay * 2, longest * 1.5)), 3)
+        AGENT_ENDPOINTING_DELAY.labels("min").observe(self.min_delay)
+        AGENT_ENDPOINTING_DELAY.labels("max").observe(self.max_delay)
+        if self._agent is not None:
+            self._apply(self._agent)
+
+    def _apply(self, agent):
+        # VoicePipelineAgent reads these on every end of speech; its options are a frozen dataclass
+        agent._opts = dataclasses.replace(agent._opts, min_endpointing_delay=self.min_delay, max_endpointing_delay=self.max_delay)
+        validation = getattr(agent, "_deferred_validation", None)
+        if validation is not None:
+            validation._end_of_speech_delay = self.min_delay
+            validation._max_endpointing_delay = self.max_delay
+        logger.debug("endpointing delays set to %.3f/%.3f", self.min_delay, self.max_delay)
+
+    @staticmethod
+    def _delay_started(agent) -> float:
+        """
+        When the pipeline starts counting min_delay for this end of speech: at the final transcript if
+        it arrived during this stretch of speech, else now.
+        """
+        now = time.perf_counter()
+        validation = getattr(agent, "_deferred_validation", None)
+        transcript = getattr(validation, "_last_recv_transcript_time", 0.0)
+        if transcript > getattr(validation, "_last_recv_start_of_speech_time", 0.0):
+            return min(now, transcript)
+        return now
+
+    def attach(self, agent) -> bool:
+        """
+        Follow the VAD events of a VoicePipelineAgent and retune its endpointing delays.
+
+        Returns False, leaving the agent's delays fixed, on livekit-agents releases this was not checked against.
+        """
+        from livekit import agents
+
+        if not agents.__version__.startswith(ENDPOINTING_LIVEKIT_VERSIONS):
+            logger.warning("livekit-agents %s: adaptive endpointing disabled, delays stay fixed", agents.__version__)
+            return False
+        self._agent = agent
+        agent.on("user_stopped_speaking", lambda *_: self.on_user_stopped_speaking(self._delay_started(agent)))
+        agent.on("user_started_speaking", lambda *_: self.on_user_started_speaking())
+        agent.on("agent_started_speaking", lambda *_: self.on_agent_started_speaking())
+        return True
+
+    def report(self) -> dict:
+        return {
+            "min_delay": self.min_delay,
+            "max_delay": self.max_delay,
+            "turns": self.turns,
+            "pauses": len(self.pauses),
+            "cutoffs": self.cutoffs,
+        }
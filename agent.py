@@ -1,3 +1,5 @@
+import os
+import time
 import logging
 
 from dotenv import load_dotenv
@@ -11,12 +13,19 @@ from livekit.agents import (
     metrics,
 )
 from livekit.agents.pipeline import VoicePipelineAgent
+from prometheus_metrics import AGENT_GREETING_LATENCY, AgentMetricsRecorder, start_metrics_server
+from tts_cache import CachedTTS
+from chat_compaction import ChatCompactor
+from adaptive_endpointing import AdaptiveEndpointing
+from speculative_llm import SpeculativeReplies
+from agent_capacity import SessionCapacity
+from transcript_store import TranscriptRecorder, TranscriptStore
+from shared_models import load_models, process_memory, start_method, use_forkserver
 from livekit.plugins import (
     cartesia,
     google,
     deepgram,
     noise_cancellation,
-    silero,
     turn_detector,
 )
 
@@ -24,13 +33,53 @@ from livekit.plugins import (
 load_dotenv(dotenv_path=".env.local")
 logger = logging.getLogger("voice-agent")
 
+GREETING = "Hello, I'm FRIDAY. How may I assist you today?"
 
-def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
 
+class SessionTimer:
+    """
+    Records how long after job assignment each milestone of a session happens.
+    """
 
-async def entrypoint(ctx: JobContext):
-    initial_ctx = llm.ChatContext().append(
+    def __init__(self, session: str):
+        self.session = session
+        self.started = time.perf_counter()
+        self.marks: dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        if name not in self.marks:
+            self.marks[name] = round(time.perf_counter() - self.started, 3)
+
+    def report(self, greeting_cached: bool = False) -> dict:
+        report = dict(self.marks)
+        if "participant_joined" in report and "greeting_audio_out" in report:
+            report["greeting_after_participant"] = round(
+                report["greeting_audio_out"] - report["participant_joined"], 3
+            )
+        if "greeting_audio_out" in report:
+            AGENT_GREETING_LATENCY.labels("hit" if greeting_cached else "miss").observe(report["greeting_audio_out"])
+        logger.info(f"session timings for {self.session}: {report}")
+        return report
+
+
+def prewarm(proc: JobProcess):
+    started = time.perf_counter()
+    # loaded by the forkserver before this process was forked from it (the weights are shared), else here
+    proc.userdata["vad"] = load_models()["vad"]
+    # provider clients hold no connection until used, so they can be built before a job arrives
+    proc.userdata["stt"] = deepgram.STT()
+    proc.userdata["llm"] = google.LLM(model="gemini-2.0-flash",)
+    # fixed utterances such as the greeting are replayed from the shared synthesized-audio cache
+    proc.userdata["tts"] = CachedTTS(cartesia.TTS(), phrases=[GREETING])
+    proc.userdata["noise_cancellation"] = noise_cancellation.BVC()
+    # turns are written to the host's transcript database that the API searches
+    if os.getenv("TRANSCRIPTS_ENABLED", "1") != "0":
+        proc.userdata["transcripts"] = TranscriptStore()
+    logger.info(f"process prewarmed in {time.perf_counter() - started:.3f}s, memory {process_memory(os.getpid())}")
+
+
+def initial_chat_context() -> llm.ChatContext:
+    return llm.ChatContext().append(
         role="system",
         text=(
             "You are a voice assistant. Speak with the personality and tone of FRIDAY from the Iron Man movies: professional, efficient, polite, and slightly witty. "
@@ -46,47 +95,137 @@ async def entrypoint(ctx: JobContext):
         ),
     )
 
-    logger.info(f"connecting to room {ctx.room.name}")
-    await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
 
-    # Wait for the first participant to connect
-    participant = await ctx.wait_for_participant()
-    logger.info(f"starting voice assistant for participant {participant.identity}")
+def build_agent(userdata: dict, eou_model=None, speculative: bool = None, adaptive_endpointing: bool = None):
+    """
+    Assemble the voice pipeline from prewarmed providers; shared by entrypoint and the offline benchmarks.
+
+    Returns the agent with its chat compactor, adaptive endpointing controller and speculative
+    reply generator (None unless enabled with LLM_SPECULATION=1).
+    """
+    # old turns are folded into a rolling summary so the prompt stays bounded in long sessions
+    compactor = ChatCompactor(userdata["llm"])
+    before_llm_cb = compactor.before_llm_cb
+
+    # opt-in: the reply is requested from stable interim transcripts while endpointing is still pending
+    if speculative is None:
+        speculative = os.getenv("LLM_SPECULATION", "0") == "1"
+    speculation = SpeculativeReplies(compactor.before_llm_cb) if speculative else None
+    if speculation is not None:
+        before_llm_cb = speculation.before_llm_cb
+
+    # starting delays; retuned during the session from the user's own pauses
+    endpointing = AdaptiveEndpointing(min_delay=0.5, max_delay=5.0)
 
     agent = VoicePipelineAgent(
-        vad=ctx.proc.userdata["vad"],
-        stt=deepgram.STT(),
-        llm=google.LLM(model="gemini-2.0-flash",),
-        tts=cartesia.TTS(),
+        vad=userdata["vad"],
+        stt=userdata["stt"],
+        llm=userdata["llm"],
+        tts=userdata["tts"],
         # use LiveKit's transformer-based turn detector
-        turn_detector=turn_detector.EOUModel(),
+        turn_detector=eou_model,
         # minimum delay for endpointing, used when turn detector believes the user is done with their turn
-        min_endpointing_delay=0.5,
+        min_endpointing_delay=endpointing.min_delay,
         # maximum delay for endpointing, used when turn detector does not believe the user is done with their turn
-        max_endpointing_delay=5.0,
+        max_endpointing_delay=endpointing.max_delay,
         # enable background voice & noise cancellation, powered by Krisp
         # included at no additional cost with LiveKit Cloud
-        noise_cancellation=noise_cancellation.BVC(),
-        chat_ctx=initial_ctx,
+        noise_cancellation=userdata.get("noise_cancellation"),
+        chat_ctx=initial_chat_context(),
+        before_llm_cb=before_llm_cb,
     )
 
+    if adaptive_endpointing is None:
+        adaptive_endpointing = os.getenv("ENDPOINTING_ADAPTIVE", "1") != "0"
+    if adaptive_endpointing:
+        endpointing.attach(agent)
+    if speculation is not None:
+        speculation.attach(agent)
+    return agent, compactor, endpointing, speculation
+
+
+async def entrypoint(ctx: JobContext):
+    timer = SessionTimer(ctx.room.name)
+
+    logger.info(f"connecting to room {ctx.room.name}")
+    await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    timer.mark("room_connected")
+
+    # open the TTS websocket and attach the turn detector while the participant is still joining
+    tts = ctx.proc.userdata["tts"]
+    tts.prewarm()
+    eou_model = turn_detector.EOUModel()
+    greeting_cached = tts.is_cached(GREETING)
+
+    # Wait for the first participant to connect
+    participant = await ctx.wait_for_participant()
+    timer.mark("participant_joined")
+    logger.info(f"starting voice assistant for participant {participant.identity}")
+
+    agent, compactor, endpointing, speculation = build_agent(ctx.proc.userdata, eou_model)
+
+    transcript = None
+    if ctx.proc.userdata.get("transcripts") is not None:
+        transcript = TranscriptRecorder(ctx.proc.userdata["transcripts"], ctx.job.id, participant.identity, ctx.room.name)
+        transcript.attach(agent)
+        await transcript.start()
+
+    async def on_shutdown():
+        if transcript is not None:
+            await transcript.aclose()
+        await compactor.aclose()
+        logger.info(f"endpointing for {ctx.room.name}: {endpointing.report()}")
+        if speculation is not None:
+            await speculation.aclose()
+            logger.info(f"llm speculation for {ctx.room.name}: {speculation.report()}")
+
+    ctx.add_shutdown_callback(on_shutdown)
+
     usage_collector = metrics.UsageCollector()
+    metrics_recorder = AgentMetricsRecorder()
 
     @agent.on("metrics_collected")
     def on_metrics_collected(agent_metrics: metrics.AgentMetrics):
         metrics.log_metrics(agent_metrics)
         usage_collector.collect(agent_metrics)
+        metrics_recorder.record(agent_metrics)
+
+    @agent.once("agent_started_speaking")
+    def on_greeting_audio_out():
+        timer.mark("greeting_audio_out")
+        timer.report(greeting_cached)
 
     agent.start(ctx.room, participant)
 
     # The agent should be polite and greet the user when it joins :)
-    await agent.say("Hello, I'm FRIDAY. How may I assist you today?", allow_interruptions=True)
+    await agent.say(GREETING, allow_interruptions=True)
+
+
+def worker_options() -> WorkerOptions:
+    options = {}
+    # set by the agent worker pool so that every worker gets its own health-check port
+    if os.getenv("AGENT_HTTP_PORT"):
+        options["port"] = int(os.getenv("AGENT_HTTP_PORT"))
+    if os.getenv("AGENT_IDLE_PROCESSES"):
+        options["num_idle_processes"] = int(os.getenv("AGENT_IDLE_PROCESSES"))
+    # load follows sessions and their measured CPU, and jobs that would overload the worker are passed on
+    capacity = SessionCapacity()
+    logger.info(f"worker capacity: {capacity.report()}")
+    return WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        request_fnc=capacity.request_fnc,
+        load_fnc=capacity.load,
+        load_threshold=capacity.threshold,
+        **options,
+    )
 
 
 if __name__ == "__main__":
-    cli.run_app(
-        WorkerOptions(
-            entrypoint_fnc=entrypoint,
-            prewarm_fnc=prewarm,
-        ),
-    )
+    # job processes record into PROMETHEUS_MULTIPROC_DIR; the worker process serves the aggregate
+    if os.getenv("AGENT_METRICS_PORT"):
+        start_metrics_server(int(os.getenv("AGENT_METRICS_PORT")))
+    # job processes fork from a process that already imported this module and loaded the models
+    if start_method() == "forkserver":
+        use_forkserver(("__main__", "shared_models"))
+    cli.run_app(worker_options())
@@ -0,0 +1,128 @@
+import os
+import time
+import logging
+import threading
+import psutil
+from livekit.agents import JobRequest
+from livekit.agents.utils.hw import get_cpu_monitor
+from prometheus_metrics import AGENT_JOB_REQUESTS, AGENT_SESSION_CPU, AGENT_WORKER_LOAD
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCapacity:
+    """
+    Reports an agent worker's load from its sessions and their measured CPU cost, and admits jobs against it.
+
+    load = sessions x CPU per session / cores, where sessions counts running jobs plus jobs accepted
+    but not started yet, and CPU per session is a moving average of what job processes actually use
+    (seeded with `session_cpu`). With `max_sessions` set, the session count is also capped directly.
+
+    The worker stops receiving jobs once the load reaches `threshold`, but it only reports its load
+    every few seconds; `request_fnc` therefore also rejects a job, so LiveKit offers it to another
+    worker, when accepting it would push the projected load past `threshold`.
+    """
+    def __init__(
+        self,
+        cores: float = None,
+        session_cpu: float = None,
+        threshold: float = None,
+        max_sessions: int = None,
+        smoothing: float = 0.3,
+        warmup: float = 10.0,
+        reservation_ttl: float = 15.0,
+    ):
+        self.cores = cores or float(os.getenv("AGENT_WORKER_CORES") or 0) or get_cpu_monitor().cpu_count()
+        self.session_cpu = session_cpu or float(os.getenv("AGENT_SESSION_CPU", 0.1))
+        self.threshold = threshold or float(os.getenv("AGENT_LOAD_THRESHOLD", 0.75))
+        self.max_sessions = max_sessions if max_sessions is not None else int(os.getenv("AGENT_MAX_SESSIONS", 0))
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.reservation_ttl = reservation_ttl
+        self.running = 0
+        self._lock = threading.Lock()
+        self._reserved = {}
+        self._first_seen = {}
+        self._cpu_times = {}
+
+    def projected_load(self, sessions: int) -> float:
+        load = sessions * self.session_cpu / self.cores
+        if self.max_sessions:
+            load = max(load, sessions / self.max_sessions)
+        return round(load, 3)
+
+    def load(self, worker) -> float:
+        """
+        WorkerOptions.load_fnc; runs in an executor thread of the worker process.
+        """
+        now = time.monotonic()
+        running = [proc for proc in worker._proc_pool.processes if proc.running_job]
+        job_ids = {proc.running_job.job.id for proc in running}
+        self._sample(running, now)
+        with self._lock:
+            self.running = len(running)
+            self._reserved = {
+                job_id: expires for job_id, expires in self._reserved.items()
+                if job_id not in job_ids and expires > now
+            }
+            load = self.projected_load(self.running + len(self._reserved))
+        AGENT_WORKER_LOAD.set(load)
+        return load
+
+    def _sample(self, running: list, now: float):
+        usages = []
+        for proc in running:
+            job_id = proc.running_job.job.id
+            self._first_seen.setdefault(job_id, now)
+            pid = getattr(proc, "pid", None)
+            if pid is None:
+                # thread executors run inside the worker process and cannot be measured apart
+                continue
+            try:
+                cpu_times = psutil.Process(pid).cpu_times()
+            except psutil.Error:
+                continue
+            cpu = cpu_times.user + cpu_times.system
+            previous = self._cpu_times.get(pid)
+            self._cpu_times[pid] = (cpu, now)
+            # a session waiting for its participant costs little; only settled sessions update the estimate
+            if previous and now > previous[1] and now - self._first_seen[job_id] >= self.warmup:
+                usages.append((cpu - previous[0]) / (now - previous[1]))
+
+        live_pids = {getattr(proc, "pid", None) for proc in running}
+        live_jobs = {proc.running_job.job.id for proc in running}
+        self._cpu_times = {pid: sample for pid, sample in self._cpu_times.items() if pid in live_pids}
+        self._first_seen = {job_id: seen for job_id, seen in self._first_seen.items() if job_id in live_jobs}
+        if usages:
+            measured = sum(usages) / len(usages)
+            self.session_cpu += self.smoothing * (measured - self.session_cpu)
+            AGENT_SESSION_CPU.set(self.session_cpu)
+
+    async def request_fnc(self, req: JobRequest):
+        """
+        WorkerOptions.request_fnc; rejects jobs that would overload this worker so they go elsewhere.
+        """
+        with self._lock:
+            sessions = self.running + len(self._reserved)
+            load = self.projected_load(sessions + 1)
+            admit = sessions == 0 or load <= self.threshold
+            if admit:
+                self._reserved[req.job.id] = time.monotonic() + self.reservation_ttl
+        if not admit:
+            AGENT_JOB_REQUESTS.labels("rejected").inc()
+            logger.info(f"rejecting job {req.job.id}: projected load {load} with {sessions} sessions")
+            await req.reject()
+            return
+        AGENT_JOB_REQUESTS.labels("accepted").inc()
+        await req.accept()
+
+    def report(self) -> dict:
+        return {
+            "cores": self.cores,
+            "session_cpu": round(self.session_cpu, 4),
+            "running": self.running,
+            "reserved": len(self._reserved),
+            "threshold": self.threshold,
+            "max_sessions": self.max_sessions,
+            "sessions_at_threshold": int(self.threshold * self.cores / self.session_cpu),
+        }
@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import signal
+import asyncio
+import logging
+from typing import Optional
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+from shared_models import memory_report
+
+load_dotenv(dotenv_path=".env.local")
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATUS_HOST = os.getenv("AGENT_POOL_STATUS_HOST", "127.0.0.1")
+STATUS_PORT = int(os.getenv("AGENT_POOL_STATUS_PORT", 8080))
+
+
+class AgentWorker:
+    """
+    State of one supervised agent.py process slot.
+    """
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at: Optional[float] = None
+        self.restarts = 0
+        self.last_exit_code: Optional[int] = None
+        self.healthy = False
+        self.health_failures = 0
+        self.backoff = 0.0
+        self.metrics_port: Optional[int] = None
+        self.memory: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def status(self) -> dict:
+        return {
+            "index": self.index,
+            "pid": self.process.pid if self.running else None,
+            "port": self.port,
+            "metrics_port": self.metrics_port,
+            "running": self.running,
+            "healthy": self.healthy,
+            "restarts": self.restarts,
+            "uptime": round(time.monotonic() - self.started_at, 1) if self.running and self.started_at else None,
+            "last_exit_code": self.last_exit_code,
+            "next_restart_in": round(self.backoff, 1) if not self.running and self.backoff else None,
+            "memory": self.memory if self.running else None,
+        }
+
+
+class AgentWorkerPool:
+    """
+    Supervises a pool of agent.py worker processes.
+
+    Launches `size` workers (defaults to the core count), each with its own health-check port,
+    polls their HTTP health endpoint, restarts crashed or unresponsive workers with exponential
+    backoff and drains them with SIGTERM on stop().
+    """
+    def __init__(self, size: int = None, mode: str = None, base_port: int = None, command: list = None):
+        self.size = size if size is not None else int(os.getenv("AGENT_POOL_SIZE") or os.cpu_count() or 1)
+        self.mode = mode or os.getenv("AGENT_MODE", "start")
+        self.base_port = base_port or int(os.getenv("AGENT_BASE_PORT", 8081))
+        self.metrics_base_port = int(os.getenv("AGENT_METRICS_BASE_PORT", 0))
+        self.metrics_dir = os.getenv("AGENT_METRICS_DIR") or os.path.join(tempfile.gettempdir(), "jarvis-agent-metrics")
+        self.drain_timeout = float(os.getenv("AGENT_DRAIN_TIMEOUT", 60))
+        self.health_interval = float(os.getenv("AGENT_HEALTH_INTERVAL", 5))
+        self.health_grace = float(os.getenv("AGENT_HEALTH_GRACE", 30))
+        self.max_health_failures = int(os.getenv("AGENT_MAX_HEALTH_FAILURES", 3))
+        self.min_backoff = float(os.getenv("AGENT_RESTART_BACKOFF", 1))
+        self.max_backoff = float(os.getenv("AGENT_RESTART_MAX_BACKOFF", 60))
+        self.stable_after = float(os.getenv("AGENT_STABLE_AFTER", 30))
+        self.memory_interval = float(os.getenv("AGENT_POOL_MEMORY_INTERVAL", 5))
+        self.command = command or [sys.executable, os.path.join(BASE_DIR, "agent.py"), self.mode]
+        if self.mode == "start" and command is None:
+            self.command += ["--drain-timeout", str(int(self.drain_timeout))]
+        self.workers = [AgentWorker(i, self.base_port + i) for i in range(self.size)]
+        self._stopping = False
+        self._tasks = []
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._memory_at: Optional[float] = None
+
+    async def start(self):
+        """
+        Launch every worker and start the supervision and health-check loops.
+        """
+        self._stopping = False
+        self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2))
+        self._tasks = [asyncio.create_task(self._supervise(worker)) for worker in self.workers]
+        self._tasks.append(asyncio.create_task(self._health_loop()))
+        logger.info("Agent worker pool started with %d workers (%s)", self.size, " ".join(self.command))
+
+    async def _spawn(self, worker: AgentWorker):
+        env = dict(os.environ, AGENT_HTTP_PORT=str(worker.port), AGENT_WORKER_INDEX=str(worker.index))
+        # the workers share the host, so each one sizes its capacity to its share of the cores
+        env.setdefault("AGENT_WORKER_CORES", str(round((os.cpu_count() or 1) / self.size, 3)))
+        if self.metrics_base_port:
+            # each worker aggregates its own job processes; stale files from a previous run are wiped
+            worker_metrics_dir = os.path.join(self.metrics_dir, str(worker.index))
+            shutil.rmtree(worker_metrics_dir, ignore_errors=True)
+            os.makedirs(worker_metrics_dir)
+            env["PROMETHEUS_MULTIPROC_DIR"] = worker_metrics_dir
+            env["AGENT_METRICS_PORT"] = str(self.metrics_base_port + worker.index)
+            worker.metrics_port = self.metrics_base_port + worker.index
+        worker.process = await asyncio.create_subprocess_exec(*self.command, cwd=BASE_DIR, env=env)
+        worker.started_at = time.monotonic()
+        worker.healthy = False
+        worker.health_failures = 0
+        worker.memory = None
+        logger.info("Agent worker %d started (pid %d, port %d)", worker.index, worker.process.pid, worker.port)
+
+    async def _supervise(self, worker: AgentWorker):
+        while not self._stopping:
+            try:
+                await self._spawn(worker)
+            except Exception as e:
+                logger.error("Failed to start agent worker %d: %s", worker.index, e)
+            else:
+                worker.last_exit_code = await worker.process.wait()
+                worker.healthy = False
+                if self._stopping:
+                    return
+                logger.warning("Agent worker %d exited with code %s", worker.index, worker.last_exit_code)
+                if time.monotonic() - worker.started_at >= self.stable_after:
+                    worker.backoff = 0.0
+            worker.backoff = min(self.max_backoff, worker.backoff * 2) if worker.backoff else self.min_backoff
+            worker.restarts += 1
+            logger.info("Restarting agent worker %d in %.1fs", worker.index, worker.backoff)
+            await asyncio.sleep(worker.backoff)
+
+    async def _health_loop(self):
+        while not self._stopping:
+            await asyncio.gather(*(self._check(worker) for worker in self.workers if worker.running))
+            await asyncio.sleep(self.health_interval)
+
+    async def _check(self, worker: AgentWorker):
+        try:
+            async with self._http.get(f"http://127.0.0.1:{worker.port}/") as response:
+                worker.healthy = response.status == 200
+        except Exception:
+            worker.healthy = False
+        if worker.healthy:
+            worker.health_failures = 0
+            return
+        if time.monotonic() - worker.started_at < self.health_grace:
+            return
+        worker.health_failures += 1
+        if worker.health_failures >= self.max_health_failures and worker.running:
+            logger.error("Agent worker %d failed %d health checks, killing it", worker.index, worker.health_failures)
+            worker.process.kill()
+
+    async def measure_memory(self):
+        """
+        Refresh the workers' memory reports in a thread, at most every memory_interval seconds unless
+        a worker was (re)started: memory_report() reads the smaps of every process under a worker.
+        """
+        running = [worker for worker in self.workers if worker.running]
+        fresh = self._memory_at is not None and time.monotonic() - self._memory_at < self.memory_interval
+        if fresh and all(worker.memory is not None for worker in running):
+            return
+        self._memory_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        reports = await asyncio.gather(*(
+            loop.run_in_executor(None, memory_report, worker.process.pid) for worker in running
+        ))
+        for worker, report in zip(running, reports):
+            worker.memory = report
+
+    def status(self) -> dict:
+        workers = [worker.status() for worker in self.workers]
+        return {
+            "size": self.size,
+            "mode": self.mode,
+            "running": sum(1 for w in workers if w["running"]),
+            "healthy": sum(1 for w in workers if w["healthy"]),
+            "total_pss_mb": round(sum(w["memory"].get("total_pss_mb", 0) for w in workers if w["memory"]), 1),
+            "workers": workers,
+        }
+
+    async def stop(self):
+        """
+        Drain every worker with SIGTERM, killing any that outlive the drain timeout.
+        """
+        self._stopping = True
+        running = [worker for worker in self.workers if worker.running]
+        for worker in running:
+            worker.process.send_signal(signal.SIGTERM)
+        if running:
+            logger.info("Draining %d agent workers (timeout %.0fs)", len(running), self.drain_timeout)
+            await asyncio.wait(
+                [asyncio.create_task(worker.process.wait()) for worker in running],
+                timeout=self.drain_timeout + 5,
+            )
+            for worker in running:
+                if worker.running:
+                    logger.warning("Agent worker %d did not drain in time, killing it", worker.index)
+                    worker.process.kill()
+                    await worker.process.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http:
+            await self._http.close()
+            self._http = None
+        logger.info("Agent worker pool stopped")
+
+
+async def serve_status(pool: AgentWorkerPool, host: str = STATUS_HOST, port: int = STATUS_PORT) -> web.AppRunner:
+    """
+    Serve pool.status() as JSON at GET /status; the API's /agents/status proxies to it.
+    """
+    async def status(request: web.Request) -> web.Response:
+        await pool.measure_memory()
+        return web.json_response(pool.status())
+
+    status_app = web.Application()
+    status_app.router.add_get("/status", status)
+    runner = web.AppRunner(status_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def run_pool():
+    """
+    Supervise the agent workers until SIGTERM or SIGINT, then drain them.
+
+    The pool owns host-wide resources (the workers' health and metrics ports and metrics
+    directories), so exactly one supervisor runs per host, separately from the API workers.
+    """
+    pool = AgentWorkerPool()
+    runner = await serve_status(pool)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await pool.start()
+    logger.info("Agent pool status at http://%s:%d/status", STATUS_HOST, STATUS_PORT)
+    await stop.wait()
+    await pool.stop()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_pool())
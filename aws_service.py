@@ -1,94 +1,448 @@
 from dotenv import load_dotenv
 import os
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+import asyncio
+import posixpath
+import logging
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Iterable, Optional
+from aiobotocore.session import get_session
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from ttl_cache import TTLCache
+from prometheus_metrics import observe_call
 
 load_dotenv(dotenv_path=".env.local")
 
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
+logger = logging.getLogger(__name__)
 
-def get_all_files(user_id: str) -> list:
+S3_MAX_PAGE_SIZE = 1000
+RECORDING_TYPES = {".mp4": "mp4", ".ogg": "ogg", ".m3u8": "hls"}
+# a segmented recording keeps its playlist and segments under sessions/{user_id}/<recording>.hls/
+HLS_DIRECTORY_SUFFIX = ".hls/"
+
+
+def validate_file_key(file_key: str):
+    """
+    Raise ValueError unless file_key is a non-empty key inside the sessions directory.
+    """
+    if not file_key or not isinstance(file_key, str):
+        raise ValueError("Invalid file key provided")
+
+    if not file_key.startswith('sessions/'):
+        raise ValueError("File key must be in the sessions directory")
+
+
+def recording_type(key: str) -> Optional[str]:
+    """
+    Type of the recording stored under key (mp4, ogg or hls for a segmented recording's playlist), or None.
+    """
+    for suffix, file_type in RECORDING_TYPES.items():
+        if key.endswith(suffix):
+            return file_type
+    return None
+
+
+def hls_directory(filepath: str) -> str:
+    """
+    Prefix holding the playlist and segments of the segmented recording at filepath (no extension).
+    """
+    return filepath + HLS_DIRECTORY_SUFFIX
+
+
+def hls_playlist_key(directory: str) -> str:
     """
-    List all files in the specified S3 bucket for a given user.
-    Uses pagination to handle large numbers of objects and properly formats the user prefix.
+    Playlist key of the segmented recording stored under directory, as returned by hls_directory().
     """
+    return directory + posixpath.basename(directory[:-len(HLS_DIRECTORY_SUFFIX)]) + ".m3u8"
+
+
+def recording_entry(obj: dict, types: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """
+    Build a listing entry (key, size, last_modified, type) from a list_objects_v2 item, or None if it is not a
+    recording (HLS segments are not; their playlist is) or not one of `types`.
+    """
+    key = obj["Key"]
+    file_type = recording_type(key)
+    if not file_type or (types and file_type not in types):
+        return None
+    last_modified = obj.get("LastModified")
+    return {
+        "key": key,
+        "size": obj.get("Size"),
+        "last_modified": last_modified.isoformat() if last_modified else None,
+        "type": file_type,
+    }
+
+
+def playlist_entry(prefix: str, types: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """
+    Build the listing entry of a segmented recording from the common prefix of its directory, or None if
+    the prefix is not one. Its segments are never listed, so size and last_modified are unknown.
+    """
+    if not prefix.endswith(HLS_DIRECTORY_SUFFIX) or (types and "hls" not in types):
+        return None
+    return {"key": hls_playlist_key(prefix), "size": None, "last_modified": None, "type": "hls"}
+
+
+def _http_date(value: Optional[str]):
+    """
+    Parse an HTTP date header, or None if it is missing or malformed.
+    """
+    if not value:
+        return None
     try:
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class S3Session:
+    """
+    Manages S3 access for recorded sessions: list and sign.
 
-        paginator = s3.get_paginator('list_objects_v2')
-        
-        user_prefix = f"sessions/{user_id}/"
-        
-        page_iterator = paginator.paginate(
-            Bucket=AWS_BUCKET_NAME,
-            Prefix=user_prefix
+    Opens a single pooled, keep-alive aiobotocore client in open() and reuses it until close().
+    Set AWS_ENDPOINT_URL to point it at a local S3 stand-in such as moto server.
+    Per-user listings are cached in listing_cache until their TTL expires or invalidate_user() is called;
+    after a stop, expect_recording() caches them only briefly until the upload can have landed.
+    Presigned URLs are cached in url_cache and handed out again until S3_URL_REFRESH_MARGIN seconds before expiry.
+    """
+    def __init__(self):
+        self.bucket = os.getenv("AWS_BUCKET_NAME")
+        self.default_expiration = int(os.getenv("S3_URL_EXPIRATION", 3600))
+        self._client_kwargs = {
+            "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+            "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+            "region_name": os.getenv("AWS_REGION"),
+            "endpoint_url": os.getenv("AWS_ENDPOINT_URL") or None,
+        }
+        self._config = AioConfig(
+            max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", 50)),
+            tcp_keepalive=True,
+            connector_args={"keepalive_timeout": float(os.getenv("S3_KEEPALIVE_TIMEOUT", 60))},
+            retries={"max_attempts": 3, "mode": "standard"},
         )
+        self.listing_cache = TTLCache(
+            maxsize=int(os.getenv("S3_LIST_CACHE_SIZE", 1024)),
+            ttl=float(os.getenv("S3_LIST_CACHE_TTL", 30)),
+        )
+        self.upload_ttl = float(os.getenv("S3_LIST_UPLOAD_TTL", 5))
+        self.upload_window = float(os.getenv("S3_LIST_UPLOAD_WINDOW", 120))
+        self.url_cache = TTLCache(maxsize=int(os.getenv("S3_URL_CACHE_SIZE", 10000)))
+        self.url_refresh_margin = float(os.getenv("S3_URL_REFRESH_MARGIN", 300))
+        self._open_lock = asyncio.Lock()
+        self._exit_stack = None
+        self.s3 = None
+
+    async def open(self):
+        """
+        Create the shared S3 client. Safe to call more than once.
+        """
+        if self.s3 is not None:
+            return
+        async with self._open_lock:
+            if self.s3 is not None:
+                return
+            exit_stack = AsyncExitStack()
+            self.s3 = await exit_stack.enter_async_context(
+                get_session().create_client("s3", config=self._config, **self._client_kwargs)
+            )
+            self._exit_stack = exit_stack
+        logger.info("S3 client opened (max_pool_connections=%s)", self._config.max_pool_connections)
+
+    async def get_all_files(self, user_id: str, types: Optional[Iterable[str]] = None) -> list:
+        """
+        List all files in the specified S3 bucket for a given user, optionally only recordings of the given types.
+        Served from the listing cache when possible; concurrent misses share one S3 listing.
+        """
+        files = await self.listing_cache.get_or_load(user_id, lambda: self._list_files(user_id))
+        if types:
+            return [key for key in files if recording_type(key) in types]
+        return list(files)
+
+    def invalidate_user(self, user_id: str):
+        """
+        Drop the cached listing for a user so the next /list call reads S3 again.
+        """
+        self.listing_cache.invalidate(user_id)
+        logger.debug("Listing cache invalidated for user %s", user_id)
+
+    def expect_recording(self, user_id: str):
+        """
+        A recording of the user was stopped and egress is still uploading it: for the next
+        S3_LIST_UPLOAD_WINDOW seconds, cache the user's listing for at most S3_LIST_UPLOAD_TTL seconds.
+        """
+        self.listing_cache.limit_ttl(user_id, self.upload_ttl, self.upload_window)
+
+    def invalidate_key(self, file_key: str):
+        """
+        Invalidate the listing of the user owning a sessions/{user_id}/... object key.
+        """
+        parts = file_key.split("/")
+        if len(parts) >= 3 and parts[0] == "sessions" and parts[1]:
+            self.invalidate_user(parts[1])
 
+    async def _list_files(self, user_id: str) -> list:
         file_list = []
-        for page in page_iterator:
-            if 'Contents' in page:
-                for obj in page['Contents']:
-                    if obj['Key'].endswith('.mp4') or obj['Key'].endswith('.ogg'):
-                        file_list.append(obj['Key'])
-        
+        async for entry in self.iter_files(user_id):
+            file_list.append(entry["key"])
         return file_list
 
-    except (NoCredentialsError, PartialCredentialsError) as e:
-        raise Exception(f"Credentials error: {e}")
-    except Exception as e:
-        raise Exception(f"Error listing files: {e}")
+    async def iter_files(self, user_id: str, cursor: Optional[str] = None, types: Optional[Iterable[str]] = None) -> AsyncIterator[dict]:
+        """
+        Yield recording entries for a user page by page as S3 returns them, without collecting the full listing.
+        """
+        next_cursor = cursor
+        while True:
+            entries, next_cursor = await self._list_page(user_id, S3_MAX_PAGE_SIZE, next_cursor, types)
+            for entry in entries:
+                yield entry
+            if not next_cursor:
+                return
 
-def get_file_url(file_key: str, expiration: int = None) -> str:
-    try:
-        if not file_key or not isinstance(file_key, str):
-            raise ValueError("Invalid file key provided")
-            
-        if not file_key.startswith('sessions/'):
-            raise ValueError("File key must be in the sessions directory")
-
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
+    async def list_files_page(self, user_id: str, limit: int = 100, cursor: Optional[str] = None,
+                              types: Optional[Iterable[str]] = None) -> dict:
+        """
+        Return up to `limit` recording entries for a user plus the cursor of the next page (None when done).
+        """
+        recordings = []
+        next_cursor = cursor
+        while len(recordings) < limit:
+            entries, next_cursor = await self._list_page(user_id, limit - len(recordings), next_cursor, types)
+            recordings.extend(entries)
+            if not next_cursor:
+                break
+        return {"recordings": recordings, "next_cursor": next_cursor}
 
-        default_expiration = int(os.getenv("S3_URL_EXPIRATION", 3600))
-        url_expiration = expiration if expiration is not None else default_expiration
-        url = s3.generate_presigned_url(
-            ClientMethod='get_object',
-            Params={
-                'Bucket': AWS_BUCKET_NAME,
-                'Key': file_key
-            },
-            ExpiresIn=url_expiration,
-            HttpMethod='GET'
-        )
+    async def _list_page(self, user_id: str, max_keys: int, cursor: Optional[str], types: Optional[Iterable[str]] = None) -> tuple:
+        """
+        Fetch one list_objects_v2 page under the user prefix and keep only recordings.
+        Scanning at most max_keys objects means no matching entry is skipped when the page is cut short.
+        The "/" delimiter folds each segmented recording's directory into one common prefix, so its
+        segments are never scanned.
+        """
+        try:
+            await self.open()
+            params = {
+                "Bucket": self.bucket,
+                "Prefix": f"sessions/{user_id}/",
+                "Delimiter": "/",
+                "MaxKeys": max_keys,
+            }
+            if cursor:
+                params["ContinuationToken"] = cursor
+            async with observe_call("s3", "list_objects_v2"):
+                page = await self.s3.list_objects_v2(**params)
 
-        return url
+            entries = [recording_entry(obj, types) for obj in page.get('Contents', [])]
+            entries.extend(playlist_entry(prefix["Prefix"], types) for prefix in page.get("CommonPrefixes", []))
+            entries = sorted(filter(None, entries), key=lambda entry: entry["key"])
+            next_cursor = page.get("NextContinuationToken") if page.get("IsTruncated") else None
+            return entries, next_cursor
 
-    except (NoCredentialsError, PartialCredentialsError) as e:
-        raise Exception(f"AWS credential error: {str(e)}") from e
-    except ValueError as ve:
-        raise ve
-    except Exception as e:
-        raise Exception(f"Failed to generate URL: {str(e)}") from e
+        except (NoCredentialsError, PartialCredentialsError) as e:
+            raise Exception(f"Credentials error: {e}")
+        except Exception as e:
+            raise Exception(f"Error listing files: {e}")
 
-if __name__ == "__main__":
+    async def get_file_url(self, file_key: str, expiration: int = None) -> str:
+        """
+        Return a presigned GET URL for a recording, reusing a previously issued URL until it is close to expiry.
+        """
+        try:
+            validate_file_key(file_key)
+            url_expiration = expiration if expiration is not None else self.default_expiration
+            reuse_for = url_expiration - min(self.url_refresh_margin, url_expiration / 2)
+            return await self.url_cache.get_or_load(
+                (file_key, url_expiration),
+                lambda: self._sign_url(file_key, url_expiration),
+                ttl=reuse_for,
+            )
+
+        except (NoCredentialsError, PartialCredentialsError) as e:
+            raise Exception(f"AWS credential error: {str(e)}") from e
+        except ValueError as ve:
+            raise ve
+        except Exception as e:
+            raise Exception(f"Failed to generate URL: {str(e)}") from e
+
+    async def get_file_urls(self, file_keys: list, expiration: int = None) -> dict:
+        """
+        Presign many recording keys at once. Invalid keys are reported per key instead of failing the batch.
+        """
+        urls = {}
+        errors = {}
+        for file_key in dict.fromkeys(file_keys):
+            try:
+                urls[file_key] = await self.get_file_url(file_key, expiration)
+            except ValueError as ve:
+                errors[file_key] = str(ve)
+        return {"urls": urls, "errors": errors}
+
+    async def get_signed_playlist(self, file_key: str, expiration: int = None) -> Optional[str]:
+        """
+        Return an HLS playlist with each segment URI replaced by a presigned URL, or None if it does not exist.
+
+        Segment URIs are relative to the playlist, which a presigned playlist URL cannot serve from a private bucket.
+        The playlist is read on every call because egress rewrites it after each segment; segment URLs come from url_cache.
+        """
+        if recording_type(file_key) != "hls":
+            raise ValueError("File key is not an HLS playlist")
+        data = await self.get_object(file_key)
+        if data is None:
+            return None
+        lines = []
+        for line in data.decode("utf-8").splitlines():
+            if line.strip() and not line.startswith("#") and "://" not in line:
+                segment_key = posixpath.normpath(posixpath.join(posixpath.dirname(file_key), line.strip()))
+                # only segments next to the playlist are signed
+                if posixpath.dirname(segment_key) == posixpath.dirname(file_key):
+                    line = await self.get_file_url(segment_key, expiration)
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    async def _sign_url(self, file_key: str, url_expiration: int) -> str:
+        await self.open()
+        async with observe_call("s3", "generate_presigned_url"):
+            return await self.s3.generate_presigned_url(
+                ClientMethod='get_object',
+                Params={
+                    'Bucket': self.bucket,
+                    'Key': file_key
+                },
+                ExpiresIn=url_expiration,
+                HttpMethod='GET'
+            )
+
+    async def head_object(self, file_key: str) -> Optional[dict]:
+        """
+        Return size, content type and ETag of an object in the sessions directory, or None if it does not exist.
+        """
+        validate_file_key(file_key)
+        await self.open()
+        try:
+            async with observe_call("s3", "head_object"):
+                head = await self.s3.head_object(Bucket=self.bucket, Key=file_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {"size": head["ContentLength"], "content_type": head.get("ContentType"), "etag": head.get("ETag")}
+
+    async def read_range(self, file_key: str, start: int, end: int) -> bytes:
+        """
+        Read bytes start..end (inclusive) of an object with a ranged GET.
+        """
+        validate_file_key(file_key)
+        await self.open()
+        async with observe_call("s3", "get_object_range"):
+            response = await self.s3.get_object(Bucket=self.bucket, Key=file_key, Range=f"bytes={start}-{end}")
+            async with response["Body"] as body:
+                return await body.read()
+
+    async def open_stream(self, file_key: str, byte_range: str = None, if_none_match: str = None,
+                          if_modified_since: str = None, if_range: str = None) -> Optional[dict]:
+        """
+        Start a GET of an object to proxy it. S3 evaluates the range and the conditional headers.
+
+        Returns {"status", "headers", "body"} with status 200, 206, 304 or 416, or None if the object does not exist.
+        body is the open StreamingBody for 200/206 (None otherwise) and must be closed by the caller.
+        A range whose If-Range validator no longer matches is dropped and the whole object is returned.
+        """
+        validate_file_key(file_key)
+        await self.open()
+        params = {"Bucket": self.bucket, "Key": file_key}
+        if if_none_match:
+            params["IfNoneMatch"] = if_none_match
+        elif _http_date(if_modified_since):
+            # If-Modified-Since is ignored when If-None-Match is present (RFC 9110)
+            params["IfModifiedSince"] = _http_date(if_modified_since)
+        if byte_range and if_range:
+            if if_range.startswith('"'):
+                params["IfMatch"] = if_range
+            elif _http_date(if_range):
+                params["IfUnmodifiedSince"] = _http_date(if_range)
+            else:
+                # weak or malformed validators never match
+                byte_range = None
+        if byte_range:
+            params["Range"] = byte_range
+        try:
+            async with observe_call("s3", "get_object_stream"):
+                response = await self.s3.get_object(**params)
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            code = error.get("Code")
+            if code in ("NoSuchKey", "404"):
+                return None
+            if code in ("304", "NotModified"):
+                etag = e.response.get("ResponseMetadata", {}).get("HTTPHeaders", {}).get("etag")
+                return {"status": 304, "headers": {"ETag": etag}, "body": None}
+            if code == "InvalidRange":
+                return {"status": 416, "headers": {"Content-Range": f"bytes */{error.get('ActualObjectSize', '*')}"}, "body": None}
+            if code == "PreconditionFailed" and "Range" in params and if_range:
+                return await self.open_stream(file_key, None, if_none_match, if_modified_since)
+            raise
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(response["ContentLength"]),
+            "Content-Type": response.get("ContentType") or "application/octet-stream",
+            "ETag": response.get("ETag"),
+            "Last-Modified": format_datetime(response["LastModified"].astimezone(timezone.utc), usegmt=True) if response.get("LastModified") else None,
+        }
+        if response.get("ContentRange"):
+            headers["Content-Range"] = response["ContentRange"]
+        return {"status": 206 if response.get("ContentRange") else 200, "headers": headers, "body": response["Body"]}
+
+    async def get_object(self, file_key: str) -> Optional[bytes]:
+        """
+        Read a small object (such as a sidecar) in full, or None if it does not exist.
+        """
+        validate_file_key(file_key)
+        await self.open()
+        try:
+            async with observe_call("s3", "get_object"):
+                response = await self.s3.get_object(Bucket=self.bucket, Key=file_key)
+                async with response["Body"] as body:
+                    return await body.read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return None
+            raise
+
+    async def put_object(self, file_key: str, body: bytes, content_type: str = "application/octet-stream"):
+        """
+        Write an object in the sessions directory.
+        """
+        validate_file_key(file_key)
+        await self.open()
+        async with observe_call("s3", "put_object"):
+            await self.s3.put_object(Bucket=self.bucket, Key=file_key, Body=body, ContentType=content_type)
+
+    async def close(self):
+        """
+        Close the shared S3 client and release its pooled connections.
+        """
+        if self._exit_stack:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self.s3 = None
+
+
+async def _main():
     user_id = "user-8983"
+    s3_session = S3Session()
     try:
-        files = get_all_files(user_id)
+        files = await s3_session.get_all_files(user_id)
         print(f"Files for user {user_id}: {files}")
         for file in files:
-            url = get_file_url(file)
+            url = await s3_session.get_file_url(file)
             print(f"File URL: {url}")
     except Exception as e:
-        print(f"Error: {e}")
\ No newline at end of file
+        print(f"Error: {e}")
+    finally:
+        await s3_session.close()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,73 @@
+"""
+Prompt size and LLM time to first token as a voice session grows, with and without chat context compaction.
+
+FakeLLM stands in for Gemini: its latency grows with the prompt length. Summaries are produced by a
+second FakeLLM while the next turn is running, as in the agent.
+
+    python benchmarks/bench_chat_compaction.py --turns 100 --max-turns 8
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit.agents import llm
+from chat_compaction import ChatCompactor
+from benchmarks.fake_providers import FakeLLM, prompt_chars
+
+USER_TEXT = "Friday, remind me what we discussed about the reactor schedule and the board meeting. " * 2
+REPLY_TEXT = "Of course, boss. The reactor maintenance is booked for Thursday and the board expects the report first. " * 3
+
+
+async def time_to_first_token(stream: llm.LLMStream) -> float:
+    started = time.perf_counter()
+    async with stream:
+        async for _ in stream:
+            return time.perf_counter() - started
+
+
+async def run_session(turns: int, compactor: ChatCompactor, think_time: float, checkpoints: set) -> list:
+    reply_llm = FakeLLM(latency=0.05, latency_per_1k_chars=0.01, reply=REPLY_TEXT.strip())
+    chat_ctx = llm.ChatContext().append(role="system", text="You are FRIDAY, a voice assistant.")
+    samples = []
+    for turn in range(1, turns + 1):
+        chat_ctx.append(role="user", text=USER_TEXT)
+        prompt = compactor.compact(chat_ctx) if compactor else chat_ctx.copy()
+        ttft = await time_to_first_token(reply_llm.chat(chat_ctx=prompt))
+        if turn in checkpoints:
+            samples.append({
+                "turn": turn,
+                "prompt_messages": len(prompt.messages),
+                "prompt_chars": prompt_chars(prompt),
+                "ttft_ms": round(ttft * 1000, 1),
+            })
+        chat_ctx.append(role="assistant", text=REPLY_TEXT)
+        await asyncio.sleep(think_time)
+    if compactor:
+        await compactor.aclose()
+    return samples
+
+
+async def run(turns: int, max_turns: int, summary_batch: int, think_time: float) -> dict:
+    checkpoints = {t for t in (1, 5, 10, 25, 50, 100, 200, 500) if t <= turns} | {turns}
+    summary_llm = FakeLLM(latency=0.2, reply="The boss asked about the reactor schedule and the board meeting.")
+    return {
+        "turns": turns,
+        "max_turns": max_turns,
+        "full_history": await run_session(turns, None, think_time, checkpoints),
+        "compacted": await run_session(turns, ChatCompactor(summary_llm, max_turns, summary_batch), think_time, checkpoints),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--max-turns", type=int, default=8, help="Recent user turns kept verbatim.")
+    parser.add_argument("--summary-batch", type=int, default=4, help="Overflowing turns folded per summary.")
+    parser.add_argument("--think-time", type=float, default=0.05, help="Seconds between turns.")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.turns, args.max_turns, args.summary_batch, args.think_time)), indent=2))
@@ -0,0 +1,221 @@
+"""
+Fixed versus adaptive endpointing, measured through the voice pipeline.
+
+Each speaker persona is a seeded generator of turns, a turn being the list of mid-turn pauses
+(in seconds, measured from the VAD end of speech) before the user's real end of turn. Turns are
+rendered as audio, speech from the fixtures with enough silence between phrases for the VAD to
+report each pause, and spoken in real time into the VoicePipelineAgent of agent.build_agent(), with
+the fake VAD, STT, LLM and TTS of bench_pipeline.py and a fake turn detector. Every persona runs
+twice at once: with the starting delays fixed and with adaptive endpointing.
+
+An endpoint is a validated reply (the pipeline's end-of-utterance metrics). One validated before
+the user finished the turn is a false endpoint. Response delay is the end-of-utterance delay of the
+real one, from the end of the user's speech. The turn detector is right `--turn-detector-accuracy`
+of the time; when it says the user is not done, the pipeline waits max_delay instead of min_delay.
+
+    python benchmarks/bench_endpointing.py --turns 40
+    python benchmarks/bench_endpointing.py --fixture phrase.wav --turn-detector-accuracy 0
+
+Exits non-zero when adaptive endpointing gives any persona more false endpoints than the fixed delays.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit import rtc
+from livekit.agents import metrics, utils
+from benchmarks.fake_room import FakeRoom
+from benchmarks.fake_providers import FakeLLM, FakeSTT, FakeTTS, FakeTurnDetector, FakeVAD, frame_rms, SPEECH_RMS
+from benchmarks.bench_pipeline import FRAME_MS, FRAME_SAMPLES, SimulatedUser, load_fixture, synthetic_speech, to_frames
+import agent as voice_agent
+
+# persona: (probability that a turn contains pauses, (shortest, longest) pause)
+PERSONAS = {
+    "fast": (0.15, (0.05, 0.2)),
+    "average": (0.35, (0.1, 0.45)),
+    "hesitant": (0.7, (0.3, 1.2)),
+}
+
+
+def synthetic_turns(persona: str, turns: int, seed: int = 7) -> list:
+    rng = random.Random(f"{persona}-{seed}")
+    pause_probability, (shortest, longest) = PERSONAS[persona]
+    fixture = []
+    for _ in range(turns):
+        count = rng.randint(1, 3) if rng.random() < pause_probability else 0
+        fixture.append([round(rng.uniform(shortest, longest), 3) for _ in range(count)])
+    return fixture
+
+
+def speech_phrases(sources: list) -> list:
+    """
+    Frames of each fixture from its first to its last loud frame, so silence comes only from the pauses.
+    """
+    phrases = []
+    for samples in sources:
+        frames = to_frames(samples)
+        loud = [i for i, frame in enumerate(frames) if frame_rms(frame) >= SPEECH_RMS]
+        if loud:
+            phrases.append(frames[loud[0]:loud[-1] + 1])
+    return phrases
+
+
+def render_turn(pauses: list, phrases: list, vad_silence: float, offset: int = 0) -> list:
+    """
+    One phrase per stretch of speech; each pause is preceded by the silence the VAD needs to end speech.
+    """
+    silence = rtc.AudioFrame(np.zeros(FRAME_SAMPLES, dtype=np.int16).tobytes(), 16000, 1, FRAME_SAMPLES)
+    frames = list(phrases[offset % len(phrases)])
+    for i, pause in enumerate(pauses, start=1):
+        frames += [silence] * round((vad_silence + pause) * 1000 / FRAME_MS)
+        frames += phrases[(offset + i) % len(phrases)]
+    return frames
+
+
+def transcripts(turns: list) -> list:
+    """
+    What the fake STT hears, one line per phrase: mid-turn phrases trail off, the last one asks.
+    """
+    lines = []
+    for pauses in turns:
+        lines += ["so about the meeting"] * len(pauses) + ["what is on my schedule today?"]
+    return lines
+
+
+async def run_session(persona: str, turns: list, phrases: list, adaptive: bool, args) -> dict:
+    room = FakeRoom(f"{persona}-{'adaptive' if adaptive else 'fixed'}")
+    vad = FakeVAD()
+    userdata = {
+        "vad": vad,
+        "stt": FakeSTT(transcripts(turns), latency=args.stt_latency),
+        "llm": FakeLLM(latency=args.llm_latency),
+        "tts": FakeTTS(latency=args.tts_latency),
+    }
+    detector = None
+    if args.turn_detector_accuracy > 0:
+        detector = FakeTurnDetector(args.turn_detector_accuracy, seed=f"{persona}-{args.seed}")
+    agent, compactor, endpointing, _ = voice_agent.build_agent(
+        userdata, detector, speculative=False, adaptive_endpointing=adaptive
+    )
+    user = SimulatedUser(room)
+    endpoints = []
+    endpointed = asyncio.Event()
+    reply_done = asyncio.Event()
+
+    def on_metrics(collected):
+        if isinstance(collected, metrics.PipelineEOUMetrics):
+            endpoints.append((time.perf_counter(), collected.end_of_utterance_delay))
+            endpointed.set()
+
+    agent.on("metrics_collected", on_metrics)
+    agent.on("agent_stopped_speaking", lambda: reply_done.set())
+
+    delays, false_endpoints, missed = [], 0, 0
+    user.start()
+    agent.start(room, room.user.identity)
+    try:
+        for index, pauses in enumerate(turns):
+            frames = render_turn(pauses, phrases, vad.min_silence_duration, index)
+            seen = len(endpoints)
+            user.say(frames, len(frames) * FRAME_MS / 1000)
+            await user.speech_ended.wait()
+            ended = user.speech_ended_at
+            false_endpoints += sum(1 for at, _ in endpoints[seen:] if at < ended)
+            while not any(at >= ended for at, _ in endpoints[seen:]):
+                endpointed.clear()
+                try:
+                    await asyncio.wait_for(endpointed.wait(), 15)
+                except asyncio.TimeoutError:
+                    break
+            real = [delay for at, delay in endpoints[seen:] if at >= ended]
+            if not real:
+                missed += 1
+                continue
+            delays.append(real[0])
+            reply_done.clear()
+            try:
+                await asyncio.wait_for(reply_done.wait(), 15)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(args.think_time)
+    finally:
+        await user.aclose()
+        await agent.aclose()
+        await compactor.aclose()
+        if agent._human_input is not None:
+            await agent._human_input.aclose()
+        await utils.aio.gracefully_cancel(agent._main_atask)
+    return {
+        "false_endpoints_per_100_turns": round(100 * false_endpoints / len(turns), 1),
+        "median_response_delay": round(statistics.median(delays), 3) if delays else None,
+        "p95_response_delay": round(sorted(delays)[int(0.95 * (len(delays) - 1))], 3) if delays else None,
+        "missed_turns": missed,
+        "final_delays": [endpointing.min_delay, endpointing.max_delay],
+    }
+
+
+async def run(args) -> dict:
+    sources = [load_fixture(path) for path in args.fixture] or [synthetic_speech(args.speech_seconds, seed) for seed in range(3)]
+    phrases = speech_phrases(sources)
+    if not phrases:
+        raise SystemExit("no speech found in the fixtures")
+    fixtures = {persona: synthetic_turns(persona, args.turns, args.seed) for persona in PERSONAS}
+    sessions = [(persona, adaptive) for persona in PERSONAS for adaptive in (False, True)]
+    results = await asyncio.gather(*(
+        run_session(persona, fixtures[persona], phrases, adaptive, args) for persona, adaptive in sessions
+    ))
+    personas = {persona: {} for persona in PERSONAS}
+    for (persona, adaptive), result in zip(sessions, results):
+        personas[persona]["adaptive" if adaptive else "fixed"] = result
+    return {
+        "config": {
+            "turns": args.turns,
+            "seed": args.seed,
+            "turn_detector_accuracy": args.turn_detector_accuracy,
+            "fixtures": args.fixture or f"synthetic {args.speech_seconds}s",
+        },
+        "personas": personas,
+    }
+
+
+def regressions(result: dict) -> list:
+    """
+    Personas that adaptive endpointing cut off more often than the fixed delays.
+    """
+    return [
+        persona for persona, modes in result["personas"].items()
+        if modes["adaptive"]["false_endpoints_per_100_turns"] > modes["fixed"]["false_endpoints_per_100_turns"]
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40, help="User turns per persona.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--fixture", action="append", default=[], help="16-bit PCM WAV of one spoken phrase (repeatable).")
+    parser.add_argument("--speech-seconds", type=float, default=0.8, help="Length of a synthetic phrase.")
+    parser.add_argument("--turn-detector-accuracy", type=float, default=0.9,
+                        help="Share of correct end-of-turn predictions; 0 runs without a turn detector.")
+    parser.add_argument("--stt-latency", type=float, default=0.15, help="Final transcript delay after speech ends.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="LLM time to first token.")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="TTS time to first byte.")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Silence between the agent's reply and the next turn.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    failed = regressions(result)
+    if failed:
+        print(f"adaptive endpointing has more false endpoints than fixed delays for: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
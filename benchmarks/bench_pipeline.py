@@ -0,0 +1,320 @@
+"""
+End-to-end voice pipeline benchmark with fake STT, LLM and TTS providers.
+
+Runs the VoicePipelineAgent built by agent.build_agent() in fake rooms. A simulated user speaks the
+audio fixture in real time, and the benchmark measures the time from the end of the user's speech
+until the agent's reply audio starts playing. It steps through increasing numbers of concurrent
+sessions in one process (one core) to find CPU per session and how many sessions a core sustains
+before latency degrades.
+
+    python benchmarks/bench_pipeline.py --sessions 1,4,8,16 --turns 4
+    python benchmarks/bench_pipeline.py --fixture question.wav --vad silero --llm-latency 0.35 --tts-latency 0.15
+
+Without --fixture, the user audio is a synthetic voiced signal. The fake STT transcribes loud audio
+into the lines of --transcript, so real recordings only need to contain speech.
+"""
+import os
+import sys
+import json
+import time
+import wave
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livekit import rtc
+from livekit.agents import utils
+from benchmarks.fake_room import FakeRoom
+from benchmarks.fake_providers import FakeLLM, FakeSTT, FakeTTS, FakeVAD, frame_rms, SPEECH_RMS
+from tts_cache import CachedTTS, TTSAudioCache
+import agent as voice_agent
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def synthetic_speech(seconds: float, seed: int = 0) -> np.ndarray:
+    """
+    Voiced-sounding int16 audio: a 140Hz harmonic series modulated into ~4 syllables per second.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6))
+    syllables = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t) ** 2
+    signal = 4000 * voice * syllables + rng.normal(0, 50, t.size)
+    return np.clip(signal, -32768, 32767).astype(np.int16)
+
+
+def load_fixture(path: str) -> np.ndarray:
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise SystemExit(f"{path}: only 16-bit PCM WAV fixtures are supported")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        if wav.getnchannels() > 1:
+            samples = samples.reshape(-1, wav.getnchannels()).mean(axis=1).astype(np.int16)
+        rate = wav.getframerate()
+    if rate != SAMPLE_RATE:
+        resampler = rtc.AudioResampler(rate, SAMPLE_RATE)
+        frames = resampler.push(rtc.AudioFrame(samples.tobytes(), rate, 1, samples.size)) + resampler.flush()
+        samples = np.concatenate([np.frombuffer(f.data, dtype=np.int16) for f in frames])
+    return samples
+
+
+def to_frames(samples: np.ndarray) -> list:
+    samples = np.concatenate([samples, np.zeros(-samples.size % FRAME_SAMPLES, dtype=np.int16)])
+    return [
+        rtc.AudioFrame(samples[i:i + FRAME_SAMPLES].tobytes(), SAMPLE_RATE, 1, FRAME_SAMPLES)
+        for i in range(0, samples.size, FRAME_SAMPLES)
+    ]
+
+
+def speech_end_offset(frames: list) -> float:
+    """
+    Seconds from the start of the fixture until the end of its last loud frame.
+    """
+    loud = [i for i, frame in enumerate(frames) if frame_rms(frame) >= SPEECH_RMS]
+    return (loud[-1] + 1) * FRAME_MS / 1000 if loud else 0.0
+
+
+class SimulatedUser:
+    """
+    Streams microphone audio into a fake room in real time: silence, or an utterance when asked.
+    """
+    def __init__(self, room: FakeRoom):
+        self.room = room
+        self.silence = rtc.AudioFrame(np.zeros(FRAME_SAMPLES, dtype=np.int16).tobytes(), SAMPLE_RATE, 1, FRAME_SAMPLES)
+        self.utterance = []
+        self.speech_ended = asyncio.Event()
+        self.speech_ended_at = 0.0
+        self._speech_end_frame = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._stream())
+
+    def say(self, frames: list, end_offset: float):
+        self.speech_ended.clear()
+        self._speech_end_frame = max(1, round(end_offset * 1000 / FRAME_MS))
+        self.utterance = list(frames)
+
+    async def _stream(self):
+        next_at = time.perf_counter()
+        sent = 0
+        while True:
+            if self.utterance:
+                frame = self.utterance.pop(0)
+                sent += 1
+                if sent == self._speech_end_frame:
+                    self.speech_ended_at = next_at + FRAME_MS / 1000
+                    self.speech_ended.set()
+                if not self.utterance:
+                    sent = 0
+            else:
+                frame = self.silence
+            self.room.user.microphone.push(frame)
+            next_at += FRAME_MS / 1000
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    async def aclose(self):
+        if self._task:
+            await utils.aio.gracefully_cancel(self._task)
+
+
+async def run_session(index: int, userdata: dict, fixtures: list, turns: int, think_time: float, start_delay: float,
+                      speculative: bool = False) -> dict:
+    await asyncio.sleep(start_delay)
+    room = FakeRoom(f"bench-{index}")
+    agent, compactor, _, speculation = voice_agent.build_agent(userdata, speculative=speculative)
+    user = SimulatedUser(room)
+    audio_out = asyncio.Event()
+    audio_done = asyncio.Event()
+    marks = {"vad_stopped": 0.0, "audio_out": 0.0}
+
+    def on_user_stopped():
+        marks["vad_stopped"] = time.perf_counter()
+
+    def on_audio_out():
+        marks["audio_out"] = time.perf_counter()
+        audio_done.clear()
+        audio_out.set()
+
+    agent.on("user_stopped_speaking", on_user_stopped)
+    agent.on("agent_started_speaking", on_audio_out)
+    agent.on("agent_stopped_speaking", lambda: audio_done.set())
+
+    latencies, vad_latencies, missed = [], [], 0
+    user.start()
+    agent.start(room, room.user.identity)
+    try:
+        await agent.say(voice_agent.GREETING, allow_interruptions=True)
+        await asyncio.wait_for(audio_done.wait(), 30)
+        for turn in range(turns):
+            frames, end_offset = fixtures[(index + turn) % len(fixtures)]
+            audio_out.clear()
+            user.say(frames, end_offset)
+            await user.speech_ended.wait()
+            try:
+                await asyncio.wait_for(audio_out.wait(), 15)
+            except asyncio.TimeoutError:
+                missed += 1
+                continue
+            latencies.append(marks["audio_out"] - user.speech_ended_at)
+            if marks["vad_stopped"] > user.speech_ended_at:
+                vad_latencies.append(marks["audio_out"] - marks["vad_stopped"])
+            await asyncio.wait_for(audio_done.wait(), 30)
+            await asyncio.sleep(think_time)
+    finally:
+        await user.aclose()
+        await agent.aclose()
+        await compactor.aclose()
+        if speculation is not None:
+            await speculation.aclose()
+        if agent._human_input is not None:
+            await agent._human_input.aclose()
+        await utils.aio.gracefully_cancel(agent._main_atask)
+    return {
+        "latencies": latencies,
+        "vad_latencies": vad_latencies,
+        "missed": missed,
+        "speculation": speculation.report() if speculation is not None else None,
+    }
+
+
+def _ms(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+async def run_step(sessions: int, userdata: dict, fixtures: list, args) -> dict:
+    rng = random.Random(sessions)
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*(
+        run_session(i, userdata, fixtures, args.turns, args.think_time, rng.uniform(0, args.stagger), args.speculative)
+        for i in range(sessions)
+    ))
+    cpu = time.process_time() - cpu_started
+    wall = time.perf_counter() - wall_started
+    latencies = [value for result in results for value in result["latencies"]]
+    vad_latencies = [value for result in results for value in result["vad_latencies"]]
+    step = {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "missed_turns": sum(result["missed"] for result in results),
+        "response_p50_ms": _ms(latencies, 0.5),
+        "response_p95_ms": _ms(latencies, 0.95),
+        "response_mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        "vad_stop_to_audio_p50_ms": _ms(vad_latencies, 0.5),
+        "wall_s": round(wall, 2),
+        "cpu_s": round(cpu, 2),
+        "cpu_utilization": round(cpu / wall, 3),
+        "cpu_per_session": round(cpu / wall / sessions, 4),
+    }
+    if args.speculative:
+        reports = [result["speculation"] for result in results]
+        outcomes = {outcome: sum(report[outcome] for report in reports) for outcome in ("hit", "miss", "cancelled")}
+        total = sum(outcomes.values())
+        step["speculation"] = {
+            **outcomes,
+            "hit_rate": round(outcomes["hit"] / total, 3) if total else 0.0,
+            "mean_saved_ms": round(sum(report["latency_saved"] for report in reports) / outcomes["hit"] * 1000, 1) if outcomes["hit"] else 0.0,
+        }
+    return step
+
+
+async def run(args) -> dict:
+    sources = [load_fixture(path) for path in args.fixture] or [
+        np.concatenate([synthetic_speech(args.speech_seconds, seed), np.zeros(SAMPLE_RATE // 5, dtype=np.int16)])
+        for seed in range(3)
+    ]
+    fixtures = []
+    for samples in sources:
+        frames = to_frames(samples)
+        fixtures.append((frames, speech_end_offset(frames)))
+
+    if args.vad == "silero":
+        from livekit.plugins import silero
+        vad = silero.VAD.load()
+    else:
+        vad = FakeVAD()
+    # same shape as agent.prewarm(): one set of provider objects shared by every session of the process
+    userdata = {
+        "vad": vad,
+        "stt": FakeSTT(args.transcript, latency=args.stt_latency),
+        "llm": FakeLLM(latency=args.llm_latency),
+        "tts": CachedTTS(FakeTTS(latency=args.tts_latency), TTSAudioCache(directory=""), phrases=[voice_agent.GREETING]),
+    }
+
+    steps = []
+    for sessions in args.sessions:
+        step = await run_step(sessions, userdata, fixtures, args)
+        steps.append(step)
+        print(json.dumps(step), file=sys.stderr)
+
+    baseline = steps[0]["response_p95_ms"]
+    sustained = [
+        step["sessions"] for step in steps
+        if step["missed_turns"] == 0 and step["cpu_utilization"] < 0.9
+        and step["response_p95_ms"] <= baseline + args.latency_budget * 1000
+    ]
+    if len(steps) > 1:
+        # marginal cost per session; the intercept is the process's fixed overhead
+        per_session = float(np.polyfit([step["sessions"] for step in steps], [step["cpu_utilization"] for step in steps], 1)[0])
+    else:
+        per_session = steps[0]["cpu_per_session"]
+    return {
+        "config": {
+            "stt_latency": args.stt_latency,
+            "llm_latency": args.llm_latency,
+            "tts_latency": args.tts_latency,
+            "vad": args.vad,
+            "speculative": args.speculative,
+            "fixtures": args.fixture or f"synthetic {args.speech_seconds}s",
+            "turns_per_session": args.turns,
+        },
+        "steps": steps,
+        "capacity": {
+            "cpu_per_session": round(per_session, 4),
+            "estimated_sessions_per_core": int(args.target_utilization / per_session) if per_session > 0 else None,
+            "max_sessions_per_core_within_budget": max(sustained, default=0),
+            "latency_budget_ms": args.latency_budget * 1000,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=lambda v: [int(n) for n in v.split(",")], default=[1, 4, 8, 16],
+                        help="Concurrent session counts to step through.")
+    parser.add_argument("--turns", type=int, default=4, help="User turns per session.")
+    parser.add_argument("--fixture", action="append", default=[], help="16-bit PCM WAV of one user utterance (repeatable).")
+    parser.add_argument("--transcript", action="append", default=None, help="Line the fake STT returns per utterance (repeatable).")
+    parser.add_argument("--speech-seconds", type=float, default=1.5, help="Length of the synthetic utterance.")
+    parser.add_argument("--speculative", action="store_true", help="Start LLM replies from interim transcripts (LLM_SPECULATION=1).")
+    parser.add_argument("--vad", choices=("fake", "silero"), default="fake", help="Energy-based fake VAD, or Silero as in agent.py.")
+    parser.add_argument("--stt-latency", type=float, default=0.15, help="Final transcript delay after speech ends.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="LLM time to first token.")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="TTS time to first byte.")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Silence between the agent's reply and the next turn.")
+    parser.add_argument("--stagger", type=float, default=1.0, help="Sessions start at random offsets up to this many seconds.")
+    parser.add_argument("--latency-budget", type=float, default=0.2,
+                        help="Allowed p95 growth (seconds) over the first step for a step to count as sustained.")
+    parser.add_argument("--target-utilization", type=float, default=0.75, help="CPU share of a core to plan for.")
+    parser.add_argument("--output", help="Also write the JSON result to this file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args))
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
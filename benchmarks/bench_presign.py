@@ -0,0 +1,75 @@
+"""
+Per-URL cost of presigning recordings: one /get_file_url call per key versus one /get_file_urls batch.
+
+Runs the FastAPI app in-process with a real S3Session (signing is local, so no bucket is needed).
+
+    python benchmarks/bench_presign.py --keys 200 --rounds 5
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("AWS_BUCKET_NAME", "bench-recordings")
+
+from httpx import AsyncClient, ASGITransport
+
+import main
+from aws_service import S3Session
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def run_single(client, keys):
+    for key in keys:
+        response = await client.get("/get_file_url", params={"file_key": key})
+        response.raise_for_status()
+
+
+async def run_batch(client, keys):
+    response = await client.post("/get_file_urls", json={"file_keys": keys})
+    response.raise_for_status()
+
+
+async def measure(client, runner, keys, rounds, warm):
+    timings = []
+    for _ in range(rounds):
+        if not warm:
+            main.s3_manager.url_cache.clear()
+        start = time.perf_counter()
+        await runner(client, keys)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {"total_ms": round(best * 1000, 3), "per_url_us": round(best / len(keys) * 1e6, 2)}
+
+
+async def bench(num_keys: int, rounds: int) -> dict:
+    main.s3_manager = S3Session()
+    await main.s3_manager.open()
+    keys = [f"sessions/bench-user/recording_room_{i}.mp4" for i in range(num_keys)]
+    results = {}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://bench") as client:
+            for warm in (False, True):
+                label = "cached" if warm else "uncached"
+                results[f"single_{label}"] = await measure(client, run_single, keys, rounds, warm)
+                results[f"batch_{label}"] = await measure(client, run_batch, keys, rounds, warm)
+    finally:
+        await main.s3_manager.close()
+    return {"keys": num_keys, "rounds": rounds, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=200, help="Number of recording keys to sign per round.")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds per scenario; the best round is reported.")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(bench(args.keys, args.rounds)), indent=2))
@@ -0,0 +1,90 @@
+"""
+Memory of prewarmed agent job processes, spawned versus forked from a preloading forkserver.
+
+Starts livekit-agents' own process pool with agent.prewarm as the initializer and `--processes`
+idle processes, waits until all are prewarmed and reports RSS, PSS and USS per process. PSS sums to
+the real footprint of the group; USS is what each additional process costs. Provider clients are
+built with placeholder API keys and never connect.
+
+    python benchmarks/bench_process_memory.py --processes 4
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import multiprocessing
+from multiprocessing import forkserver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for key in ("DEEPGRAM_API_KEY", "CARTESIA_API_KEY", "GOOGLE_API_KEY"):
+    os.environ.setdefault(key, "benchmark")
+# prewarm would otherwise open the transcript database next to agent.py
+os.environ.setdefault("TRANSCRIPTS_ENABLED", "0")
+
+from livekit.agents import JobExecutorType
+from livekit.agents.ipc.proc_pool import ProcPool
+import agent
+from shared_models import process_memory
+
+
+async def measure(method: str, processes: int) -> dict:
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        context.set_forkserver_preload(["agent", "shared_models"])
+        os.environ["SHARED_MODELS_PRELOAD"] = "1"
+    pool = ProcPool(
+        initialize_process_fnc=agent.prewarm,
+        job_entrypoint_fnc=agent.entrypoint,
+        num_idle_processes=processes,
+        initialize_timeout=120,
+        close_timeout=5,
+        inference_executor=None,
+        job_executor_type=JobExecutorType.PROCESS,
+        mp_ctx=context,
+        memory_warn_mb=0,
+        memory_limit_mb=0,
+        loop=asyncio.get_running_loop(),
+    )
+    ready = asyncio.Queue()
+    pool.on("process_ready", ready.put_nowait)
+    started = asyncio.get_running_loop().time()
+    pool.start()
+    for _ in range(processes):
+        await asyncio.wait_for(ready.get(), timeout=180)
+    prewarm_seconds = asyncio.get_running_loop().time() - started
+    # let allocator arenas settle before sampling
+    await asyncio.sleep(1)
+    jobs = [process_memory(proc.pid) for proc in pool.processes]
+    server = []
+    if method == "forkserver" and forkserver._forkserver._forkserver_pid:
+        server = [process_memory(forkserver._forkserver._forkserver_pid)]
+    await pool.aclose()
+    group = jobs + server
+    return {
+        "processes": jobs,
+        "forkserver": server[0] if server else None,
+        "prewarm_seconds": round(prewarm_seconds, 2),
+        "total_rss_mb": round(sum(p["rss_mb"] for p in group), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in group), 1),
+        "per_process_uss_mb": round(sum(p["uss_mb"] for p in jobs) / len(jobs), 1),
+    }
+
+
+async def run(processes: int, methods: list) -> dict:
+    results = {method: await measure(method, processes) for method in methods}
+    if "spawn" in results and "forkserver" in results:
+        results["saved_per_process_mb"] = round(
+            results["spawn"]["per_process_uss_mb"] - results["forkserver"]["per_process_uss_mb"], 1
+        )
+        results["saved_total_pss_mb"] = round(results["spawn"]["total_pss_mb"] - results["forkserver"]["total_pss_mb"], 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4, help="idle prewarmed job processes")
+    parser.add_argument("--methods", default="spawn,forkserver", help="process start methods to compare")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.processes, args.methods.split(","))), indent=2))
@@ -0,0 +1,116 @@
+"""
+Transcript search latency over a seeded transcript database.
+
+Seeds `--sessions` synthetic conversations (user and agent turns drawn from a fixed vocabulary,
+spread over `--users` users, every third session linked to a recording) into a fresh SQLite file,
+then times TranscriptStore.search for common, rare, prefix and per-user queries.
+
+    python benchmarks/bench_transcript_search.py --sessions 20000
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript_store import TranscriptStore
+
+WORDS = (
+    "weather schedule meeting reminder recording music playlist traffic flight hotel dinner reservation "
+    "battery calendar email message call colonel rhodes suit armor diagnostics protocol lab reactor "
+    "temperature forecast tomorrow morning evening weekend project report budget invoice delivery "
+    "package status update summary notes translate french spanish timer alarm lights thermostat door"
+).split()
+FILLER = "please can you what is the my for a to and me about check set tell show".split()
+
+
+def seed(store: TranscriptStore, sessions: int, users: int, turns: int, seed: int = 7) -> float:
+    """
+    Bulk-load synthetic sessions in one transaction; returns the seconds it took.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    conn = store._conn
+    conn.execute("BEGIN")
+    for index in range(sessions):
+        session_id = f"job-{index}"
+        user_id = f"user-{index % users}"
+        session_started = 1_700_000_000 + index * 600
+        recording = f"sessions/{user_id}/recording_room-{index}_{session_started}.ogg" if index % 3 == 0 else None
+        conn.execute(
+            "INSERT INTO transcript_sessions (session_id, user_id, room_name, started_at, ended_at, recording_key, "
+            "recording_user_id, recording_started_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (session_id, user_id, f"room-{index}", session_started, session_started + turns * 10,
+             recording, user_id if recording else None, session_started if recording else None),
+        )
+        rows = []
+        for turn in range(turns):
+            words = rng.choices(FILLER, k=rng.randint(3, 8)) + rng.choices(WORDS, k=rng.randint(1, 4))
+            rng.shuffle(words)
+            rows.append((session_id, "user" if turn % 2 == 0 else "assistant", " ".join(words),
+                         session_started + turn * 5, turn * 5000))
+        conn.executemany(
+            "INSERT INTO transcript_turns (session_id, role, text, spoken_at, offset_ms) VALUES (?, ?, ?, ?, ?)", rows
+        )
+    conn.execute("COMMIT")
+    conn.execute("INSERT INTO transcript_fts (transcript_fts) VALUES ('optimize')")
+    return time.perf_counter() - started
+
+
+async def time_queries(store: TranscriptStore, queries: dict, repeat: int) -> dict:
+    results = {}
+    for name, kwargs in queries.items():
+        timings, matches = [], 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            sessions = await store.search(**kwargs)
+            timings.append((time.perf_counter() - started) * 1000)
+            matches = len(sessions)
+        timings.sort()
+        results[name] = {
+            "query": kwargs,
+            "sessions_returned": matches,
+            "p50_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+        }
+    return results
+
+
+async def run(sessions: int, users: int, turns: int, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TranscriptStore(os.path.join(tmp, "transcripts.db"))
+        seed_seconds = seed(store, sessions, users, turns)
+        queries = {
+            "common_word": {"query": "weather"},
+            "two_words": {"query": "flight hotel"},
+            "three_words": {"query": "colonel rhodes diagnostics"},
+            "prefix": {"query": "therm*"},
+            "per_user": {"query": "budget report", "user_id": "user-3"},
+            "no_match": {"query": "zebra"},
+        }
+        results = await time_queries(store, queries, repeat)
+        size = os.path.getsize(store.path)
+        await store.close()
+    return {
+        "sessions": sessions,
+        "turns": sessions * turns,
+        "seed_seconds": round(seed_seconds, 2),
+        "db_megabytes": round(size / 1024 / 1024, 1),
+        "queries": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=20, help="turns per session")
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per query")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.sessions, args.users, args.turns, args.repeat)), indent=2))
@@ -0,0 +1,67 @@
+"""
+Time to first greeting audio frame with and without the synthesized-audio cache.
+
+Uses FakeTTS with a provider latency in place of Cartesia. "disk" opens a fresh cache on the same
+directory, as a newly started worker process would.
+
+    python benchmarks/bench_tts_cache.py --latency 0.3 --rounds 20
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_cache import CachedTTS, TTSAudioCache
+from benchmarks.fake_providers import FakeTTS
+
+GREETING = "Hello, I'm FRIDAY. How may I assist you today?"
+
+
+async def time_to_first_frame(stream_tts) -> float:
+    started = time.perf_counter()
+    stream = stream_tts.stream()
+    stream.push_text(GREETING)
+    stream.end_input()
+    first = None
+    async for _ in stream:
+        if first is None:
+            first = time.perf_counter() - started
+    await stream.aclose()
+    return first
+
+
+async def run(latency: float, rounds: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        provider = FakeTTS(latency=latency)
+        results["uncached"] = [await time_to_first_frame(provider) for _ in range(rounds)]
+        await time_to_first_frame(CachedTTS(FakeTTS(latency=latency), TTSAudioCache(directory=directory), phrases=[GREETING]))
+        disk = []
+        for _ in range(rounds):
+            disk.append(await time_to_first_frame(CachedTTS(FakeTTS(latency=latency), TTSAudioCache(directory=directory), phrases=[GREETING])))
+        results["disk_hit"] = disk
+        warm = CachedTTS(FakeTTS(latency=latency), TTSAudioCache(directory=directory), phrases=[GREETING])
+        await time_to_first_frame(warm)
+        results["memory_hit"] = [await time_to_first_frame(warm) for _ in range(rounds)]
+    return {
+        "provider_latency": latency,
+        "rounds": rounds,
+        **{
+            name: {"p50_ms": round(statistics.median(values) * 1000, 3), "max_ms": round(max(values) * 1000, 3)}
+            for name, values in results.items()
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.3, help="Simulated provider time to first byte.")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.latency, args.rounds)), indent=2))
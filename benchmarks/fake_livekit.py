@@ -0,0 +1,141 @@
+"""
+Local stand-in for the LiveKit server's Egress Twirp API (and the room participant listing that track egress needs).
+
+Speaks the same protobuf-over-HTTP protocol as livekit.api.LiveKitAPI, so EgressSession can be
+pointed at it with LIVEKIT_URL. Every call waits `latency` seconds to mimic a real server.
+
+    python benchmarks/fake_livekit.py --port 7880 --latency 0.05
+"""
+import time
+import uuid
+import asyncio
+import argparse
+from aiohttp import web
+from livekit import api
+
+
+class FakeLiveKitServer:
+    """
+    In-process fake of the LiveKit Egress service with request counters and configurable latency.
+    """
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.egresses = {}
+        # room name -> list of api.ParticipantInfo returned by ListParticipants
+        self.participants = {}
+        self.calls = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._runner = None
+        self._handlers = {
+            "StartRoomCompositeEgress": (api.RoomCompositeEgressRequest, self._start_room_composite),
+            "StartTrackEgress": (api.TrackEgressRequest, self._start_track),
+            "StopEgress": (api.StopEgressRequest, self._stop_egress),
+            "ListEgress": (api.ListEgressRequest, self._list_egress),
+            "ListParticipants": (api.ListParticipantsRequest, self._list_participants),
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/twirp/livekit.Egress/{method}", self._handle)
+        app.router.add_post("/twirp/livekit.RoomService/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if method not in self._handlers:
+            return web.json_response({"code": "bad_route", "msg": f"unknown method {method}"}, status=404)
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.json_response({"code": "unauthenticated", "msg": "missing token"}, status=401)
+        request_class, handler = self._handlers[method]
+        message = request_class.FromString(await request.read())
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            response = handler(message)
+        finally:
+            self.in_flight -= 1
+        if isinstance(response, web.Response):
+            return response
+        return web.Response(body=response.SerializeToString(), content_type="application/protobuf")
+
+    def _start_room_composite(self, request: api.RoomCompositeEgressRequest):
+        info = api.EgressInfo(
+            egress_id=f"EG_{uuid.uuid4().hex[:12]}",
+            room_name=request.room_name,
+            status=api.EgressStatus.EGRESS_ACTIVE,
+            started_at=time.time_ns(),
+        )
+        info.room_composite.CopyFrom(request)
+        self.egresses[info.egress_id] = info
+        return info
+
+    def _start_track(self, request: api.TrackEgressRequest):
+        tracks = {track.sid for p in self.participants.get(request.room_name, []) for track in p.tracks}
+        if request.track_id not in tracks:
+            return web.json_response({"code": "not_found", "msg": "track not found"}, status=404)
+        info = api.EgressInfo(
+            egress_id=f"EG_{uuid.uuid4().hex[:12]}",
+            room_name=request.room_name,
+            status=api.EgressStatus.EGRESS_ACTIVE,
+            started_at=time.time_ns(),
+        )
+        info.track.CopyFrom(request)
+        self.egresses[info.egress_id] = info
+        return info
+
+    def _list_participants(self, request: api.ListParticipantsRequest):
+        return api.ListParticipantsResponse(participants=self.participants.get(request.room, []))
+
+    def _stop_egress(self, request: api.StopEgressRequest):
+        info = self.egresses.get(request.egress_id)
+        if info is None or info.status != api.EgressStatus.EGRESS_ACTIVE:
+            return web.json_response({"code": "failed_precondition", "msg": "egress not active"}, status=412)
+        info.status = api.EgressStatus.EGRESS_ENDING
+        info.ended_at = time.time_ns()
+        return info
+
+    def _list_egress(self, request: api.ListEgressRequest):
+        items = [
+            info for info in self.egresses.values()
+            if (not request.room_name or info.room_name == request.room_name)
+            and (not request.egress_id or info.egress_id == request.egress_id)
+            and (not request.active or info.status == api.EgressStatus.EGRESS_ACTIVE)
+        ]
+        return api.ListEgressResponse(items=items)
+
+
+async def _serve(port: int, latency: float):
+    server = FakeLiveKitServer(latency=latency, port=port)
+    print(f"Fake LiveKit egress API listening on {await server.start()}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=7880)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each call.")
+    args = parser.parse_args()
+    asyncio.run(_serve(args.port, args.latency))
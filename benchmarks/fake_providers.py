@@ -0,0 +1,265 @@
+"""
+Offline stand-ins for the agent's speech providers.
+
+They implement the livekit.agents plugin interfaces with a configurable latency, so the voice
+pipeline and the components wrapped around it can be exercised without network access or API keys.
+"""
+import time
+import random
+import asyncio
+import itertools
+from typing import Optional
+import numpy as np
+from livekit import rtc
+from livekit.agents import llm, stt, tts, vad, utils, APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS
+
+SPEECH_RMS = 500
+
+
+def frame_rms(frame: rtc.AudioFrame) -> float:
+    samples = np.frombuffer(frame.data, dtype=np.int16)
+    return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2))) if samples.size else 0.0
+
+
+class FakeVAD(vad.VAD):
+    """
+    Energy-based VAD with the same event sequence as Silero: START_OF_SPEECH after `min_speech_duration`
+    of loud audio, END_OF_SPEECH after `min_silence_duration` of quiet audio, INFERENCE_DONE per frame.
+    """
+    def __init__(self, min_speech_duration: float = 0.05, min_silence_duration: float = 0.55, threshold: float = SPEECH_RMS):
+        super().__init__(capabilities=vad.VADCapabilities(update_interval=0.032))
+        self.min_speech_duration = min_speech_duration
+        self.min_silence_duration = min_silence_duration
+        self.threshold = threshold
+
+    def stream(self) -> "FakeVADStream":
+        return FakeVADStream(self)
+
+
+class FakeVADStream(vad.VADStream):
+    async def _main_task(self) -> None:
+        fake_vad = self._vad
+        speaking = False
+        speech = silence = 0.0
+        samples_index = 0
+        async for frame in self._input_ch:
+            if not isinstance(frame, rtc.AudioFrame):
+                continue
+            started = time.perf_counter()
+            loud = frame_rms(frame) >= fake_vad.threshold
+            samples_index += frame.samples_per_channel
+            if loud:
+                speech += frame.duration
+                silence = 0.0 if speaking else silence
+            else:
+                silence += frame.duration
+                speech = speech if speaking else 0.0
+
+            common = dict(samples_index=samples_index, timestamp=time.time(), speech_duration=speech, silence_duration=silence)
+            self._event_ch.send_nowait(vad.VADEvent(
+                type=vad.VADEventType.INFERENCE_DONE, frames=[frame], probability=1.0 if loud else 0.0,
+                inference_duration=time.perf_counter() - started, speaking=speaking,
+                raw_accumulated_speech=speech, raw_accumulated_silence=silence, **common,
+            ))
+            if not speaking and speech >= fake_vad.min_speech_duration:
+                speaking = True
+                silence = 0.0
+                self._event_ch.send_nowait(vad.VADEvent(type=vad.VADEventType.START_OF_SPEECH, speaking=True, **common))
+            elif speaking and silence >= fake_vad.min_silence_duration:
+                speaking = False
+                speech = 0.0
+                self._event_ch.send_nowait(vad.VADEvent(type=vad.VADEventType.END_OF_SPEECH, speaking=False, **common))
+
+
+class FakeSTT(stt.STT):
+    """
+    Streaming STT that "recognizes" loud audio as the next line of `transcripts`.
+
+    Interim transcripts grow word by word every `interim_interval` seconds of speech; the final transcript
+    follows `latency` seconds after `endpoint_silence` of quiet audio.
+    """
+    def __init__(self, transcripts: list = None, latency: float = 0.15, interim_interval: float = 0.3,
+                 endpoint_silence: float = 0.3, threshold: float = SPEECH_RMS):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self.transcripts = transcripts or ["What is on my schedule today?"]
+        self.latency = latency
+        self.interim_interval = interim_interval
+        self.endpoint_silence = endpoint_silence
+        self.threshold = threshold
+
+    async def _recognize_impl(self, buffer, *, language=None, conn_options=DEFAULT_API_CONNECT_OPTIONS) -> stt.SpeechEvent:
+        raise NotImplementedError("FakeSTT only supports streaming")
+
+    def stream(self, *, language: Optional[str] = None, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "FakeRecognizeStream":
+        return FakeRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class FakeRecognizeStream(stt.RecognizeStream):
+    async def _run(self) -> None:
+        fake_stt = self._stt
+        lines = itertools.cycle(fake_stt.transcripts)
+        words, speech, silence, request_id = [], 0.0, 0.0, ""
+        pending = set()
+        try:
+            async for frame in self._input_ch:
+                if not isinstance(frame, rtc.AudioFrame):
+                    continue
+                if frame_rms(frame) >= fake_stt.threshold:
+                    if not words:
+                        words, request_id = next(lines).split(), utils.shortuuid()
+                        self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH, request_id=request_id))
+                    speech += frame.duration
+                    silence = 0.0
+                    heard = min(len(words), 1 + int(speech / fake_stt.interim_interval))
+                    if speech // fake_stt.interim_interval != (speech - frame.duration) // fake_stt.interim_interval:
+                        self._send(stt.SpeechEventType.INTERIM_TRANSCRIPT, request_id, " ".join(words[:heard]))
+                elif words:
+                    silence += frame.duration
+                    if silence >= fake_stt.endpoint_silence:
+                        task = asyncio.create_task(self._finalize(request_id, " ".join(words), speech))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+                        words, speech, silence = [], 0.0, 0.0
+        finally:
+            await utils.aio.gracefully_cancel(*pending)
+
+    async def _finalize(self, request_id: str, text: str, audio_duration: float) -> None:
+        await asyncio.sleep(self._stt.latency)
+        self._send(stt.SpeechEventType.FINAL_TRANSCRIPT, request_id, text)
+        self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH, request_id=request_id))
+        self._event_ch.send_nowait(stt.SpeechEvent(
+            type=stt.SpeechEventType.RECOGNITION_USAGE, request_id=request_id,
+            recognition_usage=stt.RecognitionUsage(audio_duration=audio_duration),
+        ))
+
+    def _send(self, event_type, request_id: str, text: str) -> None:
+        self._event_ch.send_nowait(stt.SpeechEvent(
+            type=event_type, request_id=request_id,
+            alternatives=[stt.SpeechData(language="en", text=text, confidence=1.0)],
+        ))
+
+
+class FakeTurnDetector:
+    """
+    Stands in for the end-of-utterance model: a user message ending in a question mark finishes the turn.
+
+    Right with probability `accuracy`; the pipeline waits max_endpointing_delay when it says the user
+    is not done.
+    """
+    def __init__(self, accuracy: float = 0.9, seed=0, unlikely_threshold: float = 0.15):
+        self.accuracy = accuracy
+        self.threshold = unlikely_threshold
+        self.rng = random.Random(seed)
+
+    def unlikely_threshold(self, language: Optional[str]) -> float:
+        return self.threshold
+
+    def supports_language(self, language: Optional[str]) -> bool:
+        return True
+
+    async def predict_end_of_turn(self, chat_ctx: llm.ChatContext) -> float:
+        finished = str(chat_ctx.messages[-1].content).rstrip().endswith("?")
+        if self.rng.random() >= self.accuracy:
+            finished = not finished
+        return 0.9 if finished else 0.01
+
+
+def prompt_chars(chat_ctx: llm.ChatContext) -> int:
+    return sum(len(m.content) for m in chat_ctx.messages if isinstance(m.content, str))
+
+
+class FakeLLM(llm.LLM):
+    """
+    LLM whose time to first token grows with the prompt: `latency` plus `latency_per_1k_chars` per 1000 prompt characters.
+
+    Streams `reply` word by word and reports roughly four characters per prompt token.
+    """
+    def __init__(self, latency: float = 0.1, latency_per_1k_chars: float = 0.02, reply: str = "Certainly, boss."):
+        super().__init__()
+        self.latency = latency
+        self.latency_per_1k_chars = latency_per_1k_chars
+        self.reply = reply
+        self.requests = 0
+        self.prompts = []
+
+    def chat(self, *, chat_ctx: llm.ChatContext, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+             fnc_ctx=None, **kwargs) -> "FakeLLMStream":
+        self.requests += 1
+        self.prompts.append(chat_ctx)
+        return FakeLLMStream(self, chat_ctx=chat_ctx, fnc_ctx=fnc_ctx, conn_options=conn_options)
+
+
+class FakeLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        fake_llm = self._llm
+        chars = prompt_chars(self._chat_ctx)
+        await asyncio.sleep(fake_llm.latency + fake_llm.latency_per_1k_chars * chars / 1000)
+        request_id = utils.shortuuid()
+        words = fake_llm.reply.split(" ")
+        for i, word in enumerate(words):
+            self._event_ch.send_nowait(llm.ChatChunk(
+                request_id=request_id,
+                choices=[llm.Choice(delta=llm.ChoiceDelta(role="assistant", content=word if i == 0 else " " + word))],
+            ))
+        self._event_ch.send_nowait(llm.ChatChunk(
+            request_id=request_id,
+            usage=llm.CompletionUsage(completion_tokens=len(words), prompt_tokens=chars // 4, total_tokens=len(words) + chars // 4),
+        ))
+
+
+class FakeTTS(tts.TTS):
+    """
+    Streaming TTS that answers every flushed segment with silence after `latency` seconds.
+
+    Emits `ms_per_char` milliseconds of audio per input character, in 10ms frames.
+    """
+    def __init__(self, latency: float = 0.2, ms_per_char: int = 60, sample_rate: int = 24000, num_channels: int = 1):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=True),
+            sample_rate=sample_rate,
+            num_channels=num_channels,
+        )
+        self.latency = latency
+        self.ms_per_char = ms_per_char
+        self.requests = 0
+
+    def synthesize(self, text: str, *, conn_options: Optional[APIConnectOptions] = None) -> tts.ChunkedStream:
+        raise NotImplementedError("FakeTTS only supports streaming")
+
+    def stream(self, *, conn_options: Optional[APIConnectOptions] = None) -> "FakeSynthesizeStream":
+        return FakeSynthesizeStream(tts=self, conn_options=conn_options)
+
+
+class FakeSynthesizeStream(tts.SynthesizeStream):
+    def __init__(self, *, tts: FakeTTS, conn_options: Optional[APIConnectOptions] = None):
+        super().__init__(tts=tts, conn_options=conn_options)
+        self._fake_tts = tts
+
+    async def _run(self) -> None:
+        text = ""
+        async for item in self._input_ch:
+            if isinstance(item, str):
+                self._mark_started()
+                text += item
+                continue
+            if text:
+                await self._emit(text)
+            text = ""
+        if text:
+            await self._emit(text)
+
+    async def _emit(self, text: str) -> None:
+        fake_tts = self._fake_tts
+        fake_tts.requests += 1
+        await asyncio.sleep(fake_tts.latency)
+        request_id = utils.shortuuid()
+        samples = fake_tts.sample_rate // 100
+        count = max(1, len(text) * fake_tts.ms_per_char // 10)
+        for i in range(count):
+            frame = rtc.AudioFrame(
+                data=bytes([i % 256, 0]) * samples * fake_tts.num_channels,
+                sample_rate=fake_tts.sample_rate,
+                num_channels=fake_tts.num_channels,
+                samples_per_channel=samples,
+            )
+            self._event_ch.send_nowait(tts.SynthesizedAudio(request_id=request_id, frame=frame, is_final=i == count - 1))
@@ -0,0 +1,100 @@
+"""
+Minimal in-process stand-in for a LiveKit room, enough to run a VoicePipelineAgent without a server.
+
+The remote participant's microphone is a FixtureTrack: audio pushed into it is what the agent's
+HumanInput receives. The agent's own track is a real rtc.AudioSource, so playout happens in real time
+exactly as in a room; nothing is sent over the network.
+"""
+import asyncio
+from types import SimpleNamespace
+from livekit import rtc
+from livekit.agents import utils
+from livekit.agents.pipeline import human_input
+
+
+class FixtureTrack:
+    """
+    Microphone track fed by the benchmark; frames pushed here reach the agent's VAD and STT.
+    """
+    def __init__(self, sid: str):
+        self.sid = sid
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def push(self, frame: rtc.AudioFrame):
+        self.queue.put_nowait(frame)
+
+
+class FixtureAudioStream:
+    """
+    Replaces rtc.AudioStream for FixtureTracks inside HumanInput.
+    """
+    def __init__(self, track: FixtureTrack, **kwargs):
+        self._track = track
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> rtc.AudioFrameEvent:
+        return rtc.AudioFrameEvent(frame=await self._track.queue.get())
+
+    async def aclose(self):
+        pass
+
+
+# HumanInput opens rtc.AudioStream(track); give it fixture streams instead of native ones
+human_input.rtc = SimpleNamespace(**{**vars(rtc), "AudioStream": FixtureAudioStream})
+
+
+class FakePublication:
+    def __init__(self, sid: str, track=None, source=rtc.TrackSource.SOURCE_MICROPHONE):
+        self.sid = sid
+        self.track = track
+        self.source = source
+        self.subscribed = True
+
+    def set_subscribed(self, subscribed: bool):
+        self.subscribed = subscribed
+
+    async def wait_for_subscription(self):
+        return None
+
+
+class FakeLocalParticipant:
+    def __init__(self, identity: str):
+        self.identity = identity
+        self.track_publications = {}
+        self.attributes = {}
+
+    async def publish_track(self, track, options=None) -> FakePublication:
+        publication = FakePublication(utils.shortuuid("TR_"), track, options.source if options else rtc.TrackSource.SOURCE_MICROPHONE)
+        self.track_publications[publication.sid] = publication
+        return publication
+
+    async def publish_transcription(self, transcription):
+        return None
+
+    async def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+
+class FakeRemoteParticipant:
+    def __init__(self, identity: str):
+        self.identity = identity
+        self.microphone = FixtureTrack(utils.shortuuid("TR_"))
+        publication = FakePublication(self.microphone.sid, self.microphone)
+        self.track_publications = {publication.sid: publication}
+
+
+class FakeRoom(rtc.EventEmitter):
+    """
+    A connected room with one agent (local) and one user (remote) participant.
+    """
+    def __init__(self, name: str, user_identity: str = "user"):
+        super().__init__()
+        self.name = name
+        self.local_participant = FakeLocalParticipant("agent")
+        self.user = FakeRemoteParticipant(user_identity)
+        self.remote_participants = {self.user.identity: self.user}
+
+    def isconnected(self) -> bool:
+        return True
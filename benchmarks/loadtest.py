@@ -0,0 +1,315 @@
+"""
+Offline load test of the API against local stand-ins.
+
+Starts moto for S3 (seeded with `--users` users holding `--recordings` recordings each) and the fake
+LiveKit egress server as subprocesses, so they do not compete with the app for the GIL. It then runs
+the app in-process and drives a weighted mix of requests from
+`--concurrency` clients. Reports throughput and p50/p95/p99 latency per operation as JSON.
+
+    python benchmarks/loadtest.py --requests 5000 --concurrency 32 --output results/HEAD.json
+    python benchmarks/loadtest.py --mix list=1,get_file_url=8,egress_start=1,egress_stop=1 --transport http
+    python benchmarks/loadtest.py --compare results/main.json --output results/HEAD.json
+
+Operations: list (full listing), list_page (limit=100), get_file_url, egress_start, egress_stop.
+With `--transport http` the app is served by uvicorn on a local port instead of called through ASGI.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import contextlib
+import subprocess
+from collections import deque
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+BUCKET = "loadtest-recordings"
+DEFAULT_MIX = "list=2,list_page=2,get_file_url=10,egress_start=1,egress_stop=1"
+
+
+def percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        **{f"p{q}_ms": round(percentile(ordered, q) * 1000, 3) for q in (50, 95, 99)},
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+class Workload:
+    """
+    State shared by the simulated clients: seeded users and keys, and egresses started during the run.
+    """
+    def __init__(self, users: list, keys: list, seed: int):
+        self.users = users
+        self.keys = keys
+        self.rng = random.Random(seed)
+        self.active_egresses = deque()
+
+    async def list(self, client):
+        return await client.get("/list", params={"user_id": self.rng.choice(self.users)})
+
+    async def list_page(self, client):
+        return await client.get("/list", params={"user_id": self.rng.choice(self.users), "limit": 100})
+
+    async def get_file_url(self, client):
+        return await client.get("/get_file_url", params={"file_key": self.rng.choice(self.keys)})
+
+    async def egress_start(self, client):
+        user_id = self.rng.choice(self.users)
+        response = await client.post("/egress/start", params={"user_id": user_id, "room_name": f"room-{self.rng.randrange(10**6)}"})
+        if response.status_code == 200:
+            self.active_egresses.append(response.json()["info"]["egress_id"])
+        return response
+
+    async def egress_stop(self, client):
+        if not self.active_egresses:
+            return None
+        return await client.post("/egress/stop", params={"egress_id": self.active_egresses.popleft()})
+
+
+OPERATIONS = ("list", "list_page", "get_file_url", "egress_start", "egress_stop")
+
+
+async def seed_recordings(users: int, recordings: int, concurrency: int = 64) -> tuple:
+    from aws_service import S3Session
+
+    session = S3Session()
+    await session.open()
+    semaphore = asyncio.Semaphore(concurrency)
+    user_ids = [f"load-user-{u}" for u in range(users)]
+    keys = [
+        f"sessions/{user_id}/recording_room{i}_{1700000000 + i}.{'ogg' if i % 4 == 0 else 'mp4'}"
+        for user_id in user_ids for i in range(recordings)
+    ]
+
+    async def put(key):
+        async with semaphore:
+            await session.s3.put_object(Bucket=BUCKET, Key=key, Body=b"0" * 64)
+
+    try:
+        await session.s3.create_bucket(Bucket=BUCKET)
+        await asyncio.gather(*(put(key) for key in keys))
+    finally:
+        await session.close()
+    return user_ids, keys
+
+
+async def drive(client, workload: Workload, weights: dict, total: int, duration: float, concurrency: int) -> dict:
+    names = list(weights)
+    weight_values = [weights[n] for n in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def client_loop():
+        nonlocal issued
+        while (deadline is None and issued < total) or (deadline is not None and time.perf_counter() < deadline):
+            issued += 1
+            name = workload.rng.choices(names, weights=weight_values)[0]
+            started = time.perf_counter()
+            try:
+                response = await getattr(workload, name)(client)
+                if response is None:
+                    continue
+                if response.status_code >= 400:
+                    errors[name] += 1
+            except Exception:
+                errors[name] += 1
+            latencies[name].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    routes = {name: summarize(latencies[name], errors[name], elapsed) for name in names if latencies[name]}
+    everything = [value for values in latencies.values() for value in values]
+    return {"elapsed_s": round(elapsed, 3), "total": summarize(everything, sum(errors.values()), elapsed), "routes": routes}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _start_process(command: list, port: int, timeout: float = 30) -> subprocess.Popen:
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{command[1]} exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return process
+        except OSError:
+            await asyncio.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{command[1]} did not start listening on port {port}")
+
+
+async def run(args) -> dict:
+    moto_port, livekit_port = _free_port(), _free_port()
+    os.environ.update({
+        "AWS_ENDPOINT_URL": f"http://127.0.0.1:{moto_port}",
+        "AWS_ACCESS_KEY_ID": "loadtest",
+        "AWS_SECRET_ACCESS_KEY": "loadtest",
+        "AWS_REGION": "us-east-1",
+        "AWS_BUCKET_NAME": BUCKET,
+        "LIVEKIT_URL": f"http://127.0.0.1:{livekit_port}",
+        "LIVEKIT_API_KEY": "loadtest",
+        "LIVEKIT_API_SECRET": "loadtest-secret-with-enough-bytes-for-hs256",
+        "S3_LIST_CACHE_TTL": str(args.list_cache_ttl),
+        "TRANSCRIPTS_ENABLED": "0",
+        # synthetic stops never upload a recording
+        "WAVEFORM_ENABLED": "0",
+    })
+    server = None
+    stand_ins = []
+    try:
+        stand_ins.append(await _start_process(
+            [sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(moto_port)], moto_port,
+        ))
+        stand_ins.append(await _start_process([
+            sys.executable, os.path.join(BENCH_DIR, "fake_livekit.py"),
+            "--port", str(livekit_port), "--latency", str(args.livekit_latency),
+        ], livekit_port))
+        seed_started = time.perf_counter()
+        users, keys = await seed_recordings(args.users, args.recordings)
+        seed_elapsed = time.perf_counter() - seed_started
+
+        from httpx import AsyncClient, ASGITransport, Limits
+        import main
+
+        if args.transport == "http":
+            import uvicorn
+
+            app_port = _free_port()
+            server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=app_port, log_level="warning"))
+            serve_task = asyncio.create_task(server.serve())
+            while not server.started:
+                await asyncio.sleep(0.05)
+            client = AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=60,
+                                 limits=Limits(max_connections=args.concurrency))
+        else:
+            await main.startup_event()
+            client = AsyncClient(transport=ASGITransport(app=main.app), base_url="http://loadtest", timeout=60)
+
+        workload = Workload(users, keys, args.seed)
+        async with client:
+            if args.warmup:
+                await drive(client, workload, parse_mix(args.mix), args.warmup, 0, args.concurrency)
+            result = await drive(client, workload, parse_mix(args.mix), args.requests, args.duration, args.concurrency)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await serve_task
+        elif "main" in sys.modules:
+            await sys.modules["main"].shutdown_event()
+        for process in stand_ins:
+            process.terminate()
+            process.wait()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "transport": args.transport,
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "recordings_per_user": args.recordings,
+            "livekit_latency": args.livekit_latency,
+            "list_cache_ttl": args.list_cache_ttl,
+            "seed_s": round(seed_elapsed, 1),
+        },
+        **result,
+    }
+
+
+def compare(baseline: dict, current: dict, max_regression: float) -> list:
+    """
+    Print per-operation changes against a baseline run; return the operations whose p95 regressed beyond max_regression percent.
+    """
+    regressions = []
+    print(f"{'operation':<14}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}", file=sys.stderr)
+    for name, now in current["routes"].items():
+        before = baseline["routes"].get(name)
+        if not before:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (now[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            print(f"{name:<14}{metric:<16}{before[metric]:>12}{now[metric]:>12}{change:>+9.1f}%", file=sys.stderr)
+            if metric == "p95_ms" and change > max_regression:
+                regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5, help="Seeded users.")
+    parser.add_argument("--recordings", type=int, default=2000, help="Seeded recordings per user.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operations, e.g. list=1,get_file_url=8.")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests to issue (ignored with --duration).")
+    parser.add_argument("--duration", type=float, default=0, help="Run for this many seconds instead of a request count.")
+    parser.add_argument("--warmup", type=int, default=100, help="Requests issued before measuring.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients.")
+    parser.add_argument("--transport", choices=("asgi", "http"), default="asgi")
+    parser.add_argument("--livekit-latency", type=float, default=0.02, help="Fake LiveKit server delay per call.")
+    parser.add_argument("--list-cache-ttl", type=float, default=30, help="S3_LIST_CACHE_TTL for the run; 0 disables the listing cache.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON result to this file as well as stdout.")
+    parser.add_argument("--compare", help="Baseline JSON result to compare against.")
+    parser.add_argument("--max-regression", type=float, default=20, help="Exit non-zero if any p95 grows more than this percent.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    # keep stdout for the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        result = asyncio.run(run(args))
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.max_regression)
+        if regressions:
+            print(f"p95 regressed by more than {args.max_regression}%: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
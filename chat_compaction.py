@@ -0,0 +1,99 @@
+import os
+import asyncio
+import logging
+from livekit.agents import llm
+from prometheus_metrics import AGENT_CHAT_CONTEXT_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the memory of a voice assistant. Merge the previous summary and the new conversation "
+    "excerpt into one short summary. Keep names, facts, requests and decisions; drop small talk. "
+    "Answer with the summary only."
+)
+
+
+def _text(message: llm.ChatMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    if isinstance(message.content, list):
+        return " ".join(part for part in message.content if isinstance(part, str))
+    return ""
+
+
+class ChatCompactor:
+    """
+    Keeps the chat context sent to the LLM bounded for the length of a voice session.
+
+    The leading system messages and the last `max_turns` user turns are sent verbatim. Older turns
+    are folded into a rolling summary by a background task once `summary_batch` of them pile up,
+    so the reply never waits for summarization; until a batch is folded it is sent verbatim.
+
+    Use `before_llm_cb` as the VoicePipelineAgent callback. The agent's own chat_ctx is left untouched.
+    """
+    def __init__(self, summary_llm: llm.LLM, max_turns: int = None, summary_batch: int = None, summary_timeout: float = None):
+        self.summary_llm = summary_llm
+        self.max_turns = max_turns if max_turns is not None else int(os.getenv("CHAT_CONTEXT_MAX_TURNS", 8))
+        self.summary_batch = summary_batch or int(os.getenv("CHAT_SUMMARY_BATCH", 4))
+        self.summary_timeout = summary_timeout or float(os.getenv("CHAT_SUMMARY_TIMEOUT", 20))
+        self.summary = ""
+        self._summarized_ids = set()
+        self._task = None
+
+    def before_llm_cb(self, agent, chat_ctx: llm.ChatContext):
+        return agent.llm.chat(chat_ctx=self.compact(chat_ctx), fnc_ctx=agent.fnc_ctx)
+
+    def compact(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        """
+        Return a copy of chat_ctx with old turns replaced by the summary, scheduling summarization of new overflow.
+        """
+        messages = chat_ctx.messages
+        head = 0
+        while head < len(messages) and messages[head].role == "system":
+            head += 1
+        system, history = messages[:head], messages[head:]
+        if self.max_turns <= 0:
+            return chat_ctx
+
+        user_indexes = [i for i, m in enumerate(history) if m.role == "user"]
+        cut = user_indexes[-self.max_turns] if len(user_indexes) > self.max_turns else 0
+        overflow = [m for m in history[:cut] if m.id not in self._summarized_ids]
+        compacted = llm.ChatContext(messages=[m.copy() for m in system])
+        if self.summary:
+            compacted.messages.append(llm.ChatMessage.create(text=f"{SUMMARY_PREFIX} {self.summary}", role="system"))
+        compacted.messages.extend(m.copy() for m in overflow + history[cut:])
+        compacted._metadata = chat_ctx._metadata
+
+        if sum(1 for m in overflow if m.role == "user") >= self.summary_batch and self._task is None:
+            self._task = asyncio.create_task(self._summarize(overflow))
+        AGENT_CHAT_CONTEXT_MESSAGES.observe(len(compacted.messages))
+        return compacted
+
+    async def _summarize(self, messages: list):
+        try:
+            excerpt = "\n".join(f"{m.role}: {_text(m)}" for m in messages if _text(m))
+            prompt = llm.ChatContext().append(role="system", text=SUMMARY_INSTRUCTIONS)
+            prompt.append(role="user", text=f"Previous summary: {self.summary or '(none)'}\n\nConversation:\n{excerpt}")
+            summary = await asyncio.wait_for(self._complete(prompt), self.summary_timeout)
+            if summary:
+                self.summary = summary
+                self._summarized_ids.update(m.id for m in messages)
+                logger.info("Folded %d chat messages into the rolling summary (%d chars)", len(messages), len(summary))
+        except Exception as e:
+            logger.error("Failed to summarize chat context: %s", e)
+        finally:
+            self._task = None
+
+    async def _complete(self, chat_ctx: llm.ChatContext) -> str:
+        parts = []
+        async with self.summary_llm.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                for choice in chunk.choices:
+                    parts.append(choice.delta.content or "")
+        return "".join(parts).strip()
+
+    async def aclose(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
@@ -0,0 +1,27 @@
+import pytest
+import pytest_asyncio
+from moto.server import ThreadedMotoServer
+from aws_service import S3Session
+
+BUCKET = "test-recordings"
+
+@pytest.fixture(scope="module")
+def moto_server():
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+@pytest_asyncio.fixture
+async def s3_session(moto_server, monkeypatch):
+    monkeypatch.setenv("AWS_ENDPOINT_URL", moto_server)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_BUCKET_NAME", BUCKET)
+    session = S3Session()
+    await session.open()
+    await session.s3.create_bucket(Bucket=BUCKET)
+    yield session
+    await session.close()
@@ -1,104 +1,435 @@
 import os
+import json
 import time
+import uuid
+import asyncio
+import inspect
 import logging
 from dotenv import load_dotenv
 from livekit import api
+from egress_store import EgressStore, create_egress_store
+from aws_service import hls_directory
+from prometheus_metrics import EGRESS_STARTS, observe_call
 
 load_dotenv(dotenv_path=".env.local")
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+EGRESS_WEBHOOK_EVENTS = ("egress_started", "egress_updated", "egress_ended")
+EGRESS_MODES = ("composite", "track", "hls")
+# statuses (from webhooks) of egresses that will not record any further
+EGRESS_FINISHING_STATUSES = ("EGRESS_ENDING", "EGRESS_COMPLETE", "EGRESS_FAILED", "EGRESS_ABORTED", "EGRESS_LIMIT_REACHED")
+
+
+class TrackNotFound(Exception):
+    """
+    The room has no microphone track that a track egress could record.
+    """
+
+
+def user_id_from_filepath(filepath: str):
+    """
+    Extract the user ID from a sessions/{user_id}/... recording path, or None.
+    """
+    parts = (filepath or "").split("/")
+    if len(parts) >= 3 and parts[0] == "sessions" and parts[1]:
+        return parts[1]
+    return None
+
+
+def _egress_filepaths(info) -> list:
+    paths = [f.filename for f in info.file_results if f.filename]
+    paths.extend(s.playlist_name for s in info.segment_results if s.playlist_name)
+    for request in (info.room_composite, info.track):
+        outputs = list(getattr(request, "file_outputs", [])) + ([request.file] if request.HasField("file") else [])
+        paths.extend(output.filepath for output in outputs if output.filepath)
+        paths.extend(output.playlist_name for output in getattr(request, "segment_outputs", []) if output.playlist_name)
+    return paths
+
 class EgressSession:
     """
     Manages LiveKit egress operations: start, list, stop.
 
     Instantiates a single LiveKitAPI client and keeps it open until close().
+    Active egress metadata lives in an EgressStore so that any API worker can stop or list it.
     """
-    def __init__(self):
+    def __init__(self, store: EgressStore = None):
         api_key = os.getenv("LIVEKIT_API_KEY")
         api_secret = os.getenv("LIVEKIT_API_SECRET")
         livekit_url = os.getenv("LIVEKIT_URL")
         if not all([api_key, api_secret, livekit_url]):
             raise ValueError("Missing LiveKit environment variables: API_KEY, API_SECRET, or URL")
         self.lkapi = api.LiveKitAPI(api_key=api_key, api_secret=api_secret, url=livekit_url)
-        self.active_egresses = {}
+        self.webhook_receiver = api.WebhookReceiver(api.TokenVerifier(api_key, api_secret))
+        self.store = store or create_egress_store()
+        self.batch_concurrency = int(os.getenv("EGRESS_BATCH_CONCURRENCY", 8))
+        self.dedup_window = float(os.getenv("EGRESS_START_DEDUP_WINDOW", 30))
+        self.video_preset = os.getenv("EGRESS_VIDEO_PRESET", "PORTRAIT_H264_1080P_30")
+        api.EncodingOptionsPreset.Value(self.video_preset)  # fail at startup on an unknown preset name
+        # idempotency keys are remembered past the egress' stop, so a late retry does not record again
+        self.idempotency_ttl = float(os.getenv("EGRESS_IDEMPOTENCY_TTL", 86400))
+        # how long a start may hold its reservation before LiveKit answers; a crashed worker's lapses
+        self.start_lease = float(os.getenv("EGRESS_START_LEASE", 60))
+        self.claim_poll_interval = float(os.getenv("EGRESS_START_POLL_INTERVAL", 0.1))
+        self._starting = {}
+        s3_upload = api.S3Upload(
+            bucket=os.getenv("AWS_BUCKET_NAME"),
+            region=os.getenv("AWS_REGION"),
+            access_key=os.getenv("AWS_ACCESS_KEY_ID"),
+            secret=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            force_path_style=True,
+        )
+        # Output templates are built once; each start only copies one and sets its filepath.
+        self._file_output_templates = {
+            False: api.EncodedFileOutput(file_type=api.EncodedFileType.MP4, s3=s3_upload),
+            True: api.EncodedFileOutput(file_type=api.EncodedFileType.OGG, s3=s3_upload),
+        }
+        self._direct_file_template = api.DirectFileOutput(s3=s3_upload)
+        # the playlist is uploaded again after every segment, so players can start while the session runs
+        self._segment_output_template = api.SegmentedFileOutput(
+            protocol=api.SegmentedFileProtocol.HLS_PROTOCOL,
+            segment_duration=int(os.getenv("EGRESS_SEGMENT_DURATION", 6)),
+            s3=s3_upload,
+        )
+        self._start_listeners = []
+        self._stop_listeners = []
+
+    def add_start_listener(self, callback):
+        """
+        Register a callback invoked with the metadata dict every time start_recording() starts an egress.
+        The callback may be a plain function or a coroutine function.
+        """
+        self._start_listeners.append(callback)
 
-    async def start_room_composite(self, room_name: str, user_id:str, audio_only:bool=False) -> dict:
+    def add_stop_listener(self, callback):
+        """
+        Register a callback invoked with the result dict every time an egress stops: when stop_egress()
+        completes, or when an egress_ended webhook arrives for one that ended on its own.
+        The callback may be a plain function or a coroutine function.
+        """
+        self._stop_listeners.append(callback)
+
+    async def start_room_composite(self, room_name: str, user_id:str, audio_only:bool=False, idempotency_key: str = None) -> dict:
         """
         Start a composite egress for the given room and return metadata.
         """
+        return await self.start_recording(room_name, user_id, audio_only=audio_only, idempotency_key=idempotency_key)
+
+    async def start_recording(
+        self,
+        room_name: str,
+        user_id: str,
+        mode: str = "composite",
+        audio_only: bool = False,
+        preset: str = None,
+        participant_identity: str = None,
+        idempotency_key: str = None,
+    ) -> dict:
+        """
+        Start recording a room and return metadata, without recording the same room twice.
+
+        mode "composite" renders the room into one MP4 (or OGG with audio_only), "track" writes one
+        participant's microphone track to OGG as published, without the compositor, and "hls" renders
+        the room into HLS segments and a playlist that can be played while the session runs.
+        `preset` names a LiveKit EncodingOptionsPreset for video (default EGRESS_VIDEO_PRESET).
+
+        Before calling LiveKit, a start reserves its idempotency key, or (without a key) its room, user
+        and output for dedup_window seconds, in the store. Starts that find the reservation taken, in
+        this or another API worker, wait for its egress and return it with reused=True; a keyed
+        retry gets it even after it stopped, an unkeyed one only while it is still recording.
+        A key reused for a different room, user or output raises ValueError.
+        """
+        if mode not in EGRESS_MODES:
+            raise ValueError(f"Unknown egress mode: {mode}")
+        audio_only = bool(audio_only) or mode == "track"
+        preset = None if audio_only else preset or self.video_preset
+        if preset is not None and preset not in api.EncodingOptionsPreset.keys():
+            raise ValueError(f"Unknown encoding preset: {preset}")
+        output = (mode, audio_only, preset)
+        # starts in this process join the one in flight without touching the store
+        key = (room_name, user_id, output, idempotency_key)
+        task = self._starting.get(key)
+        if task is not None:
+            EGRESS_STARTS.labels("coalesced").inc()
+            metadata = await asyncio.shield(task)
+            return {**metadata, "reused": True}
+        task = asyncio.ensure_future(self._claim_and_start(room_name, user_id, output, participant_identity, idempotency_key))
+        self._starting[key] = task
+        task.add_done_callback(lambda _: self._starting.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _recording(self, egress_id: str) -> bool:
+        metadata = await self.store.get(egress_id)
+        return metadata is not None and metadata.get("status") not in EGRESS_FINISHING_STATUSES
+
+    async def _claim_and_start(self, room_name: str, user_id: str, output: tuple, participant_identity: str = None,
+                               idempotency_key: str = None) -> dict:
+        request = {"room_name": room_name, "user_id": user_id, "output": list(output)}
+        if idempotency_key:
+            name, ttl = f"key:{idempotency_key}", self.idempotency_ttl
+        elif self.dedup_window > 0:
+            name, ttl = "start:" + json.dumps(request), self.dedup_window
+        else:
+            return {**await self._start(room_name, user_id, output, participant_identity), "reused": False}
+        token = uuid.uuid4().hex
+        # the store is shared by API workers, so exactly one of concurrent duplicate starts gets the reservation
+        while (held := await self.store.claim(name, token, request, self.start_lease)) is not None:
+            if held["request"] != request:
+                raise ValueError("Idempotency key was already used for a different egress request")
+            metadata = held["metadata"]
+            if metadata is None:
+                # the holder, maybe in another worker, is waiting for LiveKit to start its egress
+                await asyncio.sleep(self.claim_poll_interval)
+                continue
+            if idempotency_key or await self._recording(metadata["egress_id"]):
+                logger.info("Reusing egress %s for room %s", metadata["egress_id"], room_name)
+                EGRESS_STARTS.labels("reused").inc()
+                return {**metadata, "reused": True}
+            # the egress this start duplicates has already ended, so record again
+            if await self.store.take_over(name, held["token"], token, request, self.start_lease):
+                break
+        try:
+            metadata = await self._start(room_name, user_id, output, participant_identity, idempotency_key)
+        except BaseException:
+            await self.store.release(name, token)
+            raise
+        await self.store.fulfil(name, token, metadata, ttl)
+        return {**metadata, "reused": False}
+
+    async def _start(self, room_name: str, user_id: str, output: tuple, participant_identity: str = None,
+                     idempotency_key: str = None) -> dict:
+        mode, audio_only, preset = output
         timestamp = int(time.time())
-        filename = f"recording_{room_name}_{timestamp}"
-        if(audio_only):
-            request = api.RoomCompositeEgressRequest(
-                room_name=room_name,
-                audio_only=True,
-                file_outputs=[
-                    api.EncodedFileOutput(
-                    file_type=api.EncodedFileType.OGG,
-                    filepath=f"sessions/{user_id}" + "/" + filename,
-                    s3=api.S3Upload(
-                        bucket=os.getenv("AWS_BUCKET_NAME"),
-                        region=os.getenv("AWS_REGION"),
-                        access_key=os.getenv("AWS_ACCESS_KEY_ID"),
-                        secret=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                        force_path_style=True,
-                    ),
-                )
-                ],
-            )
+        filepath = f"sessions/{user_id}/recording_{room_name}_{timestamp}"
+        if mode == "track":
+            egress_id, file_key = await self._start_track(room_name, filepath, participant_identity)
+        elif mode == "hls":
+            egress_id, file_key = await self._start_segmented(room_name, filepath, audio_only, preset)
         else:
-            request = api.RoomCompositeEgressRequest(
-                room_name=room_name,
-                audio_only=False,
-                file_outputs=[
-                    api.EncodedFileOutput(
-                    file_type=api.EncodedFileType.MP4,
-                    filepath=f"sessions/{user_id}" + "/" + filename,
-                    s3=api.S3Upload(
-                        bucket=os.getenv("AWS_BUCKET_NAME"),
-                        region=os.getenv("AWS_REGION"),
-                        access_key=os.getenv("AWS_ACCESS_KEY_ID"),
-                        secret=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                        force_path_style=True,
-                    ),
-                )
-                ],
-                preset=api.EncodingOptionsPreset.PORTRAIT_H264_1080P_30,
-            )
-        logger.debug("Starting composite egress: %s", request)
-        response = await self.lkapi.egress.start_room_composite_egress(request)
-        egress_id = response.egress_id
-        logger.info("Composite egress started: %s", egress_id)
+            egress_id, file_key = await self._start_composite(room_name, filepath, audio_only, preset)
         metadata = {
             "egress_id": egress_id,
             "room_name": room_name,
             "user_id": user_id,
-            "started_at": timestamp
+            "started_at": timestamp,
+            "file_key": file_key,
+            "mode": mode,
+            "audio_only": audio_only,
         }
-        print(f"Composite egress started: {egress_id}")
-        self.active_egresses[egress_id] = metadata
+        if preset:
+            metadata["preset"] = preset
+        if idempotency_key:
+            metadata["idempotency_key"] = idempotency_key
+        logger.info("Egress %s recording %s to %s", egress_id, room_name, file_key)
+        await self.store.put(metadata)
+        await self._notify(self._start_listeners, metadata, "start")
+        EGRESS_STARTS.labels("started").inc()
         return metadata
 
+    async def _start_composite(self, room_name: str, filepath: str, audio_only: bool, preset: str = None) -> tuple:
+        file_output = api.EncodedFileOutput()
+        file_output.CopyFrom(self._file_output_templates[audio_only])
+        file_output.filepath = filepath
+        request = api.RoomCompositeEgressRequest(
+            room_name=room_name,
+            audio_only=audio_only,
+            file_outputs=[file_output],
+        )
+        if preset:
+            request.preset = api.EncodingOptionsPreset.Value(preset)
+        logger.debug("Starting composite egress: %s", request)
+        async with observe_call("livekit", "start_room_composite_egress"):
+            response = await self.lkapi.egress.start_room_composite_egress(request)
+        logger.info("Composite egress started: %s", response.egress_id)
+        # egress appends the extension of the file type to a filepath that has none
+        return response.egress_id, filepath + (".ogg" if audio_only else ".mp4")
+
+    async def _start_segmented(self, room_name: str, filepath: str, audio_only: bool, preset: str = None) -> tuple:
+        segment_output = api.SegmentedFileOutput()
+        segment_output.CopyFrom(self._segment_output_template)
+        # the playlist and its segments (<recording>_00000.ts, ...) get a directory of their own, so
+        # listing the user's recordings does not have to page through every segment
+        directory = hls_directory(filepath)
+        name = filepath.rsplit("/", 1)[-1]
+        segment_output.filename_prefix = directory + name
+        segment_output.playlist_name = directory + name + ".m3u8"
+        request = api.RoomCompositeEgressRequest(
+            room_name=room_name,
+            audio_only=audio_only,
+            segment_outputs=[segment_output],
+        )
+        if preset:
+            request.preset = api.EncodingOptionsPreset.Value(preset)
+        logger.debug("Starting segmented egress: %s", request)
+        async with observe_call("livekit", "start_room_composite_egress"):
+            response = await self.lkapi.egress.start_room_composite_egress(request)
+        logger.info("Segmented egress started: %s", response.egress_id)
+        return response.egress_id, segment_output.playlist_name
+
+    async def _start_track(self, room_name: str, filepath: str, participant_identity: str = None) -> tuple:
+        track_id = await self._audio_track(room_name, participant_identity)
+        file_output = api.DirectFileOutput()
+        file_output.CopyFrom(self._direct_file_template)
+        file_output.filepath = filepath + ".ogg"
+        request = api.TrackEgressRequest(room_name=room_name, track_id=track_id, file=file_output)
+        logger.debug("Starting track egress: %s", request)
+        async with observe_call("livekit", "start_track_egress"):
+            response = await self.lkapi.egress.start_track_egress(request)
+        logger.info("Track egress started: %s", response.egress_id)
+        return response.egress_id, file_output.filepath
+
+    async def _audio_track(self, room_name: str, participant_identity: str = None) -> str:
+        """
+        SID of the microphone track of `participant_identity`, or of the first participant that is not an agent.
+        """
+        async with observe_call("livekit", "list_participants"):
+            response = await self.lkapi.room.list_participants(api.ListParticipantsRequest(room=room_name))
+        for participant in response.participants:
+            if participant_identity and participant.identity != participant_identity:
+                continue
+            if not participant_identity and participant.kind != api.ParticipantInfo.Kind.STANDARD:
+                continue
+            for track in participant.tracks:
+                if track.type == api.TrackType.AUDIO and track.source == api.TrackSource.MICROPHONE:
+                    return track.sid
+        raise TrackNotFound(f"No microphone track to record in room {room_name}")
+
     async def stop_egress(self, egress_id: str) -> dict:
         """
         Stop a running egress by its ID.
         """
         logger.debug("Stopping egress: %s", egress_id)
         request = api.StopEgressRequest(egress_id=egress_id)
-        response = await self.lkapi.egress.stop_egress(request)
+        async with observe_call("livekit", "stop_egress"):
+            response = await self.lkapi.egress.stop_egress(request)
         logger.info("Egress stopped: %s", egress_id)
 
+        metadata = await self.store.pop(egress_id) or {}
         result = {
             "egress_id": response.egress_id,
             "room_name": getattr(response, 'room_name', None),
+            "user_id": metadata.get("user_id"),
+            "file_key": metadata.get("file_key"),
             "status": response.status,
             "stopped_at": int(time.time())
         }
-        self.active_egresses.pop(egress_id, None)
+        await self._notify(self._stop_listeners, result, "stop")
         return result
 
+    async def _notify(self, listeners: list, info: dict, event: str):
+        for callback in listeners:
+            try:
+                outcome = callback(info)
+                if inspect.isawaitable(outcome):
+                    await outcome
+            except Exception as e:
+                logger.error("Egress %s listener failed for %s: %s", event, info.get("egress_id"), e)
+
+    async def start_batch(self, items: list, concurrency: int = None) -> list:
+        """
+        Start composite egresses for many rooms, at most `concurrency` LiveKit calls at a time.
+
+        Each item is a dict with room_name, user_id and the optional arguments of start_recording(). Returns one result per item, in order.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.batch_concurrency)
+
+        async def start_one(item: dict) -> dict:
+            async with semaphore:
+                try:
+                    info = await self.start_recording(
+                        item["room_name"], item["user_id"], mode=item.get("mode") or "composite",
+                        audio_only=item.get("audio_only", False), preset=item.get("preset"),
+                        participant_identity=item.get("participant_identity"), idempotency_key=item.get("idempotency_key"),
+                    )
+                    return {"room_name": item["room_name"], "user_id": item["user_id"], "success": True, "info": info}
+                except Exception as e:
+                    logger.error("Failed to start egress for room %s: %s", item["room_name"], e)
+                    return {"room_name": item["room_name"], "user_id": item["user_id"], "success": False, "error": str(e)}
+
+        return await asyncio.gather(*(start_one(item) for item in items))
+
+    async def stop_batch(self, egress_ids: list, concurrency: int = None) -> list:
+        """
+        Stop many egresses, at most `concurrency` LiveKit calls at a time. Returns one result per ID, in order.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.batch_concurrency)
+
+        async def stop_one(egress_id: str) -> dict:
+            async with semaphore:
+                try:
+                    info = await self.stop_egress(egress_id)
+                    return {"egress_id": egress_id, "success": True, "info": info}
+                except Exception as e:
+                    logger.error("Failed to stop egress %s: %s", egress_id, e)
+                    return {"egress_id": egress_id, "success": False, "error": str(e)}
+
+        return await asyncio.gather(*(stop_one(egress_id) for egress_id in egress_ids))
+
+    async def receive_webhook(self, body: str, auth_token: str):
+        """
+        Verify a LiveKit webhook and apply egress events to the store.
+
+        Returns a normalized event dict for egress_started/updated/ended, or None for other events.
+        Raises if the signature or body hash does not match. egress_ended notifies the stop listeners
+        unless stop_egress() already did, i.e. for egresses that ended on their own (time limit, room closed).
+        """
+        event = self.webhook_receiver.receive(body, auth_token)
+        if event.event not in EGRESS_WEBHOOK_EVENTS:
+            return None
+        info = event.egress_info
+        metadata = await self.store.get(info.egress_id) or {}
+        user_id = metadata.get("user_id") or next(filter(None, map(user_id_from_filepath, _egress_filepaths(info))), None)
+        result = {
+            "event": event.event,
+            "egress_id": info.egress_id,
+            "room_name": info.room_name or metadata.get("room_name"),
+            "user_id": user_id,
+            "status": api.EgressStatus.Name(info.status),
+            "error": info.error or None,
+            "files": [
+                {"filename": f.filename, "location": f.location, "size": f.size, "duration": f.duration / 1e9}
+                for f in info.file_results
+            ],
+            "received_at": int(time.time()),
+        }
+        if event.event == "egress_ended":
+            # whichever of stop_egress() and this webhook removes the record notifies the listeners
+            if await self.store.pop(info.egress_id) is not None:
+                paths = _egress_filepaths(info)
+                await self._notify(self._stop_listeners, {
+                    "egress_id": info.egress_id,
+                    "room_name": result["room_name"],
+                    "user_id": user_id,
+                    "file_key": metadata.get("file_key") or (paths[0] if paths else None),
+                    "status": result["status"],
+                    "stopped_at": result["received_at"],
+                }, "stop")
+        elif user_id:
+            await self.store.put({
+                **metadata,
+                "egress_id": info.egress_id,
+                "room_name": result["room_name"],
+                "user_id": user_id,
+                "started_at": metadata.get("started_at") or int(info.started_at / 1e9) or None,
+                "status": result["status"],
+            })
+        logger.info("Egress webhook %s for %s (%s)", event.event, info.egress_id, result["status"])
+        return result
+
+    async def list_active(self, egress_id: str = None, user_id: str = None, room_name: str = None) -> list:
+        """
+        List active egresses, optionally filtered by egress ID, user and/or room.
+        """
+        if egress_id:
+            metadata = await self.store.get(egress_id)
+            if not metadata:
+                return []
+            if (user_id and metadata["user_id"] != user_id) or (room_name and metadata["room_name"] != room_name):
+                return []
+            return [metadata]
+        return await self.store.find(user_id=user_id, room_name=room_name)
+
     async def close(self):
         """
         Close the underlying LiveKit API client to avoid unclosed sessions.
@@ -106,3 +437,4 @@ class EgressSession:
         if self.lkapi:
             await self.lkapi.aclose()
             self.lkapi = None
+        await self.store.close()
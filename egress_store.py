@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env.local")
+
+logger = logging.getLogger(__name__)
+
+
+class EgressStore:
+    """
+    Where EgressSession keeps metadata of active egresses.
+
+    Every record is a dict holding at least egress_id, user_id and room_name.
+    """
+    async def put(self, metadata: dict):
+        raise NotImplementedError
+
+    async def get(self, egress_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def pop(self, egress_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def find(self, user_id: Optional[str] = None, room_name: Optional[str] = None) -> list:
+        raise NotImplementedError
+
+    async def claim(self, name: str, token: str, request: dict, lease: float) -> Optional[dict]:
+        """
+        Atomically reserve `name` (an idempotency key or a start request) for the holder of `token`.
+
+        The reservation lapses after `lease` seconds unless fulfil() extends it. Returns None when
+        the caller got it, else the current holder's record: its token, request and, once the
+        holder started its egress, that egress' metadata.
+        """
+        raise NotImplementedError
+
+    async def take_over(self, name: str, held_token: str, token: str, request: dict, lease: float) -> bool:
+        """
+        Move a reservation from `held_token` to `token`; False if it changed hands meanwhile.
+        """
+        raise NotImplementedError
+
+    async def fulfil(self, name: str, token: str, metadata: dict, ttl: float):
+        """
+        Attach the started egress' metadata to a reservation and keep it for `ttl` seconds.
+        """
+        raise NotImplementedError
+
+    async def release(self, name: str, token: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryEgressStore(EgressStore):
+    """
+    Per-process store. Only correct when the API runs as a single worker.
+    """
+    def __init__(self):
+        self._egresses = {}
+        self._claims = {}
+
+    async def put(self, metadata: dict):
+        self._egresses[metadata["egress_id"]] = dict(metadata)
+
+    async def get(self, egress_id: str) -> Optional[dict]:
+        metadata = self._egresses.get(egress_id)
+        return dict(metadata) if metadata else None
+
+    async def pop(self, egress_id: str) -> Optional[dict]:
+        return self._egresses.pop(egress_id, None)
+
+    async def find(self, user_id: Optional[str] = None, room_name: Optional[str] = None) -> list:
+        return [
+            dict(metadata) for metadata in self._egresses.values()
+            if (user_id is None or metadata["user_id"] == user_id)
+            and (room_name is None or metadata["room_name"] == room_name)
+        ]
+
+    async def claim(self, name: str, token: str, request: dict, lease: float) -> Optional[dict]:
+        held = self._claims.get(name)
+        if held is None or held["expires_at"] < time.time():
+            self._claims[name] = {"token": token, "request": request, "metadata": None, "expires_at": time.time() + lease}
+            return None
+        return dict(held)
+
+    async def take_over(self, name: str, held_token: str, token: str, request: dict, lease: float) -> bool:
+        held = self._claims.get(name)
+        if held is None or held["token"] != held_token:
+            return False
+        self._claims[name] = {"token": token, "request": request, "metadata": None, "expires_at": time.time() + lease}
+        return True
+
+    async def fulfil(self, name: str, token: str, metadata: dict, ttl: float):
+        held = self._claims.get(name)
+        if held is not None and held["token"] == token:
+            held.update(metadata=dict(metadata), expires_at=time.time() + ttl)
+
+    async def release(self, name: str, token: str):
+        if self._claims.get(name, {}).get("token") == token:
+            del self._claims[name]
+
+
+class SQLiteEgressStore(EgressStore):
+    """
+    SQLite-backed store shared by every worker process on the host.
+
+    Uses WAL journaling and a busy timeout so concurrent writers from several uvicorn
+    workers queue up instead of failing; user_id and room_name lookups are indexed.
+    Start reservations live in egress_claims, whose primary key makes claim() atomic across workers.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS egresses (
+                egress_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                room_name TEXT NOT NULL,
+                started_at INTEGER,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_egresses_user_id ON egresses (user_id);
+            CREATE INDEX IF NOT EXISTS idx_egresses_room_name ON egresses (room_name);
+            CREATE TABLE IF NOT EXISTS egress_claims (
+                name TEXT PRIMARY KEY,
+                token TEXT NOT NULL,
+                request TEXT NOT NULL,
+                metadata TEXT,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_egress_claims_expires_at ON egress_claims (expires_at);
+            """
+        )
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _claim(self, name: str, token: str, request: dict, lease: float) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM egress_claims WHERE expires_at < ?", (now,))
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO egress_claims (name, token, request, expires_at) VALUES (?, ?, ?, ?)",
+                    (name, token, json.dumps(request), now + lease),
+                ).rowcount
+                row = None if inserted else self._conn.execute(
+                    "SELECT token, request, metadata, expires_at FROM egress_claims WHERE name = ?", (name,)
+                ).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {
+            "token": row["token"],
+            "request": json.loads(row["request"]),
+            "metadata": json.loads(row["metadata"]) if row["metadata"] else None,
+            "expires_at": row["expires_at"],
+        }
+
+    async def claim(self, name: str, token: str, request: dict, lease: float) -> Optional[dict]:
+        return await asyncio.to_thread(self._claim, name, token, request, lease)
+
+    async def take_over(self, name: str, held_token: str, token: str, request: dict, lease: float) -> bool:
+        changed = await asyncio.to_thread(
+            self._write,
+            "UPDATE egress_claims SET token = ?, request = ?, metadata = NULL, expires_at = ? WHERE name = ? AND token = ?",
+            (token, json.dumps(request), time.time() + lease, name, held_token),
+        )
+        return changed == 1
+
+    async def fulfil(self, name: str, token: str, metadata: dict, ttl: float):
+        await asyncio.to_thread(
+            self._write,
+            "UPDATE egress_claims SET metadata = ?, expires_at = ? WHERE name = ? AND token = ?",
+            (json.dumps(metadata), time.time() + ttl, name, token),
+        )
+
+    async def release(self, name: str, token: str):
+        await asyncio.to_thread(self._write, "DELETE FROM egress_claims WHERE name = ? AND token = ?", (name, token))
+
+    async def put(self, metadata: dict):
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO egresses (egress_id, user_id, room_name, started_at, metadata) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (egress_id) DO UPDATE SET user_id = excluded.user_id, room_name = excluded.room_name, "
+            "started_at = excluded.started_at, metadata = excluded.metadata",
+            (metadata["egress_id"], metadata["user_id"], metadata["room_name"], metadata.get("started_at"), json.dumps(metadata)),
+        )
+
+    async def get(self, egress_id: str) -> Optional[dict]:
+        rows = await asyncio.to_thread(self._execute, "SELECT metadata FROM egresses WHERE egress_id = ?", (egress_id,))
+        return json.loads(rows[0]["metadata"]) if rows else None
+
+    async def pop(self, egress_id: str) -> Optional[dict]:
+        rows = await asyncio.to_thread(self._execute, "DELETE FROM egresses WHERE egress_id = ? RETURNING metadata", (egress_id,))
+        return json.loads(rows[0]["metadata"]) if rows else None
+
+    async def find(self, user_id: Optional[str] = None, room_name: Optional[str] = None) -> list:
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if room_name is not None:
+            clauses.append("room_name = ?")
+            params.append(room_name)
+        sql = "SELECT metadata FROM egresses"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY started_at"
+        rows = await asyncio.to_thread(self._execute, sql, tuple(params))
+        return [json.loads(row["metadata"]) for row in rows]
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_egress_store() -> EgressStore:
+    """
+    Build the store selected by EGRESS_STORE ("memory" or "sqlite"; sqlite uses EGRESS_DB_PATH).
+    """
+    backend = os.getenv("EGRESS_STORE", "memory").lower()
+    if backend == "memory":
+        return MemoryEgressStore()
+    if backend == "sqlite":
+        path = os.getenv("EGRESS_DB_PATH", "egress_state.db")
+        logger.info("Using SQLite egress store at %s", path)
+        return SQLiteEgressStore(path)
+    raise ValueError(f"Unknown EGRESS_STORE backend: {backend}")
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of events, filtered by user and/or room.
+    """
+    def __init__(self, user_id: Optional[str] = None, room_name: Optional[str] = None, max_queue: int = 100):
+        self.user_id = user_id
+        self.room_name = room_name
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def matches(self, event: dict) -> bool:
+        return (self.user_id is None or event.get("user_id") == self.user_id) and \
+            (self.room_name is None or event.get("room_name") == self.room_name)
+
+    def offer(self, event: dict):
+        """
+        Enqueue without blocking the publisher; a slow subscriber loses its oldest event instead.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class EventBus:
+    """
+    In-process fan-out of egress events to server-sent event subscribers.
+
+    Subscribers only receive events published by the same API worker process; SharedEventBus
+    extends the fan-out to every worker on the host.
+    """
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscriptions = set()
+
+    def subscribe(self, user_id: Optional[str] = None, room_name: Optional[str] = None) -> Subscription:
+        subscription = Subscription(user_id, room_name, self.max_queue)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def broadcast(self, event: dict):
+        """
+        Deliver event to the subscribers of every process sharing this bus.
+        """
+        self.publish(event)
+
+    def publish(self, event: dict) -> int:
+        """
+        Deliver event to every matching subscriber and return how many received it.
+        """
+        delivered = 0
+        for subscription in list(self._subscriptions):
+            if subscription.matches(event):
+                subscription.offer(event)
+                delivered += 1
+        logger.debug("Published %s to %d subscribers", event.get("event"), delivered)
+        return delivered
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+
+class SharedEventBus(EventBus):
+    """
+    EventBus shared by every API worker process on the host through a SQLite file.
+
+    LiveKit posts each webhook to whichever worker it reaches, so broadcast() appends the event to
+    an egress_events table instead of publishing it locally. Every worker polls the table for rows
+    past the last one it delivered and publishes them to its own subscribers. Rows older than
+    `retention` seconds are pruned; a subscriber only sees events from after it connected.
+    """
+    def __init__(self, path: str, max_queue: int = 100, poll_interval: float = None, retention: float = None):
+        super().__init__(max_queue)
+        self.path = path
+        self.poll_interval = poll_interval or float(os.getenv("EGRESS_EVENTS_POLL_INTERVAL", 0.25))
+        self.retention = retention or float(os.getenv("EGRESS_EVENTS_RETENTION", 300))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS egress_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._last_id = self._execute("SELECT COALESCE(MAX(id), 0) FROM egress_events")[0][0]
+        self._last_prune = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def broadcast(self, event: dict):
+        await asyncio.to_thread(
+            self._execute, "INSERT INTO egress_events (created_at, payload) VALUES (?, ?)", (time.time(), json.dumps(event))
+        )
+
+    async def deliver_new(self) -> int:
+        """
+        Publish the rows added since the last call to this process's subscribers; returns how many.
+        """
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT id, payload FROM egress_events WHERE id > ? ORDER BY id LIMIT 1000", (self._last_id,)
+        )
+        for row_id, payload in rows:
+            self._last_id = row_id
+            self.publish(json.loads(payload))
+        now = time.time()
+        if now - self._last_prune >= self.retention / 10:
+            self._last_prune = now
+            await asyncio.to_thread(self._execute, "DELETE FROM egress_events WHERE created_at < ?", (now - self.retention,))
+        return len(rows)
+
+    async def _poll(self):
+        while True:
+            try:
+                delivered = await self.deliver_new()
+            except Exception as e:
+                logger.error("Failed to read shared egress events: %s", e)
+                delivered = 0
+            if not delivered:
+                await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        with self._lock:
+            self._conn.close()
+
+
+def create_event_bus(max_queue: int = 100) -> EventBus:
+    """
+    Build the bus matching EGRESS_STORE: shared through EGRESS_DB_PATH for "sqlite", else in-process.
+    """
+    if os.getenv("EGRESS_STORE", "memory").lower() == "sqlite":
+        return SharedEventBus(os.getenv("EGRESS_DB_PATH", "egress_state.db"), max_queue)
+    return EventBus(max_queue)
@@ -1,12 +1,23 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from typing import Optional
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from typing import List, Optional
+from pydantic import BaseModel, Field
 import os
-import subprocess
+import re
+import json
+import time
+import asyncio
 import logging
-from egress_service import EgressSession
-from aws_service import get_all_files, get_file_url
+import aiohttp
+from urllib.parse import unquote_plus
+from livekit import api
+from egress_service import EGRESS_MODES, EgressSession, TrackNotFound
+from aws_service import RECORDING_TYPES, S3Session
+from event_bus import EventBus, create_event_bus
+from waveform import WaveformProcessor, decode_peaks, peaks_key
+from transcript_store import TranscriptStore
+from prometheus_metrics import HTTP_REQUEST_DURATION, render_metrics
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -33,28 +44,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-BASE_DIR = os.path.dirname(__file__)
-
-def run_agent():
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
     try:
-        subprocess.Popen(["python3", "agent.py", "dev"], cwd=BASE_DIR)
-        logger.info("Agent subprocess started")
-    except Exception as e:
-        logger.error(f"Error starting agent: {e}")
-
-run_agent()
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
 
 egress_manager: Optional[EgressSession] = None
+s3_manager: Optional[S3Session] = None
+waveform_processor: Optional[WaveformProcessor] = None
+transcript_store: Optional[TranscriptStore] = None
+egress_events_task: Optional[asyncio.Task] = None
+event_bus = EventBus(max_queue=int(os.getenv("EGRESS_EVENTS_QUEUE_SIZE", 100)))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", 15))
+RECORDING_STREAM_CHUNK = int(os.getenv("RECORDING_STREAM_CHUNK", 64 * 1024))
+AGENT_POOL_STATUS_URL = os.getenv("AGENT_POOL_STATUS_URL", "http://127.0.0.1:8080/status")
+SINGLE_BYTE_RANGE = re.compile(r"^bytes=(?:(\d+)-(\d*)|-(\d+))$")
+EGRESS_MODE_PATTERN = f"^({'|'.join(EGRESS_MODES)})$"
+EGRESS_PRESET_PATTERN = f"^({'|'.join(api.EncodingOptionsPreset.keys())})$"
 
-def startup_event():
-    global egress_manager
+async def startup_event():
+    global egress_manager, s3_manager, waveform_processor, transcript_store, event_bus, egress_events_task
     egress_manager = EgressSession()
     logger.info("EgressSession initialized")
+    event_bus = create_event_bus(event_bus.max_queue)
+    await event_bus.start()
+    s3_manager = S3Session()
+    await s3_manager.open()
+    logger.info("S3Session initialized")
+    egress_manager.add_stop_listener(on_egress_stopped)
+    if os.getenv("WAVEFORM_ENABLED", "1") != "0":
+        waveform_processor = WaveformProcessor(s3_manager)
+        egress_manager.add_stop_listener(waveform_processor.on_egress_stopped)
+    if os.getenv("TRANSCRIPTS_ENABLED", "1") != "0":
+        transcript_store = TranscriptStore()
+        egress_manager.add_start_listener(transcript_store.link_recording)
+        egress_manager.add_stop_listener(transcript_store.recording_stopped)
+    egress_events_task = asyncio.create_task(apply_egress_events(event_bus.subscribe()))
+
+def on_egress_stopped(info: dict):
+    if s3_manager and info.get("user_id"):
+        s3_manager.expect_recording(info["user_id"])
+
+async def apply_egress_events(subscription):
+    """
+    Refresh this worker's listing cache and waveform waits from egress_ended events, whichever
+    worker received the webhook.
+    """
+    try:
+        while True:
+            event = await subscription.get()
+            if event["event"] != "egress_ended":
+                continue
+            if s3_manager and event.get("user_id"):
+                s3_manager.invalidate_user(event["user_id"])
+            if waveform_processor and event.get("status") == "EGRESS_COMPLETE":
+                for uploaded in event.get("files", []):
+                    waveform_processor.recording_uploaded(uploaded["filename"])
+    finally:
+        event_bus.unsubscribe(subscription)
 
 async def shutdown_event():
+    if egress_events_task:
+        egress_events_task.cancel()
+    if waveform_processor:
+        await waveform_processor.aclose()
     if egress_manager:
         await egress_manager.close()
         logger.info("EgressSession closed")
+    if s3_manager:
+        await s3_manager.close()
+        logger.info("S3Session closed")
+    if transcript_store:
+        await transcript_store.close()
+    await event_bus.close()
 
 app.add_event_handler("startup", startup_event)
 app.add_event_handler("shutdown", shutdown_event)
@@ -66,21 +137,63 @@ async def read_root():
     """
     return {"message": "Welcome to the Jarvis Backend API"}
 
+@app.get("/metrics", summary="Prometheus Metrics", tags=["Utility"])
+async def get_metrics():
+    """
+    Prometheus exposition of per-route request latency and S3/LiveKit call timings.
+    """
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+@app.get("/agents/status", summary="Agent Worker Pool Status", tags=["Utility"])
+async def get_agent_pool_status():
+    """
+    Report the supervised agent worker processes: pid, health, restarts and uptime.
+
+    Proxied from the agent pool supervisor (`python agent_pool.py`) at AGENT_POOL_STATUS_URL.
+    """
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as http:
+            async with http.get(AGENT_POOL_STATUS_URL) as response:
+                response.raise_for_status()
+                return await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning("Agent pool status unavailable from %s: %s", AGENT_POOL_STATUS_URL, e)
+        raise HTTPException(status_code=503, detail="Agent pool supervisor is not reachable")
+
 @app.post("/egress/start", summary="Start Room Recording (Egress)", tags=["Egress"])
-async def start_egress(user_id: str = Query(..., description="Unique user/session identifier for the recording."), room_name: str = Query(..., description="Name of the LiveKit room to record."), audio_only: Optional[bool] = Query(False, description="Whether to record audio only (default is False).")):
+async def start_egress(user_id: str = Query(..., description="Unique user/session identifier for the recording."), room_name: str = Query(..., description="Name of the LiveKit room to record."), audio_only: Optional[bool] = Query(False, description="Whether to record audio only (default is False)."), mode: Optional[str] = Query("composite", pattern=EGRESS_MODE_PATTERN, description="composite (one MP4/OGG file), track (one participant's audio track, no compositor) or hls (segmented, playable while recording)."), preset: Optional[str] = Query(None, pattern=EGRESS_PRESET_PATTERN, description="LiveKit encoding preset for video recordings, e.g. H264_720P_30. Defaults to EGRESS_VIDEO_PRESET."), participant_identity: Optional[str] = Query(None, description="Participant whose microphone is recorded in track mode. Defaults to the first participant that is not an agent."), idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255, description="Retries with the same key return the egress started by the first request.")):
     """
     Start a composite egress (recording) for a given LiveKit room.
 
     - **user_id**: Unique identifier for the user/session.
     - **room_name**: Name of the LiveKit room to record.
+    - **mode**: `composite` (default) renders the room into one MP4, or OGG with audio_only. `track` records one
+      participant's microphone as published, without the compositor, for voice-only sessions. `hls` writes
+      segments and a playlist (file_key) that can be played through /recordings/playlist while the session runs.
+    - **preset**: Video encoding preset, e.g. `H264_720P_30` for a cheaper encode. Ignored for audio-only recordings.
+    - **participant_identity**: Participant recorded in `track` mode.
+    - **Idempotency-Key** (header): Optional. Retries with the same key return the first request's egress instead of recording again.
+
+    Concurrent or repeated starts for the same room, user and output within EGRESS_START_DEDUP_WINDOW seconds
+    return the egress already started; `info.reused` tells whether a new recording was started.
     
     Returns metadata about the started egress session.
     """
     if not egress_manager:
         raise HTTPException(status_code=500, detail="Egress manager not initialized")
     try:
-        info = await egress_manager.start_room_composite(room_name, user_id, audio_only)
+        info = await egress_manager.start_recording(
+            room_name, user_id, mode=mode, audio_only=audio_only, preset=preset,
+            participant_identity=participant_identity, idempotency_key=idempotency_key,
+        )
+        if info.get("reused"):
+            return {"message": f"Egress already running for session {user_id}", "info": info}
         return {"message": f"Egress started for session {user_id}", "info": info}
+    except ValueError as ve:
+        raise HTTPException(status_code=409, detail=str(ve))
+    except TrackNotFound as tnf:
+        raise HTTPException(status_code=404, detail=str(tnf))
     except Exception as e:
         logger.error(f"Failed to start egress: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -103,22 +216,159 @@ async def stop_egress(egress_id: str = Query(..., description="ID of the egress
         logger.error(f"Failed to stop egress: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class EgressStartItem(BaseModel):
+    user_id: str = Field(..., description="Unique user/session identifier for the recording.")
+    room_name: str = Field(..., description="Name of the LiveKit room to record.")
+    audio_only: bool = Field(False, description="Whether to record audio only.")
+    mode: str = Field("composite", pattern=EGRESS_MODE_PATTERN, description="composite, track or hls.")
+    preset: Optional[str] = Field(None, pattern=EGRESS_PRESET_PATTERN, description="LiveKit encoding preset for video recordings.")
+    participant_identity: Optional[str] = Field(None, description="Participant whose microphone is recorded in track mode.")
+    idempotency_key: Optional[str] = Field(None, max_length=255, description="Retries with the same key return the egress started by the first request.")
+
+class EgressStartBatchRequest(BaseModel):
+    items: List[EgressStartItem] = Field(..., min_length=1, max_length=500)
+    concurrency: Optional[int] = Field(None, ge=1, le=64, description="Max concurrent LiveKit calls. Defaults to EGRESS_BATCH_CONCURRENCY.")
+
+class EgressStopBatchRequest(BaseModel):
+    egress_ids: List[str] = Field(..., min_length=1, max_length=500)
+    concurrency: Optional[int] = Field(None, ge=1, le=64, description="Max concurrent LiveKit calls. Defaults to EGRESS_BATCH_CONCURRENCY.")
+
+@app.post("/egress/start_batch", summary="Start Recording for Many Rooms", tags=["Egress"])
+async def start_egress_batch(body: EgressStartBatchRequest):
+    """
+    Start composite egresses for many rooms in one request, with bounded concurrency.
+
+    - **items**: Rooms to record, each with user_id, room_name and optional audio_only and idempotency_key.
+    - **concurrency**: Optional limit on simultaneous LiveKit calls.
+    
+    Returns one result per item, in request order, with success and either info or error.
+    """
+    if not egress_manager:
+        raise HTTPException(status_code=500, detail="Egress manager not initialized")
+    results = await egress_manager.start_batch([item.model_dump() for item in body.items], body.concurrency)
+    return {"results": results}
+
+@app.post("/egress/stop_batch", summary="Stop Recording for Many Egresses", tags=["Egress"])
+async def stop_egress_batch(body: EgressStopBatchRequest):
+    """
+    Stop many egress sessions in one request, with bounded concurrency.
+
+    - **egress_ids**: IDs of the egress sessions to stop.
+    - **concurrency**: Optional limit on simultaneous LiveKit calls.
+    
+    Returns one result per egress ID, in request order, with success and either info or error.
+    """
+    if not egress_manager:
+        raise HTTPException(status_code=500, detail="Egress manager not initialized")
+    results = await egress_manager.stop_batch(body.egress_ids, body.concurrency)
+    return {"results": results}
+
+@app.get("/egress/active", summary="List Active Recordings (Egress)", tags=["Egress"])
+async def list_active_egresses(egress_id: Optional[str] = Query(None, description="Only return this egress."), user_id: Optional[str] = Query(None, description="Only return egresses started for this user/session."), room_name: Optional[str] = Query(None, description="Only return egresses recording this room.")):
+    """
+    List egress (recording) sessions that have been started and not yet stopped.
+
+    - **egress_id**, **user_id**, **room_name**: Optional filters, combined with AND.
+    
+    Returns metadata of the matching egress sessions.
+    """
+    if not egress_manager:
+        raise HTTPException(status_code=500, detail="Egress manager not initialized")
+    try:
+        egresses = await egress_manager.list_active(egress_id=egress_id, user_id=user_id, room_name=room_name)
+        return {"egresses": egresses}
+    except Exception as e:
+        logger.error(f"Failed to list active egresses: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/livekit/webhook", summary="Receive LiveKit Webhooks", tags=["Egress"])
+async def receive_livekit_webhook(request: Request, authorization: Optional[str] = Header(None)):
+    """
+    Receive signed LiveKit webhooks and apply egress events (started, updated, ended).
+
+    The Authorization header must be a token signed with the LiveKit API secret whose sha256 claim matches the body.
+    Egress events update the active egress state and are pushed to /egress/events subscribers;
+    egress_ended also refreshes the user's recording listing on every worker.
+    """
+    if not egress_manager:
+        raise HTTPException(status_code=500, detail="Egress manager not initialized")
+    body = (await request.body()).decode()
+    try:
+        event = await egress_manager.receive_webhook(body, authorization or "")
+    except Exception as e:
+        logger.warning(f"Rejected LiveKit webhook: {e}")
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    if event:
+        await event_bus.broadcast(event)
+    return {"received": True}
+
+@app.get("/egress/events", summary="Stream Egress Status Events (SSE)", tags=["Egress"])
+async def stream_egress_events(user_id: Optional[str] = Query(None, description="Only send events for this user/session."), room_name: Optional[str] = Query(None, description="Only send events for this room.")):
+    """
+    Server-sent event stream of egress status changes, as received from LiveKit webhooks.
+
+    - **user_id** / **room_name**: At least one is required; both narrow the stream.
+    
+    Each message has the webhook event name as its SSE event type and the egress status as JSON data.
+    """
+    if user_id is None and room_name is None:
+        raise HTTPException(status_code=400, detail="user_id or room_name is required")
+    subscription = event_bus.subscribe(user_id=user_id, room_name=room_name)
+    return StreamingResponse(
+        _egress_event_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _egress_event_stream(subscription):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        event_bus.unsubscribe(subscription)
+
 @app.get("/list", summary="List Recordings for User", tags=["Files"])
-def get_list_recordings(user_id: str = Query(..., description="User/session identifier to list recordings for.")):
+async def get_list_recordings(user_id: str = Query(..., description="User/session identifier to list recordings for."), limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size. When set (or when a cursor is given) the response is paginated and carries object metadata."), cursor: Optional[str] = Query(None, description="Opaque cursor returned as next_cursor by the previous page."), stream: Optional[bool] = Query(False, description="Stream recording entries as NDJSON while S3 pages arrive."), type: Optional[List[str]] = Query(None, description="Only list recordings of these types (mp4, ogg, hls); repeat for several.")):
     """
     List all available recordings for a given user/session.
 
     - **user_id**: The user/session identifier whose recordings should be listed.
+    - **limit** / **cursor**: Page through recordings; each entry has key, size, last_modified and type.
+    - **stream**: Emit one JSON entry per line as each S3 page arrives.
+    - **type**: Only list recordings of these types. Segmented (HLS) recordings are listed by their .m3u8 playlist.
     
     Returns a list of recording file metadata.
     """
+    if not s3_manager:
+        raise HTTPException(status_code=500, detail="S3 session not initialized")
+    unknown = [t for t in type or [] if t not in RECORDING_TYPES.values()]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown recording type: {', '.join(unknown)}")
+    if stream:
+        return StreamingResponse(_stream_recordings(user_id, cursor, type), media_type="application/x-ndjson")
     try:
-        recordings = get_all_files(user_id)
+        if limit is not None or cursor is not None:
+            return await s3_manager.list_files_page(user_id, limit or 100, cursor, type)
+        recordings = await s3_manager.get_all_files(user_id, type)
         return {"recordings": recordings}
     except Exception as e:
         logger.error(f"Failed to list recordings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _stream_recordings(user_id: str, cursor: Optional[str], types: Optional[List[str]] = None):
+    try:
+        async for entry in s3_manager.iter_files(user_id, cursor, types):
+            yield json.dumps(entry) + "\n"
+    except Exception as e:
+        logger.error(f"Failed to stream recordings: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
 @app.get("/get_file_url", summary="Get Download URL for Recording", tags=["Files"])
 async def download_file(file_key: str = Query(..., description="Key or path of the file to download."), expiration: Optional[int] = Query(None, description="Expiration time (seconds) for the download URL. Default is provider-specific.")):
     """
@@ -129,9 +379,220 @@ async def download_file(file_key: str = Query(..., description="Key or path of t
     
     Returns a signed URL for downloading the file.
     """
+    if not s3_manager:
+        raise HTTPException(status_code=500, detail="S3 session not initialized")
     try:
-        url = get_file_url(file_key, expiration)
+        url = await s3_manager.get_file_url(file_key, expiration)
         return {"url": url}
     except Exception as e:
         logger.error(f"Failed to generate download URL: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/recordings/playlist", summary="Get Playable HLS Playlist", tags=["Files"])
+async def get_recording_playlist(file_key: str = Query(..., description="Key of the .m3u8 playlist of a segmented (hls) recording."), expiration: Optional[int] = Query(None, description="Expiration time (seconds) of the segment URLs. Default is provider-specific.")):
+    """
+    Return the playlist of a segmented recording with presigned segment URLs, so players can fetch the segments directly.
+
+    - **file_key**: Playlist key, as returned by /egress/start with mode=hls or listed with type=hls.
+    - **expiration**: Optional expiration time (in seconds) of the segment URLs.
+
+    While the egress runs the playlist grows with every segment; players reload it as usual.
+    """
+    if not s3_manager:
+        raise HTTPException(status_code=500, detail="S3 session not initialized")
+    try:
+        playlist = await s3_manager.get_signed_playlist(file_key, expiration)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error(f"Failed to read playlist: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if playlist is None:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return Response(content=playlist, media_type="application/vnd.apple.mpegurl", headers={"Cache-Control": "no-cache"})
+
+def _single_byte_range(value: Optional[str]) -> Optional[str]:
+    """
+    Return a single-range Range header unchanged; multiple or malformed ranges are ignored and the whole file is sent.
+    """
+    match = SINGLE_BYTE_RANGE.match((value or "").strip())
+    if not match:
+        return None
+    first, last = match.group(1), match.group(2)
+    if first is not None and last and int(last) < int(first):
+        return None
+    return match.group(0)
+
+@app.get("/recordings/stream", summary="Stream Recording Through the API", tags=["Files"])
+async def stream_recording(
+    file_key: str = Query(..., description="Key of the recording to stream."),
+    range_header: Optional[str] = Header(None, alias="Range", description="Single byte range, e.g. bytes=1048576-."),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    """
+    Proxy a recording from S3 for clients that cannot reach presigned URLs.
+
+    - **file_key**: The key of the recording (must be in the sessions directory).
+    - **Range**: Only the requested bytes are fetched from S3 and the response is 206; unsatisfiable ranges get 416.
+    - **If-None-Match** / **If-Modified-Since**: 304 when the client's copy is current.
+    - **If-Range**: the range is only honoured while the recording is unchanged.
+
+    The body is relayed in chunks as it arrives from S3; nothing is buffered in full.
+    """
+    if not s3_manager:
+        raise HTTPException(status_code=500, detail="S3 session not initialized")
+    try:
+        result = await s3_manager.open_stream(file_key, _single_byte_range(range_header), if_none_match, if_modified_since, if_range)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error(f"Failed to stream recording: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    headers = {name: value for name, value in result["headers"].items() if value}
+    headers["Cache-Control"] = "private, max-age=86400"
+    if result["body"] is None:
+        return Response(status_code=result["status"], headers=headers)
+    return StreamingResponse(_relay_body(result["body"]), status_code=result["status"], headers=headers, media_type=headers["Content-Type"])
+
+async def _relay_body(body):
+    try:
+        async for chunk in body.iter_chunks(RECORDING_STREAM_CHUNK):
+            yield chunk
+    finally:
+        # returns the pooled connection even when the client disconnects mid-file
+        body.close()
+
+@app.get("/recordings/peaks", summary="Get Waveform Peaks for Recording", tags=["Files"])
+async def get_recording_peaks(file_key: str = Query(..., description="Key of the recording (not of the sidecar)."), format: Optional[str] = Query("binary", pattern="^(binary|json)$", description="binary returns the sidecar as stored; json decodes it.")):
+    """
+    Return the duration and waveform peaks of a recording, generated in the background after its egress stopped.
+
+    - **file_key**: Key of the recording, e.g. sessions/{user_id}/recording_room_1700000000.mp4.
+    - **format**: `binary` (default) returns the compact sidecar: a 16-byte header (magic "JPKS", version, float32 duration,
+      peaks per second, peak count) followed by one int8 min/max pair per peak. `json` returns the same data decoded.
+
+    Returns 404 until the sidecar has been generated.
+    """
+    if not s3_manager:
+        raise HTTPException(status_code=500, detail="S3 session not initialized")
+    try:
+        data = await s3_manager.get_object(peaks_key(file_key))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error(f"Failed to read waveform peaks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if data is None:
+        raise HTTPException(status_code=404, detail="Waveform peaks not available for this recording")
+    # sidecars are written once per recording
+    headers = {"Cache-Control": "private, max-age=86400"}
+    if format == "json":
+        return JSONResponse(decode_peaks(data), headers=headers)
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
+
+@app.get("/transcripts/search", summary="Search Conversation Transcripts", tags=["Transcripts"])
+async def search_transcripts(q: str = Query(..., min_length=1, description="Words to search for; every word must match. End a word with * for prefix matching."), user_id: Optional[str] = Query(None, description="Only search sessions of this user/session identifier."), room_name: Optional[str] = Query(None, description="Only search sessions held in this room."), limit: Optional[int] = Query(20, ge=1, le=100, description="Maximum number of sessions to return.")):
+    """
+    Full-text search over the agent's conversation transcripts.
+
+    - **q**: Search words, matched with stemming (e.g. "recording" also matches "recorded").
+    - **user_id**, **room_name**: Optional filters, combined with AND.
+    - **limit**: Maximum number of sessions (default 20).
+
+    Returns the best matching sessions first. Each carries the key of the recording that covered it (if any) and
+    its best matching turns, with their offset from the start of the session and from the start of the recording in ms.
+    """
+    if not transcript_store:
+        raise HTTPException(status_code=500, detail="Transcript store not initialized")
+    try:
+        started = time.perf_counter()
+        sessions = await transcript_store.search(q, user_id=user_id, room_name=room_name, limit=limit)
+        return {"sessions": sessions, "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        logger.error(f"Failed to search transcripts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/transcripts/{session_id}", summary="Get Conversation Transcript", tags=["Transcripts"])
+async def get_transcript(session_id: str):
+    """
+    Return every turn of one agent session, in order, with its offset from the start of the session in ms.
+    """
+    if not transcript_store:
+        raise HTTPException(status_code=500, detail="Transcript store not initialized")
+    session = await transcript_store.get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+    return session
+
+class FileUrlsRequest(BaseModel):
+    file_keys: List[str] = Field(..., min_length=1, max_length=1000, description="Keys of the recordings to sign.")
+    expiration: Optional[int] = Field(None, description="Expiration time (seconds) for every URL. Default is provider-specific.")
+
+@app.post("/get_file_urls", summary="Get Download URLs for Many Recordings", tags=["Files"])
+async def download_files(body: FileUrlsRequest):
+    """
+    Generate secure, time-limited download URLs for many recording files in one round trip.
+
+    - **file_keys**: Keys of the files to generate download URLs for (must be in the sessions directory).
+    - **expiration**: Optional expiration time (in seconds) applied to every URL.
+    
+    Returns a mapping of key to signed URL, and of key to error for invalid keys.
+    """
+    if not s3_manager:
+        raise HTTPException(status_code=500, detail="S3 session not initialized")
+    try:
+        return await s3_manager.get_file_urls(body.file_keys, body.expiration)
+    except Exception as e:
+        logger.error(f"Failed to generate download URLs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _s3_event_keys(payload: dict) -> list:
+    """
+    Extract object keys from an S3 event notification, optionally wrapped in an SNS envelope.
+    """
+    if payload.get("Type") == "Notification" and isinstance(payload.get("Message"), str):
+        payload = json.loads(payload["Message"])
+    keys = []
+    for record in payload.get("Records", []):
+        key = record.get("s3", {}).get("object", {}).get("key")
+        if key:
+            keys.append(unquote_plus(key))
+    return keys
+
+@app.post("/s3/events", summary="Receive S3 Object Notifications", tags=["Files"])
+async def receive_s3_events(request: Request, token: Optional[str] = Query(None, description="Shared secret, required when S3_EVENTS_TOKEN is set.")):
+    """
+    Invalidate cached recording listings when new objects land in the bucket, and start the waveform
+    sidecars of recordings that were waiting for their upload.
+
+    Accepts S3 event notifications, either raw or delivered through an SNS HTTP subscription.
+    
+    Returns the number of object keys processed.
+    """
+    expected_token = os.getenv("S3_EVENTS_TOKEN")
+    if expected_token and token != expected_token:
+        raise HTTPException(status_code=403, detail="Invalid token")
+    try:
+        keys = _s3_event_keys(await request.json())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid S3 event payload: {e}")
+    if s3_manager:
+        for key in keys:
+            s3_manager.invalidate_key(key)
+    if waveform_processor:
+        for key in keys:
+            waveform_processor.recording_uploaded(key)
+    return {"processed": len(keys)}
+
+@app.get("/cache/stats", summary="Recording Listing Cache Statistics", tags=["Utility"])
+async def get_cache_stats():
+    """
+    Return size, hit/miss and eviction counters of the recording listing and presigned URL caches.
+    """
+    if not s3_manager:
+        raise HTTPException(status_code=500, detail="S3 session not initialized")
+    return {"listing_cache": s3_manager.listing_cache.stats(), "url_cache": s3_manager.url_cache.stats()}
@@ -0,0 +1,212 @@
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+# Set PROMETHEUS_MULTIPROC_DIR (before this module is imported) when metrics are recorded by several
+# processes: uvicorn --workers for the API, or the job processes of an agent worker.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "jarvis_http_request_duration_seconds",
+    "Time until the API starts responding, per route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+EXTERNAL_CALL_DURATION = Histogram(
+    "jarvis_external_call_duration_seconds",
+    "Duration of calls made to S3 and LiveKit.",
+    ["service", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+EGRESS_STARTS = Counter(
+    "jarvis_egress_starts",
+    "Egress start requests by outcome (started: new egress, coalesced: joined a start in flight, reused: returned an existing egress).",
+    ["outcome"],
+)
+
+AGENT_STT_DURATION = Histogram(
+    "jarvis_agent_stt_duration_seconds",
+    "Duration of non-streamed STT requests.",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_TRANSCRIPTION_DELAY = Histogram(
+    "jarvis_agent_transcription_delay_seconds",
+    "Time from the end of user speech until the final transcript was available.",
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_EOU_DELAY = Histogram(
+    "jarvis_agent_end_of_utterance_delay_seconds",
+    "Time from the end of user speech until the turn was considered finished.",
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_ENDPOINTING_DELAY = Histogram(
+    "jarvis_agent_endpointing_delay_seconds",
+    "Endpointing delays chosen by the adaptive controller (min: turn detector confident, max: not confident).",
+    ["bound"],
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 6.0),
+)
+AGENT_ENDPOINTING_CUTOFFS = Counter(
+    "jarvis_agent_endpointing_cutoffs",
+    "Turns the user kept talking into right after the agent started answering.",
+)
+AGENT_LLM_TTFT = Histogram(
+    "jarvis_agent_llm_ttft_seconds",
+    "LLM time to first token.",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_LLM_TOKENS = Counter(
+    "jarvis_agent_llm_tokens",
+    "LLM tokens used.",
+    ["provider", "kind"],
+)
+AGENT_LLM_SPECULATIONS = Counter(
+    "jarvis_agent_llm_speculations",
+    "Speculative LLM replies started from interim transcripts, by outcome (hit: used as the reply, miss: the final question differed, cancelled: the user kept talking).",
+    ["outcome"],
+)
+AGENT_LLM_SPECULATION_SAVED = Histogram(
+    "jarvis_agent_llm_speculation_saved_seconds",
+    "How much earlier the first LLM token was available on speculation hits.",
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_CHAT_CONTEXT_MESSAGES = Histogram(
+    "jarvis_agent_chat_context_messages",
+    "Messages sent to the LLM per turn, after chat context compaction.",
+    buckets=(2, 4, 8, 12, 16, 24, 32, 48, 64, 128, 256),
+)
+AGENT_WORKER_LOAD = Gauge(
+    "jarvis_agent_worker_load",
+    "Load reported by the agent worker: projected session CPU over its share of cores.",
+    multiprocess_mode="livemax",
+)
+AGENT_SESSION_CPU = Gauge(
+    "jarvis_agent_session_cpu_cores",
+    "Moving average of the CPU cores one agent session uses.",
+    multiprocess_mode="livemax",
+)
+AGENT_JOB_REQUESTS = Counter(
+    "jarvis_agent_job_requests",
+    "Job requests offered to the agent worker, by admission decision (accepted or rejected).",
+    ["decision"],
+)
+AGENT_TTS_TTFB = Histogram(
+    "jarvis_agent_tts_ttfb_seconds",
+    "TTS time to first audio byte.",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_TTS_CACHE_LOOKUPS = Counter(
+    "jarvis_agent_tts_cache_lookups",
+    "Synthesized-audio cache lookups by the tier that answered them (memory, disk or miss).",
+    ["tier"],
+)
+AGENT_RESPONSE_LATENCY = Histogram(
+    "jarvis_agent_response_latency_seconds",
+    "Voice response latency: end-of-utterance delay + LLM TTFT + TTS TTFB of the same turn.",
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_GREETING_LATENCY = Histogram(
+    "jarvis_agent_greeting_latency_seconds",
+    "Time from job assignment until the greeting audio started playing.",
+    ["tts_cache"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry to export: aggregated across processes when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> tuple:
+    """
+    Return the exposition payload and its content type.
+    """
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """
+    Serve /metrics on its own port, for processes without an HTTP app (agent workers).
+    """
+    start_http_server(port, registry=metrics_registry())
+
+
+@asynccontextmanager
+async def observe_call(service: str, operation: str):
+    """
+    Time the enclosed call to an external service, labelled with its outcome.
+    """
+    started = time.perf_counter()
+    outcome = "success"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        EXTERNAL_CALL_DURATION.labels(service, operation, outcome).observe(time.perf_counter() - started)
+
+
+class AgentMetricsRecorder:
+    """
+    Records a voice session's AgentMetrics as Prometheus histograms.
+
+    EOU, LLM and TTS metrics sharing a sequence_id are combined into one response latency sample.
+    """
+    def __init__(self, max_pending: int = 64):
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, dict]" = OrderedDict()
+
+    def record(self, agent_metrics) -> None:
+        from livekit.agents import metrics
+
+        if isinstance(agent_metrics, metrics.PipelineEOUMetrics):
+            AGENT_EOU_DELAY.observe(agent_metrics.end_of_utterance_delay)
+            AGENT_TRANSCRIPTION_DELAY.observe(agent_metrics.transcription_delay)
+            self._add(agent_metrics.sequence_id, "eou", agent_metrics.end_of_utterance_delay)
+        elif isinstance(agent_metrics, metrics.LLMMetrics):
+            if agent_metrics.error is None and not agent_metrics.cancelled:
+                AGENT_LLM_TTFT.labels(agent_metrics.label).observe(agent_metrics.ttft)
+            AGENT_LLM_TOKENS.labels(agent_metrics.label, "prompt").inc(agent_metrics.prompt_tokens)
+            AGENT_LLM_TOKENS.labels(agent_metrics.label, "completion").inc(agent_metrics.completion_tokens)
+            self._add(getattr(agent_metrics, "sequence_id", None), "llm", agent_metrics.ttft)
+        elif isinstance(agent_metrics, metrics.TTSMetrics):
+            if agent_metrics.error is None and not agent_metrics.cancelled:
+                AGENT_TTS_TTFB.labels(agent_metrics.label).observe(agent_metrics.ttfb)
+            self._add(getattr(agent_metrics, "sequence_id", None), "tts", agent_metrics.ttfb)
+        elif isinstance(agent_metrics, metrics.STTMetrics):
+            if not agent_metrics.streamed:
+                AGENT_STT_DURATION.labels(agent_metrics.label).observe(agent_metrics.duration)
+
+    def _add(self, sequence_id, stage: str, value: float) -> None:
+        if not sequence_id:
+            return
+        stages = self._pending.setdefault(sequence_id, {})
+        stages.setdefault(stage, value)
+        if len(stages) == 3:
+            del self._pending[sequence_id]
+            AGENT_RESPONSE_LATENCY.observe(sum(stages.values()))
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
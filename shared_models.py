@@ -0,0 +1,121 @@
+import os
+import logging
+import multiprocessing
+import psutil
+
+logger = logging.getLogger(__name__)
+
+_models: dict = {}
+
+
+def load_models() -> dict:
+    """
+    Load the weights every job process needs, once per process.
+
+    In a process forked from the preloading forkserver (see use_forkserver) this returns the
+    instances the forkserver loaded, so their memory is shared copy-on-write instead of duplicated.
+    """
+    if not _models:
+        # plugins with native libraries are imported here too, so they are mapped before the fork
+        from livekit.plugins import noise_cancellation, silero, turn_detector  # noqa: F401
+        _models["vad"] = silero.VAD.load()
+    return _models
+
+
+def start_method() -> str:
+    """
+    How job processes are started: AGENT_PROCESS_START, default forkserver where the platform has it.
+    """
+    default = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return os.getenv("AGENT_PROCESS_START", default)
+
+
+# releases whose worker.py calls mp.get_context("spawn") on the module-level `import multiprocessing as mp`
+FORKSERVER_LIVEKIT_VERSIONS = ("0.12.",)
+
+
+class _ForkserverMultiprocessing:
+    """
+    Stands in for livekit-agents' `mp` module: the spawn context resolves to the forkserver one and
+    everything else is looked up on multiprocessing itself.
+    """
+
+    def __init__(self, context):
+        self._context = context
+
+    def get_context(self, method=None):
+        if method == "spawn":
+            return self._context
+        return multiprocessing.get_context(method)
+
+    def __getattr__(self, name):
+        return getattr(multiprocessing, name)
+
+
+def use_forkserver(preload: tuple = ("shared_models",)) -> bool:
+    """
+    Start the worker's job and inference processes from a forkserver that loaded the models first.
+
+    livekit-agents spawns each process from scratch, so every idle prewarmed process imports the
+    plugins and loads its own VAD. Forked from the forkserver, they share those pages read-only.
+    Call before cli.run_app(); the forkserver imports `preload` and, for this module, loads the models.
+    Returns False, leaving the worker to spawn, on livekit-agents releases this was not checked against.
+    """
+    from livekit import agents
+    from livekit.agents import worker as livekit_worker
+
+    if not agents.__version__.startswith(FORKSERVER_LIVEKIT_VERSIONS) or livekit_worker.mp is not multiprocessing:
+        logger.warning("livekit-agents %s: job processes are spawned, not forked from a forkserver", agents.__version__)
+        return False
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(list(preload))
+    # read by this module when the forkserver imports it; the worker process itself loads nothing
+    os.environ["SHARED_MODELS_PRELOAD"] = "1"
+    # Worker.__init__ hard-codes mp.get_context("spawn")
+    livekit_worker.mp = _ForkserverMultiprocessing(context)
+    logger.info("job processes will be forked from a forkserver preloading %s", ", ".join(preload))
+    return True
+
+
+def process_memory(pid: int) -> dict:
+    """
+    RSS, PSS and USS of one process in MB. PSS splits shared pages among the processes mapping them;
+    USS counts private pages only, i.e. what the process would free on exit.
+    """
+    info = psutil.Process(pid).memory_full_info()
+    return {
+        "pid": pid,
+        "rss_mb": round(info.rss / 2**20, 1),
+        "pss_mb": round(getattr(info, "pss", info.rss) / 2**20, 1),
+        "uss_mb": round(info.uss / 2**20, 1),
+    }
+
+
+def memory_report(pid: int) -> dict:
+    """
+    Memory of a worker process and every process under it (forkserver, job and inference processes).
+
+    per_process_uss_mb, the mean USS of the children, is the memory one more prewarmed job process costs.
+    """
+    try:
+        parent = psutil.Process(pid)
+        children = parent.children(recursive=True)
+    except psutil.Error:
+        return {}
+    processes = []
+    for process in [parent] + children:
+        try:
+            processes.append(process_memory(process.pid))
+        except psutil.Error:
+            continue
+    own = [p for p in processes if p["pid"] != pid]
+    return {
+        "processes": processes,
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
+        "total_rss_mb": round(sum(p["rss_mb"] for p in processes), 1),
+        "per_process_uss_mb": round(sum(p["uss_mb"] for p in own) / len(own), 1) if own else None,
+    }
+
+
+if os.getenv("SHARED_MODELS_PRELOAD") == "1" and multiprocessing.parent_process() is None:
+    load_models()
@@ -0,0 +1,193 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import dataclasses
+from typing import Optional
+from livekit.agents import llm
+from prometheus_metrics import AGENT_LLM_SPECULATION_SAVED, AGENT_LLM_SPECULATIONS
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    """
+    Compare transcripts by their words only; interim and final results differ in casing and punctuation.
+    """
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+class SpeculativeStream(llm.LLMStream):
+    """
+    Consumes a provider stream from the moment the speculation starts and replays it to whoever iterates later.
+    """
+    def __init__(self, source: llm.LLMStream):
+        self._source = source
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        super().__init__(
+            source._llm,
+            chat_ctx=source.chat_ctx,
+            fnc_ctx=source.fnc_ctx,
+            # the source stream does its own retries
+            conn_options=dataclasses.replace(source._conn_options, max_retry=0),
+        )
+
+    async def _run(self) -> None:
+        async for chunk in self._source:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self._event_ch.send_nowait(chunk)
+        self._function_calls_info.extend(self._source.function_calls)
+
+    async def _metrics_monitor_task(self, event_aiter) -> None:
+        # the source stream reports the provider's LLM metrics
+        async for _ in event_aiter:
+            pass
+
+    def latency_saved(self, now: float) -> float:
+        """
+        How much earlier the first token is available than if the request had been sent at `now`.
+        """
+        elapsed = now - self.started
+        if self.first_token_at is None:
+            return elapsed
+        return min(elapsed, self.first_token_at - self.started)
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        await self._source.aclose()
+
+
+class SpeculativeReplies:
+    """
+    Starts the LLM reply from interim transcripts while endpointing is still deciding whether the user is done.
+
+    A speculation starts once the user's text so far (final segments plus the current interim) has
+    stayed the same for `stable_interims` interim results, or when a final segment or the VAD end of
+    speech arrives. It is cancelled as soon as the text changes, i.e. the user keeps talking. When the
+    agent then asks for its reply, the speculative stream is used if the question and the chat history
+    match; otherwise it is discarded and the request goes out as usual.
+
+    Use `before_llm_cb` as the VoicePipelineAgent callback; `next_cb` builds the stream for both paths
+    (the chat compactor's callback in agent.py). Call `attach(agent)` before starting the agent.
+    """
+    def __init__(self, next_cb=None, stable_interims: int = None, min_words: int = None):
+        self.next_cb = next_cb
+        self.stable_interims = stable_interims or int(os.getenv("LLM_SPECULATION_STABLE_INTERIMS", 2))
+        self.min_words = min_words or int(os.getenv("LLM_SPECULATION_MIN_WORDS", 2))
+        self.outcomes = {"hit": 0, "miss": 0, "cancelled": 0}
+        self.saved = 0.0
+        self._agent = None
+        self._human_input = None
+        self._agent_speaking = False
+        self._candidate = ""
+        self._interim = ""
+        self._repeats = 0
+        self._stream: Optional[SpeculativeStream] = None
+        self._text = ""
+        self._context_ids: list = []
+        self._closing = set()
+
+    def attach(self, agent):
+        """
+        Follow the transcripts of a VoicePipelineAgent; the participant's input is bound when they start speaking.
+        """
+        self._agent = agent
+        agent.on("user_started_speaking", lambda *_: self._bind(agent._human_input))
+        agent.on("agent_started_speaking", lambda *_: self._set_agent_speaking(True))
+        agent.on("agent_stopped_speaking", lambda *_: self._set_agent_speaking(False))
+
+    def _bind(self, human_input):
+        if human_input is None or human_input is self._human_input:
+            return
+        # registered after the agent's own handlers, so agent._transcribed_text already holds new final segments
+        self._human_input = human_input
+        human_input.on("interim_transcript", self._on_interim_transcript)
+        human_input.on("final_transcript", self._on_final_transcript)
+        human_input.on("end_of_speech", lambda ev: self._observe(f"{self._agent._transcribed_text} {self._interim}", stable=True))
+
+    def _set_agent_speaking(self, speaking: bool):
+        self._agent_speaking = speaking
+        if speaking:
+            self._candidate, self._repeats = "", 0
+
+    def _on_interim_transcript(self, ev):
+        self._interim = ev.alternatives[0].text
+        self._observe(f"{self._agent._transcribed_text} {self._interim}", stable=False)
+
+    def _on_final_transcript(self, ev):
+        # the final segment replaces the interim one; the agent keeps its own interim text until the reply
+        self._interim = ""
+        self._observe(self._agent._transcribed_text, stable=True)
+
+    def _observe(self, text: str, stable: bool):
+        candidate = normalize(text)
+        if self._stream is not None and candidate != normalize(self._text):
+            self._cancel("cancelled")
+        if candidate == self._candidate:
+            self._repeats += 1
+        else:
+            self._candidate, self._repeats = candidate, 1
+        if (
+            self._stream is None
+            and not self._agent_speaking
+            and len(candidate.split()) >= self.min_words
+            and (stable or self._repeats >= self.stable_interims)
+        ):
+            self._start(text.strip())
+
+    def _start(self, text: str):
+        agent = self._agent
+        chat_ctx = agent.chat_ctx.copy()
+        self._context_ids = [m.id for m in chat_ctx.messages]
+        chat_ctx.messages.append(llm.ChatMessage.create(text=text, role="user"))
+        source = self._next(agent, chat_ctx)
+        if not isinstance(source, llm.LLMStream):
+            return
+        self._stream, self._text = SpeculativeStream(source), text
+        logger.debug("speculating on %r", text)
+
+    def _next(self, agent, chat_ctx: llm.ChatContext):
+        if self.next_cb is not None:
+            return self.next_cb(agent, chat_ctx)
+        return agent.llm.chat(chat_ctx=chat_ctx, fnc_ctx=agent.fnc_ctx)
+
+    def _cancel(self, outcome: str):
+        stream, self._stream = self._stream, None
+        self.outcomes[outcome] += 1
+        AGENT_LLM_SPECULATIONS.labels(outcome).inc()
+        task = asyncio.create_task(stream.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def before_llm_cb(self, agent, chat_ctx: llm.ChatContext):
+        stream = self._stream
+        self._candidate, self._interim, self._repeats = "", "", 0
+        if stream is not None:
+            messages = chat_ctx.messages
+            question = messages[-1].content if messages and isinstance(messages[-1].content, str) else ""
+            if normalize(question) == normalize(self._text) and [m.id for m in messages[:-1]] == self._context_ids:
+                self._stream = None
+                saved = stream.latency_saved(time.perf_counter())
+                self.outcomes["hit"] += 1
+                self.saved += saved
+                AGENT_LLM_SPECULATIONS.labels("hit").inc()
+                AGENT_LLM_SPECULATION_SAVED.observe(saved)
+                return stream
+            self._cancel("miss")
+        return self._next(agent, chat_ctx)
+
+    def report(self) -> dict:
+        total = sum(self.outcomes.values())
+        return {
+            **self.outcomes,
+            "hit_rate": round(self.outcomes["hit"] / total, 3) if total else 0.0,
+            "latency_saved": round(self.saved, 3),
+        }
+
+    async def aclose(self):
+        if self._stream is not None:
+            self._cancel("cancelled")
+        await asyncio.gather(*self._closing, return_exceptions=True)
@@ -0,0 +1,104 @@
+import pytest
+from types import SimpleNamespace
+from livekit import agents
+from dataclasses import dataclass
+from adaptive_endpointing import AdaptiveEndpointing
+from benchmarks.bench_endpointing import PERSONAS, synthetic_turns
+
+@dataclass(frozen=True)
+class PipelineOptions:
+    min_endpointing_delay: float
+    max_endpointing_delay: float
+
+def replay(turns: list, controller: AdaptiveEndpointing, adaptive: bool = True, reply_after: float = 0.7) -> dict:
+    """
+    Feed a persona's pauses to the controller as timestamps; a pause that outlasts min_delay is a false endpoint.
+    """
+    now, delays, false_endpoints = 0.0, [], 0
+    for pauses in turns:
+        now += 1.0
+        for pause in pauses:
+            delay = controller.min_delay
+            if adaptive:
+                controller.on_user_stopped_speaking(now)
+            if pause >= delay:
+                false_endpoints += 1
+                if adaptive and pause >= delay + reply_after:
+                    controller.on_agent_started_speaking(now + delay + reply_after)
+            now += pause
+            if adaptive:
+                controller.on_user_started_speaking(now)
+            now += 1.0
+        delay = controller.min_delay
+        delays.append(delay)
+        if adaptive:
+            controller.on_user_stopped_speaking(now)
+            controller.on_agent_started_speaking(now + delay + reply_after)
+        now += delay + reply_after + 2.0
+    return {"median_delay": sorted(delays)[len(delays) // 2], "false_endpoints": false_endpoints}
+
+def test_fast_talker_gets_shorter_delay_without_false_endpoints():
+    turns = synthetic_turns("fast", 200)
+    fixed = replay(turns, AdaptiveEndpointing(min_delay=0.5), adaptive=False)
+    adaptive = replay(turns, AdaptiveEndpointing(min_delay=0.5))
+    assert adaptive["median_delay"] < fixed["median_delay"]
+    assert adaptive["false_endpoints"] <= fixed["false_endpoints"]
+
+def test_hesitant_speaker_is_cut_off_less():
+    turns = synthetic_turns("hesitant", 200)
+    fixed = replay(turns, AdaptiveEndpointing(min_delay=0.5), adaptive=False)
+    adaptive = replay(turns, AdaptiveEndpointing(min_delay=0.5))
+    assert adaptive["false_endpoints"] < fixed["false_endpoints"] / 5
+
+def test_no_persona_is_cut_off_more_than_with_fixed_delays():
+    for persona in PERSONAS:
+        for seed in range(20):
+            turns = synthetic_turns(persona, 50, seed)
+            fixed = replay(turns, AdaptiveEndpointing(min_delay=0.5), adaptive=False)
+            adaptive = replay(turns, AdaptiveEndpointing(min_delay=0.5))
+            assert adaptive["false_endpoints"] <= fixed["false_endpoints"], (persona, seed)
+
+def test_pauses_are_measured_from_where_the_pipeline_counts_its_delay(monkeypatch):
+    """A final transcript that arrived before the VAD end of speech starts the pause, as it starts the delay."""
+    handlers = {}
+    validation = SimpleNamespace(_last_recv_start_of_speech_time=10.0, _last_recv_transcript_time=10.6)
+    agent = SimpleNamespace(_opts=PipelineOptions(0.5, 5.0), _deferred_validation=validation,
+                            on=lambda event, handler: handlers.setdefault(event, handler))
+    controller = AdaptiveEndpointing()
+    assert controller.attach(agent)
+    monkeypatch.setattr("adaptive_endpointing.time.perf_counter", lambda: 10.7)
+    handlers["user_stopped_speaking"]()
+    monkeypatch.setattr("adaptive_endpointing.time.perf_counter", lambda: 11.0)
+    handlers["user_started_speaking"]()
+    assert list(controller.pauses) == [pytest.approx(0.4)]
+
+def test_delays_stay_within_bounds_and_reach_the_agent():
+    """Very long pauses are clamped to the ceilings, and the chosen values are written to the agent."""
+    controller = AdaptiveEndpointing(min_bounds=(0.2, 1.5), max_bounds=(2.0, 6.0), min_turns=1, min_pauses=1)
+    validation = SimpleNamespace(_end_of_speech_delay=0.5, _max_endpointing_delay=5.0)
+    agent = SimpleNamespace(_opts=PipelineOptions(0.5, 5.0), _deferred_validation=validation)
+    controller._agent = agent
+    controller.on_user_stopped_speaking(0.0)
+    controller.on_user_started_speaking(9.0)
+    controller.on_user_stopped_speaking(10.0)
+    controller.on_agent_started_speaking(11.0)
+    assert (controller.min_delay, controller.max_delay) == (1.5, 6.0)
+    assert (validation._end_of_speech_delay, validation._max_endpointing_delay) == (1.5, 6.0)
+    assert agent._opts.min_endpointing_delay == 1.5
+
+def test_speech_right_after_the_answer_counts_as_cutoff():
+    controller = AdaptiveEndpointing(min_turns=1)
+    controller.on_user_stopped_speaking(0.0)
+    controller.on_agent_started_speaking(1.2)
+    controller.on_user_started_speaking(1.5)
+    assert controller.cutoffs == 1
+    assert list(controller.pauses) == [1.5]
+
+def test_unchecked_livekit_release_keeps_fixed_delays(monkeypatch):
+    """The private pipeline fields are only written on livekit-agents releases in ENDPOINTING_LIVEKIT_VERSIONS."""
+    monkeypatch.setattr(agents, "__version__", "1.0.0")
+    handlers = []
+    agent = SimpleNamespace(_opts=PipelineOptions(0.5, 5.0), on=lambda event, handler: handlers.append(event))
+    controller = AdaptiveEndpointing(min_turns=1)
+    assert not controller.attach(agent)
+    assert handlers == [] and controller._agent is None
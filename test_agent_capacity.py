@@ -0,0 +1,70 @@
+import pytest
+from types import SimpleNamespace
+import agent_capacity
+from agent_capacity import SessionCapacity
+
+def job_proc(job_id, pid=None):
+    return SimpleNamespace(pid=pid, running_job=SimpleNamespace(job=SimpleNamespace(id=job_id)))
+
+def worker(*procs):
+    idle = SimpleNamespace(pid=None, running_job=None)
+    return SimpleNamespace(_proc_pool=SimpleNamespace(processes=[idle, *procs]))
+
+class FakeRequest:
+    def __init__(self, job_id):
+        self.job = SimpleNamespace(id=job_id)
+        self.decision = None
+
+    async def accept(self):
+        self.decision = "accepted"
+
+    async def reject(self):
+        self.decision = "rejected"
+
+def test_load_counts_sessions_at_their_cpu_cost():
+    capacity = SessionCapacity(cores=2, session_cpu=0.25, threshold=0.75)
+    assert capacity.load(worker()) == 0.0
+    assert capacity.load(worker(job_proc("a"), job_proc("b"))) == 0.25
+    capacity.max_sessions = 4
+    assert capacity.load(worker(job_proc("a"), job_proc("b"), job_proc("c"))) == 0.75
+
+def test_session_cpu_follows_measured_usage(monkeypatch):
+    """CPU seconds per wall-clock second since the last sample move the estimate by `smoothing`."""
+    cpu_seconds = iter([1.0, 1.6, 1.6])
+    clock = iter([100.0, 101.0, 102.0])
+
+    class FakeProcess:
+        def __init__(self, pid):
+            self.cpu = next(cpu_seconds)
+
+        def cpu_times(self):
+            return SimpleNamespace(user=self.cpu, system=0.0)
+
+    monkeypatch.setattr(agent_capacity.psutil, "Process", FakeProcess)
+    monkeypatch.setattr(agent_capacity.time, "monotonic", lambda: next(clock))
+    capacity = SessionCapacity(cores=1, session_cpu=0.5, smoothing=0.5, warmup=0)
+    busy = worker(job_proc("a", pid=1234))
+    capacity.load(busy)
+    assert capacity.session_cpu == 0.5
+    capacity.load(busy)
+    assert capacity.session_cpu == pytest.approx(0.55)
+    capacity.load(busy)
+    assert capacity.session_cpu == pytest.approx(0.275)
+
+@pytest.mark.asyncio
+async def test_requests_are_rejected_before_the_threshold_is_crossed():
+    """Accepted jobs count against the load before their process reports in, so a burst cannot overshoot."""
+    capacity = SessionCapacity(cores=1, session_cpu=0.3, threshold=0.75)
+    requests = [FakeRequest(f"job-{i}") for i in range(4)]
+    for request in requests:
+        await capacity.request_fnc(request)
+    assert [r.decision for r in requests] == ["accepted", "accepted", "rejected", "rejected"]
+    assert capacity.load(worker(job_proc("job-0"))) == 0.6
+    assert capacity.load(worker(job_proc("job-0"), job_proc("job-1"))) == 0.6
+
+@pytest.mark.asyncio
+async def test_idle_worker_always_takes_a_job():
+    capacity = SessionCapacity(cores=1, session_cpu=2.0, threshold=0.75)
+    request = FakeRequest("big")
+    await capacity.request_fnc(request)
+    assert request.decision == "accepted"
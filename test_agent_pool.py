@@ -0,0 +1,116 @@
+import sys
+import socket
+import asyncio
+import threading
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from httpx import AsyncClient, ASGITransport
+from agent_pool import AgentWorkerPool, serve_status
+
+# Stand-in for agent.py: serves the health endpoint on AGENT_HTTP_PORT and exits cleanly on SIGTERM.
+FAKE_WORKER = """
+import os, signal, sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+class Health(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200); self.end_headers(); self.wfile.write(b"OK")
+    def log_message(self, *args):
+        pass
+signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+HTTPServer(("127.0.0.1", int(os.environ["AGENT_HTTP_PORT"])), Health).serve_forever()
+"""
+
+def _free_base_port(count: int) -> int:
+    for _ in range(50):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            base = probe.getsockname()[1]
+        try:
+            sockets = [socket.socket() for _ in range(count)]
+            for i, sock in enumerate(sockets):
+                sock.bind(("127.0.0.1", base + i))
+            return base
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+    raise RuntimeError("no free port range")
+
+async def _wait_for(predicate, timeout=10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.05)
+
+@pytest.fixture
+def pool_env(monkeypatch):
+    monkeypatch.setenv("AGENT_HEALTH_INTERVAL", "0.05")
+    monkeypatch.setenv("AGENT_RESTART_BACKOFF", "0.05")
+    monkeypatch.setenv("AGENT_DRAIN_TIMEOUT", "5")
+
+@pytest.mark.asyncio
+async def test_pool_restarts_crashed_worker_and_drains(pool_env):
+    """Crashed workers are restarted and every worker is drained on stop."""
+    pool = AgentWorkerPool(size=2, base_port=_free_base_port(2), command=[sys.executable, "-c", FAKE_WORKER])
+    await pool.start()
+    try:
+        await _wait_for(lambda: pool.status()["healthy"] == 2)
+        crashed = pool.workers[0]
+        old_pid = crashed.process.pid
+        crashed.process.kill()
+        await _wait_for(lambda: crashed.restarts == 1 and crashed.healthy)
+        assert crashed.process.pid != old_pid
+        assert pool.workers[1].restarts == 0
+    finally:
+        await pool.stop()
+    status = pool.status()
+    assert status["running"] == 0
+    assert [w["last_exit_code"] for w in status["workers"]] == [0, 0]
+
+@pytest.mark.asyncio
+async def test_api_proxies_status_from_the_supervisor(pool_env):
+    """The API starts no agents; /agents/status reads the supervisor's status endpoint or returns 503."""
+    import main
+    status_port = _free_base_port(1)
+    pool = AgentWorkerPool(size=1, base_port=_free_base_port(1), command=[sys.executable, "-c", FAKE_WORKER])
+    runner = await serve_status(pool, port=status_port)
+    await pool.start()
+    try:
+        await _wait_for(lambda: pool.status()["healthy"] == 1)
+        with patch("main.AGENT_POOL_STATUS_URL", f"http://127.0.0.1:{status_port}/status"):
+            async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://test") as ac:
+                response = await ac.get("/agents/status")
+        assert response.status_code == 200
+        assert response.json()["healthy"] == 1
+        assert response.json()["workers"][0]["memory"]["processes"]
+    finally:
+        await pool.stop()
+        await runner.cleanup()
+    with patch("main.AGENT_POOL_STATUS_URL", f"http://127.0.0.1:{status_port}/status"):
+        async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://test") as ac:
+            assert (await ac.get("/agents/status")).status_code == 503
+
+@pytest.mark.asyncio
+async def test_memory_is_measured_off_the_loop_and_reused(monkeypatch):
+    """memory_report() runs in a thread, once per memory_interval unless a worker has no report yet."""
+    calls = []
+
+    def fake_report(pid):
+        calls.append((pid, threading.current_thread() is threading.main_thread()))
+        return {"total_pss_mb": 10.0}
+
+    monkeypatch.setattr("agent_pool.memory_report", fake_report)
+    pool = AgentWorkerPool(size=2, base_port=9000, command=["true"])
+    pool.memory_interval = 60
+    for worker in pool.workers:
+        worker.process = SimpleNamespace(pid=100 + worker.index, returncode=None)
+    await pool.measure_memory()
+    await pool.measure_memory()
+    assert calls == [(100, False), (101, False)]
+    assert pool.status()["total_pss_mb"] == 20.0
+    pool.workers[1].memory = None
+    await pool.measure_memory()
+    assert len(calls) == 4
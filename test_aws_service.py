@@ -0,0 +1,124 @@
+import pytest
+import pytest_asyncio
+from conftest import BUCKET
+
+@pytest_asyncio.fixture
+async def s3_session(s3_session):
+    for key in ["sessions/u1/a.mp4", "sessions/u1/b.ogg", "sessions/u1/notes.txt", "sessions/u2/c.mp4"]:
+        await s3_session.s3.put_object(Bucket=BUCKET, Key=key, Body=b"data")
+    return s3_session
+
+@pytest.mark.asyncio
+async def test_get_all_files_filters_by_user_and_type(s3_session):
+    """Only .mp4/.ogg objects under the user's prefix are listed."""
+    files = await s3_session.get_all_files("u1")
+    assert sorted(files) == ["sessions/u1/a.mp4", "sessions/u1/b.ogg"]
+
+@pytest.mark.asyncio
+async def test_hls_recordings_are_listed_by_playlist_and_signed(s3_session):
+    """Segmented recordings are listed once (type hls) without scanning their segments, and their playlist is served with signed segment URLs."""
+    playlist = "#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.000,\nrec_00000.ts\n#EXTINF:6.000,\n../../u2/c.ts\n"
+    await s3_session.s3.put_object(Bucket=BUCKET, Key="sessions/u1/rec.hls/rec.m3u8", Body=playlist.encode())
+    for i in range(5):
+        await s3_session.s3.put_object(Bucket=BUCKET, Key=f"sessions/u1/rec.hls/rec_{i:05d}.ts", Body=b"data")
+    assert await s3_session.get_all_files("u1", ["hls"]) == ["sessions/u1/rec.hls/rec.m3u8"]
+    page = await s3_session.list_files_page("u1", limit=10, types=["hls", "ogg"])
+    assert [(e["key"], e["type"]) for e in page["recordings"]] == [("sessions/u1/b.ogg", "ogg"), ("sessions/u1/rec.hls/rec.m3u8", "hls")]
+    # a.mp4, b.ogg, notes.txt and the rec.hls/ prefix fill two pages of two
+    first = await s3_session.list_files_page("u1", limit=2)
+    second = await s3_session.list_files_page("u1", limit=2, cursor=first["next_cursor"])
+    assert [e["key"] for e in first["recordings"] + second["recordings"]] == [
+        "sessions/u1/a.mp4", "sessions/u1/b.ogg", "sessions/u1/rec.hls/rec.m3u8"]
+
+    lines = (await s3_session.get_signed_playlist("sessions/u1/rec.hls/rec.m3u8", 60)).splitlines()
+    assert lines[:3] == ["#EXTM3U", "#EXT-X-TARGETDURATION:6", "#EXTINF:6.000,"]
+    assert "sessions/u1/rec.hls/rec_00000.ts" in lines[3] and "Signature" in lines[3]
+    assert lines[5] == "../../u2/c.ts"
+    assert await s3_session.get_signed_playlist("sessions/u1/missing.m3u8") is None
+    with pytest.raises(ValueError):
+        await s3_session.get_signed_playlist("sessions/u1/a.mp4")
+
+@pytest.mark.asyncio
+async def test_get_file_url_reuses_client(s3_session):
+    """Signing reuses the shared client and honours the expiration."""
+    client = s3_session.s3
+    url = await s3_session.get_file_url("sessions/u1/a.mp4", 60)
+    assert "sessions/u1/a.mp4" in url
+    assert "Expires=" in url or "X-Amz-Expires=60" in url
+    assert s3_session.s3 is client
+
+@pytest.mark.asyncio
+async def test_get_file_url_rejects_outside_sessions(s3_session):
+    """Keys outside the sessions directory are refused."""
+    with pytest.raises(ValueError):
+        await s3_session.get_file_url("private/secret.mp4")
+
+@pytest.mark.asyncio
+async def test_listing_is_cached_until_invalidated(s3_session):
+    """New objects show up only after the user's listing is invalidated."""
+    assert len(await s3_session.get_all_files("u2")) == 1
+    await s3_session.s3.put_object(Bucket=BUCKET, Key="sessions/u2/new.mp4", Body=b"data")
+    assert len(await s3_session.get_all_files("u2")) == 1
+    s3_session.invalidate_key("sessions/u2/new.mp4")
+    assert len(await s3_session.get_all_files("u2")) == 2
+    assert s3_session.listing_cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_list_files_page_follows_cursor(s3_session):
+    """Pages carry metadata and a cursor until the listing is exhausted."""
+    for i in range(5):
+        await s3_session.s3.put_object(Bucket=BUCKET, Key=f"sessions/paged/r{i}.mp4", Body=b"x" * i)
+    await s3_session.s3.put_object(Bucket=BUCKET, Key="sessions/paged/r0.txt", Body=b"data")
+    first = await s3_session.list_files_page("paged", limit=3)
+    assert [e["key"] for e in first["recordings"]] == ["sessions/paged/r0.mp4", "sessions/paged/r1.mp4", "sessions/paged/r2.mp4"]
+    assert first["recordings"][1]["size"] == 1
+    assert first["recordings"][1]["type"] == "mp4"
+    assert first["recordings"][1]["last_modified"]
+    second = await s3_session.list_files_page("paged", limit=3, cursor=first["next_cursor"])
+    assert [e["key"] for e in second["recordings"]] == ["sessions/paged/r3.mp4", "sessions/paged/r4.mp4"]
+    assert second["next_cursor"] is None
+
+@pytest.mark.asyncio
+async def test_get_file_urls_batch_reuses_cached_urls(s3_session):
+    """Batch signing reports invalid keys per key and reuses cached URLs."""
+    single = await s3_session.get_file_url("sessions/u1/a.mp4", 600)
+    result = await s3_session.get_file_urls(["sessions/u1/a.mp4", "sessions/u1/b.ogg", "other/c.mp4"], 600)
+    assert result["urls"]["sessions/u1/a.mp4"] == single
+    assert "sessions/u1/b.ogg" in result["urls"]
+    assert result["errors"] == {"other/c.mp4": "File key must be in the sessions directory"}
+    assert s3_session.url_cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_serves_ranges_and_conditional_requests(s3_session):
+    """Only the requested bytes are relayed; validators from a previous response give 304, and a stale If-Range gives the full file."""
+    from unittest.mock import patch
+    from httpx import AsyncClient, ASGITransport
+    from main import app
+    body = bytes(range(256)) * 1024
+    await s3_session.s3.put_object(Bucket=BUCKET, Key="sessions/u3/long.mp4", Body=body, ContentType="video/mp4")
+    params = {"file_key": "sessions/u3/long.mp4"}
+    with patch("main.s3_manager", s3_session):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            full = await ac.get("/recordings/stream", params=params)
+            etag = full.headers["etag"]
+            partial = await ac.get("/recordings/stream", params=params, headers={"Range": "bytes=1000-1999"})
+            suffix = await ac.get("/recordings/stream", params=params, headers={"Range": "bytes=-10"})
+            multi = await ac.get("/recordings/stream", params=params, headers={"Range": "bytes=0-1,5-6"})
+            unsatisfiable = await ac.get("/recordings/stream", params=params, headers={"Range": f"bytes={len(body)}-"})
+            not_modified = await ac.get("/recordings/stream", params=params, headers={"If-None-Match": etag})
+            not_modified_since = await ac.get("/recordings/stream", params=params, headers={"If-Modified-Since": full.headers["last-modified"]})
+            current_range = await ac.get("/recordings/stream", params=params, headers={"Range": "bytes=0-9", "If-Range": etag})
+            stale_range = await ac.get("/recordings/stream", params=params, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+            missing = await ac.get("/recordings/stream", params={"file_key": "sessions/u3/none.mp4"})
+            outside = await ac.get("/recordings/stream", params={"file_key": "private/x.mp4"})
+    assert full.status_code == 200 and full.content == body
+    assert full.headers["accept-ranges"] == "bytes" and full.headers["content-type"] == "video/mp4"
+    assert partial.status_code == 206 and partial.content == body[1000:2000]
+    assert partial.headers["content-range"] == f"bytes 1000-1999/{len(body)}"
+    assert suffix.status_code == 206 and suffix.content == body[-10:]
+    assert multi.status_code == 200 and len(multi.content) == len(body)
+    assert unsatisfiable.status_code == 416 and unsatisfiable.headers["content-range"] == f"bytes */{len(body)}"
+    assert not_modified.status_code == 304 and not_modified_since.status_code == 304
+    assert current_range.status_code == 206 and current_range.content == body[:10]
+    assert stale_range.status_code == 200 and len(stale_range.content) == len(body)
+    assert missing.status_code == 404 and outside.status_code == 400
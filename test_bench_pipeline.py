@@ -0,0 +1,19 @@
+import pytest
+import numpy as np
+from benchmarks.bench_pipeline import run_session, synthetic_speech, speech_end_offset, to_frames, SAMPLE_RATE
+from benchmarks.fake_providers import FakeLLM, FakeSTT, FakeTTS, FakeVAD
+
+@pytest.mark.asyncio
+async def test_fixture_turn_is_answered_through_the_agent_pipeline():
+    """The agent built by agent.build_agent() answers a spoken fixture, after the fake providers' latencies."""
+    frames = to_frames(np.concatenate([synthetic_speech(0.8), np.zeros(SAMPLE_RATE // 5, dtype=np.int16)]))
+    end_offset = speech_end_offset(frames)
+    assert 0.7 <= end_offset <= 0.82
+    llm = FakeLLM(latency=0.05)
+    userdata = {"vad": FakeVAD(), "stt": FakeSTT(latency=0.05), "llm": llm, "tts": FakeTTS(latency=0.05, ms_per_char=5)}
+    result = await run_session(0, userdata, [(frames, end_offset)], turns=1, think_time=0.0, start_delay=0.0)
+    assert result["missed"] == 0
+    assert len(result["latencies"]) == 1
+    # VAD silence (0.55s) plus LLM and TTS latency, well under the turn timeout
+    assert 0.6 < result["latencies"][0] < 3.0
+    assert llm.requests == 1
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from livekit.agents import llm
+from chat_compaction import ChatCompactor, SUMMARY_PREFIX
+from benchmarks.fake_providers import FakeLLM
+
+def _conversation(turns: int) -> llm.ChatContext:
+    chat_ctx = llm.ChatContext().append(role="system", text="You are FRIDAY.")
+    for i in range(turns):
+        chat_ctx.append(role="user", text=f"question {i}")
+        chat_ctx.append(role="assistant", text=f"answer {i}")
+    return chat_ctx
+
+@pytest.mark.asyncio
+async def test_short_conversation_is_sent_unchanged():
+    compactor = ChatCompactor(FakeLLM(latency=0), max_turns=4, summary_batch=2)
+    chat_ctx = _conversation(3)
+    compacted = compactor.compact(chat_ctx)
+    assert [m.content for m in compacted.messages] == [m.content for m in chat_ctx.messages]
+    assert compactor._task is None
+
+@pytest.mark.asyncio
+async def test_old_turns_are_folded_into_summary_in_background():
+    """Overflow is sent verbatim until the background summary lands, then replaced by it; the system prompt stays first."""
+    summary_llm = FakeLLM(latency=0.05, reply="The boss asked questions 0 to 2.")
+    compactor = ChatCompactor(summary_llm, max_turns=2, summary_batch=3)
+    chat_ctx = _conversation(5)
+
+    first = compactor.compact(chat_ctx)
+    assert len(first.messages) == len(chat_ctx.messages)
+    assert compactor._task is not None
+    await asyncio.wait_for(compactor._task, 1)
+
+    compacted = compactor.compact(chat_ctx)
+    assert compacted.messages[0].content == "You are FRIDAY."
+    assert compacted.messages[1].content == f"{SUMMARY_PREFIX} The boss asked questions 0 to 2."
+    assert [m.content for m in compacted.messages[2:]] == ["question 3", "answer 3", "question 4", "answer 4"]
+    assert len(chat_ctx.messages) == 11
+    assert "question 0" in summary_llm.prompts[0].messages[-1].content
+
+@pytest.mark.asyncio
+async def test_failed_summary_keeps_turns_verbatim():
+    class FailingLLM(FakeLLM):
+        def chat(self, **kwargs):
+            raise RuntimeError("provider down")
+
+    compactor = ChatCompactor(FailingLLM(), max_turns=1, summary_batch=1)
+    chat_ctx = _conversation(3)
+    compactor.compact(chat_ctx)
+    await asyncio.wait_for(compactor._task, 1)
+    assert compactor.summary == ""
+    assert len(compactor.compact(chat_ctx).messages) == len(chat_ctx.messages)
+    await compactor.aclose()
@@ -0,0 +1,157 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from livekit import api
+from egress_service import EgressSession, TrackNotFound
+from egress_store import MemoryEgressStore, SQLiteEgressStore
+from benchmarks.fake_livekit import FakeLiveKitServer
+
+@pytest_asyncio.fixture
+async def fake_livekit():
+    server = FakeLiveKitServer(latency=0.02)
+    await server.start()
+    yield server
+    await server.stop()
+
+@pytest_asyncio.fixture
+async def egress_session(fake_livekit, monkeypatch):
+    monkeypatch.setenv("LIVEKIT_URL", fake_livekit.url)
+    monkeypatch.setenv("LIVEKIT_API_KEY", "devkey")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "fake-livekit-api-secret-for-tests-only")
+    monkeypatch.setenv("AWS_BUCKET_NAME", "test-recordings")
+    session = EgressSession(store=MemoryEgressStore())
+    yield session
+    await session.close()
+
+@pytest.mark.asyncio
+async def test_start_uses_prebuilt_output_templates(egress_session, fake_livekit):
+    """Each start gets its own filepath while sharing the prebuilt S3 output config."""
+    await egress_session.start_room_composite("room-a", "u1", audio_only=True)
+    await egress_session.start_room_composite("room-b", "u2")
+    requests = {info.room_name: info.room_composite for info in fake_livekit.egresses.values()}
+    assert requests["room-a"].file_outputs[0].file_type == api.EncodedFileType.OGG
+    assert requests["room-a"].file_outputs[0].filepath.startswith("sessions/u1/recording_room-a_")
+    assert requests["room-b"].file_outputs[0].file_type == api.EncodedFileType.MP4
+    assert requests["room-b"].file_outputs[0].s3.bucket == "test-recordings"
+    assert requests["room-b"].preset == api.EncodingOptionsPreset.PORTRAIT_H264_1080P_30
+    assert not egress_session._file_output_templates[False].filepath
+
+@pytest.mark.asyncio
+async def test_batch_start_and_stop_respect_concurrency(egress_session, fake_livekit):
+    """Batch calls never exceed the concurrency limit and report a result per item."""
+    items = [{"room_name": f"room-{i}", "user_id": f"u{i}"} for i in range(12)]
+    started = await egress_session.start_batch(items, concurrency=3)
+    assert [r["room_name"] for r in started] == [f"room-{i}" for i in range(12)]
+    assert all(r["success"] for r in started)
+    assert fake_livekit.max_in_flight == 3
+    assert len(await egress_session.list_active()) == 12
+
+    egress_ids = [r["info"]["egress_id"] for r in started] + ["EG_unknown"]
+    stopped = await egress_session.stop_batch(egress_ids, concurrency=4)
+    assert [r["success"] for r in stopped] == [True] * 12 + [False]
+    assert stopped[0]["info"]["user_id"] == "u0"
+    assert "failed_precondition" in stopped[-1]["error"]
+    assert await egress_session.list_active() == []
+
+@pytest.mark.asyncio
+async def test_duplicate_starts_share_one_egress(egress_session, fake_livekit):
+    """Concurrent and repeated starts for a room reuse its egress; idempotency keys survive the stop."""
+    first, second = await asyncio.gather(
+        egress_session.start_room_composite("room-a", "u1"), egress_session.start_room_composite("room-a", "u1")
+    )
+    retry = await egress_session.start_room_composite("room-a", "u1")
+    audio = await egress_session.start_room_composite("room-a", "u1", audio_only=True)
+    assert first["egress_id"] == second["egress_id"] == retry["egress_id"] != audio["egress_id"]
+    assert [first["reused"], second["reused"], retry["reused"]] == [False, True, True]
+    assert len(fake_livekit.egresses) == 2
+
+    egress_session.dedup_window = 0
+    keyed = await egress_session.start_room_composite("room-b", "u2", idempotency_key="k1")
+    await egress_session.stop_egress(keyed["egress_id"])
+    assert (await egress_session.start_room_composite("room-b", "u2", idempotency_key="k1"))["egress_id"] == keyed["egress_id"]
+    assert (await egress_session.start_room_composite("room-b", "u2"))["egress_id"] != keyed["egress_id"]
+    with pytest.raises(ValueError):
+        await egress_session.start_room_composite("room-c", "u2", idempotency_key="k1")
+    assert len(fake_livekit.egresses) == 4
+
+@pytest.mark.asyncio
+async def test_duplicate_starts_in_different_workers_share_one_egress(egress_session, fake_livekit, tmp_path):
+    """Workers sharing a SQLite store reserve the start before calling LiveKit, so only one records."""
+    workers = [EgressSession(store=SQLiteEgressStore(str(tmp_path / "egress.db"))) for _ in range(2)]
+    try:
+        results = await asyncio.gather(
+            *(worker.start_room_composite("room-a", "u1") for worker in workers),
+            *(worker.start_room_composite("room-b", "u2", idempotency_key="k1") for worker in workers),
+        )
+        assert results[0]["egress_id"] == results[1]["egress_id"]
+        assert results[2]["egress_id"] == results[3]["egress_id"]
+        assert sorted(r["reused"] for r in results) == [False, False, True, True]
+        assert len(fake_livekit.egresses) == 2
+        with pytest.raises(ValueError):
+            await workers[1].start_room_composite("room-c", "u2", idempotency_key="k1")
+    finally:
+        for worker in workers:
+            await worker.close()
+
+@pytest.mark.asyncio
+async def test_track_and_hls_modes(egress_session, fake_livekit):
+    """Track mode records the user's microphone without the compositor; hls writes a playlist with a chosen preset."""
+    microphone = api.TrackInfo(sid="TR_mic", type=api.TrackType.AUDIO, source=api.TrackSource.MICROPHONE)
+    fake_livekit.participants["room-a"] = [
+        api.ParticipantInfo(identity="agent", kind=api.ParticipantInfo.Kind.AGENT,
+                            tracks=[api.TrackInfo(sid="TR_agent", type=api.TrackType.AUDIO, source=api.TrackSource.MICROPHONE)]),
+        api.ParticipantInfo(identity="user", tracks=[microphone]),
+    ]
+    track = await egress_session.start_recording("room-a", "u1", mode="track")
+    hls = await egress_session.start_recording("room-a", "u1", mode="hls", preset="H264_720P_30")
+    requests = {info.egress_id: info for info in fake_livekit.egresses.values()}
+    assert requests[track["egress_id"]].track.track_id == "TR_mic"
+    assert track["file_key"] == requests[track["egress_id"]].track.file.filepath
+    assert track["file_key"].startswith("sessions/u1/recording_room-a_") and track["file_key"].endswith(".ogg")
+    segments = requests[hls["egress_id"]].room_composite.segment_outputs[0]
+    assert hls["file_key"] == segments.playlist_name and hls["file_key"].endswith(".m3u8")
+    assert segments.filename_prefix == hls["file_key"][:-len(".m3u8")] and ".hls/recording_room-a_" in hls["file_key"]
+    assert segments.protocol == api.SegmentedFileProtocol.HLS_PROTOCOL
+    assert requests[hls["egress_id"]].room_composite.preset == api.EncodingOptionsPreset.H264_720P_30
+    assert (await egress_session.start_recording("room-a", "u1", mode="hls"))["egress_id"] != hls["egress_id"]
+    with pytest.raises(TrackNotFound):
+        await egress_session.start_recording("room-b", "u1", mode="track")
+
+def _signed_webhook(event: api.WebhookEvent, api_secret: str):
+    from google.protobuf.json_format import MessageToJson
+    import base64, hashlib
+    body = MessageToJson(event)
+    sha = base64.b64encode(hashlib.sha256(body.encode()).digest()).decode()
+    token = api.AccessToken("devkey", api_secret).with_sha256(sha).to_jwt()
+    return body, token
+
+@pytest.mark.asyncio
+async def test_webhook_updates_store(egress_session):
+    """Verified egress webhooks update status and drop ended egresses, notifying the stop listeners once."""
+    stopped = []
+    egress_session.add_stop_listener(stopped.append)
+    info = await egress_session.start_room_composite("room-a", "u1")
+    secret = "fake-livekit-api-secret-for-tests-only"
+    updated = api.WebhookEvent(event="egress_updated", egress_info=api.EgressInfo(egress_id=info["egress_id"], room_name="room-a", status=api.EgressStatus.EGRESS_ACTIVE))
+    event = await egress_session.receive_webhook(*_signed_webhook(updated, secret))
+    assert event["user_id"] == "u1"
+    assert (await egress_session.list_active(egress_id=info["egress_id"]))[0]["status"] == "EGRESS_ACTIVE"
+
+    ended = api.WebhookEvent(event="egress_ended", egress_info=api.EgressInfo(
+        egress_id=info["egress_id"], room_name="room-a", status=api.EgressStatus.EGRESS_COMPLETE,
+        file_results=[api.FileInfo(filename="sessions/u1/recording_room-a_1.mp4", size=42, duration=2_000_000_000)],
+    ))
+    event = await egress_session.receive_webhook(*_signed_webhook(ended, secret))
+    assert event["status"] == "EGRESS_COMPLETE"
+    assert event["files"][0]["duration"] == 2.0
+    assert await egress_session.list_active() == []
+    assert [(s["egress_id"], s["file_key"]) for s in stopped] == [(info["egress_id"], info["file_key"])]
+    await egress_session.receive_webhook(*_signed_webhook(ended, secret))
+    assert len(stopped) == 1
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_signature(egress_session):
+    """Webhooks signed with another secret are refused."""
+    event = api.WebhookEvent(event="egress_started", egress_info=api.EgressInfo(egress_id="EG_1"))
+    with pytest.raises(Exception):
+        await egress_session.receive_webhook(*_signed_webhook(event, "some-other-secret-that-is-long-enough"))
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from egress_store import MemoryEgressStore, SQLiteEgressStore
+from event_bus import SharedEventBus
+
+@pytest_asyncio.fixture(params=["memory", "sqlite"])
+async def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryEgressStore()
+    else:
+        store = SQLiteEgressStore(str(tmp_path / "egress.db"))
+    yield store
+    await store.close()
+
+def _metadata(egress_id, user_id="u1", room_name="room1", started_at=1):
+    return {"egress_id": egress_id, "user_id": user_id, "room_name": room_name, "started_at": started_at}
+
+@pytest.mark.asyncio
+async def test_lookup_by_id_user_and_room(store):
+    """Records can be found by egress ID, user and room."""
+    await store.put(_metadata("EG_1", "u1", "room1", 1))
+    await store.put(_metadata("EG_2", "u1", "room2", 2))
+    await store.put(_metadata("EG_3", "u2", "room2", 3))
+    assert (await store.get("EG_2"))["room_name"] == "room2"
+    assert [m["egress_id"] for m in await store.find(user_id="u1")] == ["EG_1", "EG_2"]
+    assert [m["egress_id"] for m in await store.find(room_name="room2")] == ["EG_2", "EG_3"]
+    assert [m["egress_id"] for m in await store.find(user_id="u2", room_name="room2")] == ["EG_3"]
+    assert len(await store.find()) == 3
+
+@pytest.mark.asyncio
+async def test_pop_removes_record(store):
+    """pop() returns the record once and removes it."""
+    await store.put(_metadata("EG_1"))
+    assert (await store.pop("EG_1"))["egress_id"] == "EG_1"
+    assert await store.pop("EG_1") is None
+    assert await store.get("EG_1") is None
+
+@pytest.mark.asyncio
+async def test_sqlite_store_is_shared_between_workers(tmp_path):
+    """Separate connections (one per worker) see each other's writes, even under concurrency."""
+    path = str(tmp_path / "egress.db")
+    workers = [SQLiteEgressStore(path) for _ in range(4)]
+    try:
+        await asyncio.gather(*(
+            workers[i % 4].put(_metadata(f"EG_{i}", user_id=f"u{i % 3}", started_at=i))
+            for i in range(200)
+        ))
+        assert len(await workers[0].find()) == 200
+        assert (await workers[3].pop("EG_7"))["egress_id"] == "EG_7"
+        assert await workers[1].get("EG_7") is None
+    finally:
+        for worker in workers:
+            await worker.close()
+
+@pytest.mark.asyncio
+async def test_shared_event_bus_reaches_subscribers_of_other_workers(tmp_path):
+    """A webhook event broadcast by one worker is delivered to SSE subscribers in another."""
+    path = str(tmp_path / "egress.db")
+    receiving, other = SharedEventBus(path, poll_interval=0.01), SharedEventBus(path, poll_interval=0.01)
+    await receiving.start()
+    await other.start()
+    try:
+        subscription = other.subscribe(user_id="u1")
+        await receiving.broadcast({"event": "egress_ended", "egress_id": "EG_1", "user_id": "u1", "room_name": "room1"})
+        await receiving.broadcast({"event": "egress_ended", "egress_id": "EG_2", "user_id": "u2", "room_name": "room1"})
+        event = await asyncio.wait_for(subscription.get(), timeout=5)
+        assert event["egress_id"] == "EG_1"
+        await asyncio.sleep(0.05)
+        assert subscription.queue.empty()
+    finally:
+        await receiving.close()
+        await other.close()
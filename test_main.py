@@ -1,5 +1,6 @@
+import json
 import pytest
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from httpx import AsyncClient, ASGITransport
 from main import app
 
@@ -29,7 +30,7 @@ async def test_get_file_url_missing_param():
 @patch("main.egress_manager", new_callable=AsyncMock)
 async def test_start_egress_invalid(mock_egress_manager):
     """Test /egress/start with mocked egress_manager and invalid input."""
-    mock_egress_manager.start_room_composite.side_effect = Exception("fail")
+    mock_egress_manager.start_recording.side_effect = Exception("fail")
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         response = await ac.post("/egress/start", params={"user_id": "test", "room_name": "testroom"})
     assert response.status_code == 500
@@ -46,9 +47,10 @@ async def test_stop_egress_invalid(mock_egress_manager):
     assert "detail" in response.json()
 
 @pytest.mark.asyncio
-@patch("main.get_all_files", return_value=["sessions/test/file1.mp4"])
-async def test_list_recordings_success(mock_get_all_files):
+@patch("main.s3_manager", new_callable=AsyncMock)
+async def test_list_recordings_success(mock_s3_manager):
     """Test /list endpoint with valid user_id."""
+    mock_s3_manager.get_all_files.return_value = ["sessions/test/file1.mp4"]
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         response = await ac.get("/list", params={"user_id": "test"})
     assert response.status_code == 200
@@ -56,11 +58,132 @@ async def test_list_recordings_success(mock_get_all_files):
     assert response.json()["recordings"] == ["sessions/test/file1.mp4"]
 
 @pytest.mark.asyncio
-@patch("main.get_file_url", return_value="https://example.com/file.mp4")
-async def test_get_file_url_success(mock_get_file_url):
+@patch("main.s3_manager", new_callable=AsyncMock)
+async def test_get_file_url_success(mock_s3_manager):
     """Test /get_file_url endpoint with valid file_key."""
+    mock_s3_manager.get_file_url.return_value = "https://example.com/file.mp4"
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         response = await ac.get("/get_file_url", params={"file_key": "sessions/test/file1.mp4"})
     assert response.status_code == 200
     assert "url" in response.json()
     assert response.json()["url"] == "https://example.com/file.mp4"
+
+@pytest.mark.asyncio
+@patch("main.s3_manager", new_callable=MagicMock)
+async def test_s3_events_invalidate_listing(mock_s3_manager):
+    """Test /s3/events invalidates listings for each notified object key."""
+    payload = {"Records": [{"s3": {"object": {"key": "sessions/test/recording+1.mp4"}}}]}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/s3/events", json=payload)
+    assert response.status_code == 200
+    assert response.json()["processed"] == 1
+    mock_s3_manager.invalidate_key.assert_called_once_with("sessions/test/recording 1.mp4")
+
+@pytest.mark.asyncio
+@patch("main.s3_manager", new_callable=MagicMock)
+async def test_list_recordings_stream(mock_s3_manager):
+    """Test /list?stream=true emits one NDJSON entry per recording."""
+    async def iter_files(user_id, cursor=None, types=None):
+        for key in ["sessions/test/a.mp4", "sessions/test/b.ogg"]:
+            yield {"key": key, "size": 1, "last_modified": None, "type": key[-3:]}
+    mock_s3_manager.iter_files = iter_files
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/list", params={"user_id": "test", "stream": "true"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["key"] for line in lines] == ["sessions/test/a.mp4", "sessions/test/b.ogg"]
+
+@pytest.mark.asyncio
+@patch("main.s3_manager", new_callable=AsyncMock)
+async def test_get_file_urls_success(mock_s3_manager):
+    """Test /get_file_urls signs a batch of keys in one request."""
+    mock_s3_manager.get_file_urls.return_value = {"urls": {"sessions/test/file1.mp4": "https://example.com/file.mp4"}, "errors": {}}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/get_file_urls", json={"file_keys": ["sessions/test/file1.mp4"], "expiration": 600})
+    assert response.status_code == 200
+    assert response.json()["urls"]["sessions/test/file1.mp4"] == "https://example.com/file.mp4"
+    mock_s3_manager.get_file_urls.assert_awaited_once_with(["sessions/test/file1.mp4"], 600)
+
+@pytest.mark.asyncio
+async def test_get_file_urls_empty_batch():
+    """Test /get_file_urls rejects an empty key list."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/get_file_urls", json={"file_keys": []})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+@patch("main.egress_manager", new_callable=AsyncMock)
+async def test_list_active_egresses(mock_egress_manager):
+    """Test /egress/active forwards its filters to the egress manager."""
+    mock_egress_manager.list_active.return_value = [{"egress_id": "EG_1", "user_id": "test", "room_name": "testroom"}]
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/egress/active", params={"user_id": "test"})
+    assert response.status_code == 200
+    assert response.json()["egresses"][0]["egress_id"] == "EG_1"
+    mock_egress_manager.list_active.assert_awaited_once_with(egress_id=None, user_id="test", room_name=None)
+
+@pytest.mark.asyncio
+@patch("main.egress_manager", new_callable=AsyncMock)
+async def test_livekit_webhook_pushes_event_to_subscribers(mock_egress_manager):
+    """Test /livekit/webhook publishes egress events to matching SSE subscribers."""
+    import main
+    event = {"event": "egress_ended", "egress_id": "EG_1", "user_id": "test", "room_name": "testroom", "status": "EGRESS_COMPLETE"}
+    mock_egress_manager.receive_webhook.return_value = event
+    subscription = main.event_bus.subscribe(user_id="test")
+    stream = main._egress_event_stream(subscription)
+    try:
+        assert (await stream.__anext__()).startswith("retry:")
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.post("/livekit/webhook", content="{}", headers={"Authorization": "token"})
+        assert response.status_code == 200
+        message = await stream.__anext__()
+        assert message.startswith("event: egress_ended\ndata: ")
+        assert json.loads(message.split("data: ", 1)[1])["egress_id"] == "EG_1"
+    finally:
+        await stream.aclose()
+    assert main.event_bus.subscriber_count == 0
+
+@pytest.mark.asyncio
+@patch("main.s3_manager", new_callable=MagicMock)
+async def test_egress_ended_events_invalidate_listing(mock_s3_manager):
+    """Test egress_ended events on the bus invalidate the listing; a stop only shortens its TTL."""
+    import asyncio
+    import main
+    main.on_egress_stopped({"user_id": "test"})
+    mock_s3_manager.expect_recording.assert_called_once_with("test")
+    mock_s3_manager.invalidate_user.assert_not_called()
+    task = asyncio.create_task(main.apply_egress_events(main.event_bus.subscribe()))
+    await asyncio.sleep(0)
+    main.event_bus.publish({"event": "egress_updated", "user_id": "test", "status": "EGRESS_ENDING"})
+    main.event_bus.publish({"event": "egress_ended", "user_id": "test", "status": "EGRESS_COMPLETE", "files": []})
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    mock_s3_manager.invalidate_user.assert_called_once_with("test")
+    assert main.event_bus.subscriber_count == 0
+
+@pytest.mark.asyncio
+@patch("main.egress_manager", new_callable=AsyncMock)
+async def test_livekit_webhook_invalid_signature(mock_egress_manager):
+    """Test /livekit/webhook rejects unverifiable payloads."""
+    mock_egress_manager.receive_webhook.side_effect = Exception("hash mismatch")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/livekit/webhook", content="{}", headers={"Authorization": "bad"})
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_egress_events_requires_filter():
+    """Test /egress/events needs a user_id or room_name."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/egress/events")
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_metrics_exports_route_latency():
+    """Test /metrics exports per-route latency with the route template as label."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.get("/")
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert 'jarvis_http_request_duration_seconds_count{method="GET",route="/",status="200"}' in response.text
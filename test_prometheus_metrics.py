@@ -0,0 +1,34 @@
+import pytest
+from livekit.agents import metrics
+from prometheus_metrics import AGENT_RESPONSE_LATENCY, AgentMetricsRecorder, REGISTRY, observe_call
+
+def _sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+def test_response_latency_combines_stages_of_one_turn():
+    """EOU delay, LLM TTFT and TTS TTFB of the same sequence form one response latency sample."""
+    recorder = AgentMetricsRecorder()
+    count = _sample("jarvis_agent_response_latency_seconds_count")
+    total = _sample("jarvis_agent_response_latency_seconds_sum")
+    recorder.record(metrics.PipelineEOUMetrics(sequence_id="s1", timestamp=0, end_of_utterance_delay=0.5, transcription_delay=0.1))
+    recorder.record(metrics.PipelineLLMMetrics(
+        request_id="r1", timestamp=0, ttft=0.3, duration=1.0, label="llm", cancelled=False, completion_tokens=5,
+        prompt_tokens=50, total_tokens=55, tokens_per_second=5.0, error=None, sequence_id="s1",
+    ))
+    assert _sample("jarvis_agent_response_latency_seconds_count") == count
+    recorder.record(metrics.PipelineTTSMetrics(
+        request_id="r2", timestamp=0, ttfb=0.2, duration=1.0, audio_duration=2.0, cancelled=False,
+        characters_count=20, label="tts", streamed=True, error=None, sequence_id="s1",
+    ))
+    assert _sample("jarvis_agent_response_latency_seconds_count") == count + 1
+    assert _sample("jarvis_agent_response_latency_seconds_sum") == pytest.approx(total + 1.0)
+
+@pytest.mark.asyncio
+async def test_observe_call_labels_errors():
+    """Failed external calls are recorded with the error outcome."""
+    labels = {"service": "s3", "operation": "test_op", "outcome": "error"}
+    before = _sample("jarvis_external_call_duration_seconds_count", labels)
+    with pytest.raises(RuntimeError):
+        async with observe_call("s3", "test_op"):
+            raise RuntimeError("boom")
+    assert _sample("jarvis_external_call_duration_seconds_count", labels) == before + 1
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import multiprocessing
+from multiprocessing import forkserver
+from livekit import agents
+from livekit.agents import worker as livekit_worker
+import shared_models
+from shared_models import memory_report, process_memory, use_forkserver
+
+def test_memory_report_covers_child_processes():
+    """The report lists the process and its children; USS never exceeds PSS or RSS."""
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        report = memory_report(os.getpid())
+        assert {os.getpid(), child.pid} <= {p["pid"] for p in report["processes"]}
+        assert report["per_process_uss_mb"] > 0
+        own = process_memory(os.getpid())
+        assert 0 < own["uss_mb"] <= own["pss_mb"] <= own["rss_mb"]
+    finally:
+        child.kill()
+        child.wait()
+    assert memory_report(child.pid) == {}
+
+def test_use_forkserver_replaces_the_hard_coded_spawn_context(monkeypatch):
+    """Worker.__init__ gets the forkserver context for spawn; the rest of multiprocessing is untouched."""
+    monkeypatch.setattr(livekit_worker, "mp", multiprocessing)
+    # setenv first, so the value use_forkserver() writes is undone after the test
+    monkeypatch.setenv("SHARED_MODELS_PRELOAD", "")
+    monkeypatch.delenv("SHARED_MODELS_PRELOAD")
+    monkeypatch.setattr(forkserver._forkserver, "_preload_modules", ["__main__"], raising=False)
+    assert use_forkserver(("shared_models",))
+    assert livekit_worker.mp.get_context("spawn").get_start_method() == "forkserver"
+    assert livekit_worker.mp.get_context("fork").get_start_method() == "fork"
+    assert livekit_worker.mp.cpu_count() == multiprocessing.cpu_count()
+    assert livekit_worker.mp.Process is multiprocessing.Process
+    assert forkserver._forkserver._preload_modules == ["shared_models"]
+    assert os.environ["SHARED_MODELS_PRELOAD"] == "1"
+    assert shared_models._models == {}
+
+def test_use_forkserver_leaves_unchecked_livekit_releases_alone(monkeypatch):
+    """On a livekit-agents release outside FORKSERVER_LIVEKIT_VERSIONS the worker keeps spawning."""
+    monkeypatch.setattr(livekit_worker, "mp", multiprocessing)
+    monkeypatch.setattr(agents, "__version__", "1.0.0")
+    monkeypatch.setenv("SHARED_MODELS_PRELOAD", "")
+    monkeypatch.delenv("SHARED_MODELS_PRELOAD")
+    assert not use_forkserver(("shared_models",))
+    assert livekit_worker.mp is multiprocessing
+    assert "SHARED_MODELS_PRELOAD" not in os.environ
@@ -0,0 +1,72 @@
+import pytest
+from types import SimpleNamespace
+from livekit.agents import llm
+from speculative_llm import SpeculativeReplies
+from benchmarks.fake_providers import FakeLLM
+
+def make_agent(fake_llm):
+    chat_ctx = llm.ChatContext().append(role="system", text="You are FRIDAY.")
+    return SimpleNamespace(chat_ctx=chat_ctx, llm=fake_llm, fnc_ctx=None, _transcribed_text="")
+
+def interim(text):
+    return SimpleNamespace(alternatives=[SimpleNamespace(text=text)])
+
+def reply_ctx(agent, question):
+    chat_ctx = agent.chat_ctx.copy()
+    chat_ctx.append(role="user", text=question)
+    return chat_ctx
+
+async def read(stream):
+    return "".join(chunk.choices[0].delta.content for chunk in [c async for c in stream] if chunk.choices)
+
+@pytest.mark.asyncio
+async def test_stable_interim_is_used_when_final_matches():
+    fake_llm = FakeLLM(latency=0.05)
+    agent = make_agent(fake_llm)
+    speculation = SpeculativeReplies(stable_interims=2)
+    speculation._agent = agent
+    speculation._on_interim_transcript(interim("what is on my"))
+    speculation._on_interim_transcript(interim("what is on my schedule"))
+    assert fake_llm.requests == 0
+    speculation._on_interim_transcript(interim("what is on my schedule"))
+    assert fake_llm.requests == 1
+
+    stream = speculation.before_llm_cb(agent, reply_ctx(agent, "What is on my schedule?"))
+    assert await read(stream) == "Certainly, boss."
+    assert fake_llm.requests == 1
+    assert speculation.outcomes == {"hit": 1, "miss": 0, "cancelled": 0}
+    assert speculation.report()["hit_rate"] == 1.0
+
+@pytest.mark.asyncio
+async def test_speculation_is_cancelled_when_user_keeps_talking():
+    fake_llm = FakeLLM(latency=0.05)
+    agent = make_agent(fake_llm)
+    speculation = SpeculativeReplies(stable_interims=2)
+    speculation._agent = agent
+    agent._transcribed_text = "Book a table"
+    speculation._on_final_transcript(interim("Book a table"))
+    assert fake_llm.requests == 1
+    speculation._on_interim_transcript(interim("for two"))
+    assert speculation.outcomes["cancelled"] == 1
+
+    stream = speculation.before_llm_cb(agent, reply_ctx(agent, "Book a table for two."))
+    await read(stream)
+    assert fake_llm.requests == 2
+    assert fake_llm.prompts[-1].messages[-1].content == "Book a table for two."
+    await speculation.aclose()
+
+@pytest.mark.asyncio
+async def test_changed_history_is_a_miss():
+    """A reply whose chat history differs from the speculation (e.g. the agent's last answer was committed since) is not reused."""
+    fake_llm = FakeLLM(latency=0.05)
+    agent = make_agent(fake_llm)
+    speculation = SpeculativeReplies()
+    speculation._agent = agent
+    agent._transcribed_text = "Turn on the lights"
+    speculation._on_final_transcript(interim("Turn on the lights"))
+    agent.chat_ctx.append(role="assistant", text="Anything else?")
+
+    await read(speculation.before_llm_cb(agent, reply_ctx(agent, "Turn on the lights")))
+    assert speculation.outcomes == {"hit": 0, "miss": 1, "cancelled": 0}
+    assert fake_llm.requests == 2
+    await speculation.aclose()
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+from httpx import AsyncClient, ASGITransport
+from livekit.agents import llm
+from transcript_store import TranscriptRecorder, TranscriptStore, fts_query
+from main import app
+
+@pytest_asyncio.fixture
+async def store(tmp_path):
+    store = TranscriptStore(str(tmp_path / "transcripts.db"))
+    yield store
+    await store.close()
+
+class FakeAgent:
+    def __init__(self):
+        self.handlers = {}
+
+    def on(self, event, callback):
+        self.handlers.setdefault(event, []).append(callback)
+
+    def emit(self, event, *args):
+        for callback in self.handlers.get(event, []):
+            callback(*args)
+
+def test_query_words_are_quoted():
+    """User input cannot inject FTS5 syntax; a trailing * stays a prefix match."""
+    assert fts_query('record* AND "x" NEAR(') == '"record"* "AND" "x" "NEAR"'
+    assert fts_query("?!") == ""
+
+@pytest.mark.asyncio
+async def test_search_returns_sessions_with_recording_offsets(store):
+    """Matches are grouped by session and carry offsets into the session and its recording."""
+    await store.start_session("job-1", "u1", "room1", started_at=1000)
+    await store.link_recording({"egress_id": "EG_1", "room_name": "room1", "user_id": "u1", "started_at": 1002,
+                                "file_key": "sessions/u1/recording_room1_1002.ogg"})
+    await store.add_turn("job-1", "user", "What's the weather tomorrow?", 1010, 1000)
+    await store.add_turn("job-1", "assistant", "Tomorrow will be sunny.", 1012.5, 1000)
+    await store.start_session("job-2", "u2", "room2", started_at=2000)
+    await store.add_turn("job-2", "user", "Play the weather report on the radio", 2001, 2000)
+
+    sessions = await store.search("weather")
+    assert {s["session_id"] for s in sessions} == {"job-1", "job-2"}
+    session = next(s for s in sessions if s["session_id"] == "job-1")
+    assert session["recording_key"] == "sessions/u1/recording_room1_1002.ogg"
+    assert session["matches"] == [{"role": "user", "offset_ms": 10000, "recording_offset_ms": 8000,
+                                   "snippet": "What's the [weather] tomorrow?"}]
+
+    # stemming, filters and recording ownership
+    assert [s["session_id"] for s in await store.search("reports", user_id="u2")] == ["job-2"]
+    assert await store.search("weather", room_name="room3") == []
+    await store.recording_stopped({"egress_id": "EG_1"})
+    await store.start_session("job-3", "u1", "room1", started_at=3000)
+    assert (await store.get_session("job-3"))["recording_key"] is None
+
+@pytest.mark.asyncio
+async def test_search_fills_limit_when_one_session_has_many_matches(store):
+    """A session with many strong matches does not crowd the other matching sessions out of the page."""
+    await store.start_session("job-1", "u1", "room1", started_at=1000)
+    for i in range(30):
+        await store.add_turn("job-1", "user", "weather", 1001 + i, 1000)
+    await store.start_session("job-2", "u1", "room2", started_at=2000)
+    await store.add_turn("job-2", "user", "and what about the weather in Malibu later today", 2001, 2000)
+    sessions = await store.search("weather", limit=2, turns_per_session=2)
+    assert [s["session_id"] for s in sessions] == ["job-1", "job-2"]
+    assert [len(s["matches"]) for s in sessions] == [2, 1]
+
+@pytest.mark.asyncio
+async def test_recorder_stores_turns_from_agent_events(store):
+    """Turns are timestamped when speech started and the session is closed on aclose()."""
+    agent = FakeAgent()
+    recorder = TranscriptRecorder(store, "job-1", "u1", "room1")
+    recorder.attach(agent)
+    await recorder.start()
+    agent.emit("user_started_speaking")
+    agent.emit("user_speech_committed", llm.ChatMessage.create(text="Call Colonel Rhodes", role="user"))
+    agent.emit("agent_started_speaking")
+    agent.emit("agent_speech_interrupted", llm.ChatMessage.create(text="Calling Colonel", role="assistant"))
+    agent.emit("user_speech_committed", SimpleNamespace(content=""))
+    await recorder.aclose()
+
+    session = await store.get_session("job-1")
+    assert session["ended_at"] is not None
+    assert [(t["role"], t["text"]) for t in session["turns"]] == [("user", "Call Colonel Rhodes"), ("assistant", "Calling Colonel")]
+    assert [s["session_id"] for s in await store.search("colonel rhodes")] == ["job-1"]
+
+@pytest.mark.asyncio
+async def test_failed_turn_writes_are_logged(store, caplog):
+    """A write that fails before aclose() is still reported."""
+    agent = FakeAgent()
+    recorder = TranscriptRecorder(store, "job-1", "u1", "room1")
+    recorder.attach(agent)
+    await recorder.start()
+    with patch.object(store, "add_turn", side_effect=RuntimeError("disk full")):
+        agent.emit("user_speech_committed", llm.ChatMessage.create(text="Call Colonel Rhodes", role="user"))
+        await asyncio.wait(set(recorder._writes))
+    await asyncio.sleep(0)
+    assert not recorder._writes
+    await recorder.aclose()
+    assert "Failed to store a transcript turn of job-1: disk full" in caplog.text
+
+@pytest.mark.asyncio
+async def test_search_and_transcript_endpoints(store):
+    """/transcripts/search returns matching sessions; /transcripts/{session_id} the full transcript or 404."""
+    await store.start_session("job-1", "u1", "room1", started_at=1000)
+    await store.add_turn("job-1", "user", "Run suit diagnostics", 1001, 1000)
+    with patch("main.transcript_store", store):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            search = await ac.get("/transcripts/search", params={"q": "diagnostic", "user_id": "u1"})
+            transcript = await ac.get("/transcripts/job-1")
+            missing = await ac.get("/transcripts/job-2")
+    assert search.status_code == 200
+    assert [s["session_id"] for s in search.json()["sessions"]] == ["job-1"]
+    assert transcript.json()["turns"] == [{"role": "user", "text": "Run suit diagnostics", "offset_ms": 1000}]
+    assert missing.status_code == 404
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from ttl_cache import TTLCache
+
+def test_lru_eviction_and_counters():
+    """Least recently used entries are evicted once the cache is full."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+def test_per_key_ttl(monkeypatch):
+    """Entries expire after their own TTL."""
+    now = [100.0]
+    monkeypatch.setattr("ttl_cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2)
+    now[0] += 10
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+def test_limit_ttl_caps_entries_for_a_window(monkeypatch):
+    """Within the window, the current and newly stored values expire after the short TTL; afterwards the normal TTL applies."""
+    now = [100.0]
+    monkeypatch.setattr("ttl_cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("u1", "before stop")
+    cache.limit_ttl("u1", ttl=5, window=120)
+    now[0] += 6
+    assert cache.get("u1") is None
+    cache.set("u1", "during upload")
+    now[0] += 6
+    assert cache.get("u1") is None
+    now[0] += 120
+    cache.set("u1", "after")
+    now[0] += 30
+    assert cache.get("u1") == "after"
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    """Concurrent misses for the same key await a single loader call."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return ["sessions/u1/a.mp4"]
+
+    results = await asyncio.gather(*(cache.get_or_load("u1", loader) for _ in range(10)))
+    assert calls == 1
+    assert all(r == ["sessions/u1/a.mp4"] for r in results)
+    assert await cache.get_or_load("u1", loader) == ["sessions/u1/a.mp4"]
+    assert calls == 1
+
+@pytest.mark.asyncio
+async def test_invalidate_during_load_skips_stale_result():
+    """A load that was invalidated while in flight is not cached."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        return "stale"
+
+    pending = asyncio.ensure_future(cache.get_or_load("u1", loader))
+    await asyncio.sleep(0)
+    cache.invalidate("u1")
+    release.set()
+    assert await pending == "stale"
+    assert cache.get("u1") is None
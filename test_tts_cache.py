@@ -0,0 +1,68 @@
+import os
+import stat
+import pytest
+from tts_cache import CachedTTS, TTSAudioCache
+from benchmarks.fake_providers import FakeTTS
+
+GREETING = "Hello, I'm FRIDAY. How may I assist you today?"
+
+async def _say(stream_tts, *segments) -> bytes:
+    stream = stream_tts.stream()
+    for segment in segments:
+        stream.push_text(segment)
+    stream.end_input()
+    pcm = b"".join([bytes(audio.frame.data.cast("B")) async for audio in stream])
+    await stream.aclose()
+    return pcm
+
+@pytest.mark.asyncio
+async def test_repeated_utterance_is_served_from_cache(tmp_path):
+    """The second say() of the same text replays the stored audio without calling the provider."""
+    provider = FakeTTS(latency=0)
+    cached_tts = CachedTTS(provider, TTSAudioCache(directory=str(tmp_path)), phrases=[GREETING])
+    first = await _say(cached_tts, GREETING)
+    assert provider.requests == 1
+    assert cached_tts.is_cached(GREETING)
+    assert await _say(cached_tts, GREETING) == first
+    assert provider.requests == 1
+
+@pytest.mark.asyncio
+async def test_disk_tier_is_shared_between_cache_instances(tmp_path):
+    """A cache opened on the same directory (another worker process) reads the mmap'd entry."""
+    await _say(CachedTTS(FakeTTS(latency=0), TTSAudioCache(directory=str(tmp_path)), phrases=[GREETING]), GREETING)
+    provider = FakeTTS(latency=0)
+    other = CachedTTS(provider, TTSAudioCache(directory=str(tmp_path)), phrases=[GREETING])
+    assert len(await _say(other, GREETING)) > 0
+    assert provider.requests == 0
+
+@pytest.mark.asyncio
+async def test_streamed_llm_output_is_not_cached(tmp_path):
+    """Text pushed token by token is synthesized by the provider and never stored."""
+    provider = FakeTTS(latency=0)
+    cached_tts = CachedTTS(provider, TTSAudioCache(directory=str(tmp_path)), phrases=[GREETING])
+    await _say(cached_tts, "Shall I ", "try Miss Potts?")
+    await _say(cached_tts, "Shall I ", "try Miss Potts?")
+    # a short reply pushed in one piece looks like say() but is not an allowlisted phrase
+    await _say(cached_tts, "Shall I try Miss Potts?")
+    assert provider.requests == 3
+    assert not cached_tts.is_cached("Shall I try Miss Potts?")
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_voice_is_part_of_the_key(tmp_path):
+    cache = TTSAudioCache(directory=str(tmp_path))
+    await _say(CachedTTS(FakeTTS(latency=0), cache, voice="a", phrases=[GREETING]), GREETING)
+    assert not CachedTTS(FakeTTS(latency=0), cache, voice="b", phrases=[GREETING]).is_cached(GREETING)
+
+def test_disk_tier_is_private_and_evicts_least_recently_used(tmp_path):
+    """The directory is created 0700 and the oldest entries go once max_bytes is exceeded."""
+    directory = tmp_path / "cache"
+    cache = TTSAudioCache(directory=str(directory), max_bytes=2500)
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    for i, key in enumerate(("a", "b")):
+        cache.put(key, b"\0" * 1000, 16000, 1)
+        os.utime(directory / f"{key}.pcm", (i, i))
+    assert cache._read("a") is not None
+    os.utime(directory / "a.pcm", (5, 5))  # a was used after b
+    cache.put("c", b"\0" * 1000, 16000, 1)
+    assert sorted(p.name for p in directory.iterdir()) == ["a.pcm", "c.pcm"]
@@ -0,0 +1,93 @@
+import io
+import asyncio
+import av
+import numpy as np
+import pytest
+from unittest.mock import patch, AsyncMock
+from httpx import AsyncClient, ASGITransport
+from livekit import api
+from waveform import WaveformProcessor, decode_peaks, encode_peaks, peaks_key
+from main import app
+
+def encode_recording(container_format: str, codec: str, seconds_loud: float = 1.0, seconds_quiet: float = 1.0) -> bytes:
+    """Mono recording: a 440Hz tone at 0.8 amplitude followed by silence."""
+    rate = 48000
+    t = np.arange(int((seconds_loud + seconds_quiet) * rate)) / rate
+    pcm = (np.where(t < seconds_loud, 0.8 * np.sin(2 * np.pi * 440 * t), 0) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with av.open(buffer, "w", format=container_format) as container:
+        stream = container.add_stream(codec, rate=rate)
+        stream.layout = "mono"
+        frame_size = 960
+        for i in range(0, pcm.size, frame_size):
+            frame = av.AudioFrame.from_ndarray(pcm[None, i:i + frame_size], format="s16", layout="mono")
+            frame.sample_rate = rate
+            frame.pts = i
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("container_format,codec,extension", [("ogg", "libopus", "ogg"), ("mp4", "aac", "mp4")])
+async def test_sidecar_is_generated_with_ranged_reads(s3_session, container_format, codec, extension):
+    """MP4 keeps its index at the end of the file, so the reader has to seek; both formats are read in small ranges."""
+    key = f"sessions/u1/recording_room_1.{extension}"
+    recording = encode_recording(container_format, codec)
+    await s3_session.put_object(key, recording)
+    processor = WaveformProcessor(s3_session, peaks_per_second=10, chunk_size=4096, wait_timeout=0)
+
+    summary = await processor.process(key)
+    assert summary["range_requests"] > 1
+    sidecar = decode_peaks(await s3_session.get_object(peaks_key(key)))
+    assert sidecar["duration"] == pytest.approx(2.0, abs=0.1)
+    peaks = np.array(sidecar["peaks"])
+    assert len(peaks) == pytest.approx(20, abs=2)
+    assert peaks[2:8, 1].min() > 80 and peaks[2:8, 0].max() < -80
+    assert np.abs(peaks[-5:]).max() < 5
+    assert summary["sidecar_bytes"] < len(recording) / 10
+
+@pytest.mark.asyncio
+async def test_missing_recording_is_skipped(s3_session):
+    processor = WaveformProcessor(s3_session, wait_timeout=0)
+    assert await processor.process("sessions/u1/never_uploaded.mp4") is None
+
+@pytest.mark.asyncio
+async def test_waiting_for_an_upload_does_not_block_other_recordings(s3_session):
+    """A recording that is still being uploaded waits outside the decode concurrency limit."""
+    processor = WaveformProcessor(s3_session, concurrency=1, wait_timeout=10, poll_interval=0.05)
+    pending = asyncio.create_task(processor.process("sessions/u1/recording_room_2.ogg"))
+    await s3_session.put_object("sessions/u1/recording_room_1.ogg", encode_recording("ogg", "libopus"))
+    assert (await asyncio.wait_for(processor.process("sessions/u1/recording_room_1.ogg"), timeout=5))["peaks"] > 0
+    await s3_session.put_object("sessions/u1/recording_room_2.ogg", encode_recording("ogg", "libopus"))
+    assert (await asyncio.wait_for(pending, timeout=5))["peaks"] > 0
+
+@pytest.mark.asyncio
+async def test_upload_notification_ends_the_wait_and_failed_egresses_are_skipped(s3_session):
+    """A recording_uploaded() call wakes the wait long before the next check; failed egresses start no wait."""
+    processor = WaveformProcessor(s3_session, wait_timeout=60, poll_interval=30)
+    processor.on_egress_stopped({"file_key": "sessions/u1/recording_room_3.ogg", "status": "EGRESS_FAILED"})
+    processor.on_egress_stopped({"file_key": "sessions/u1/recording_room_3.ogg", "status": api.EgressStatus.EGRESS_ABORTED})
+    assert not processor._tasks
+    pending = asyncio.create_task(processor.process("sessions/u1/recording_room_3.ogg"))
+    await asyncio.sleep(0.1)
+    await s3_session.put_object("sessions/u1/recording_room_3.ogg", encode_recording("ogg", "libopus"))
+    processor.recording_uploaded("sessions/u1/recording_room_3.ogg")
+    assert (await asyncio.wait_for(pending, timeout=5))["peaks"] > 0
+    assert processor._uploads == {}
+
+@pytest.mark.asyncio
+@patch("main.s3_manager", new_callable=AsyncMock)
+async def test_peaks_endpoint_serves_binary_and_json(mock_s3_manager):
+    sidecar = encode_peaks(1.5, 10, np.array([[-100, 100], [-3, 2]], dtype=np.int8))
+    mock_s3_manager.get_object.return_value = sidecar
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        binary = await ac.get("/recordings/peaks", params={"file_key": "sessions/u1/a.mp4"})
+        decoded = await ac.get("/recordings/peaks", params={"file_key": "sessions/u1/a.mp4", "format": "json"})
+        mock_s3_manager.get_object.return_value = None
+        missing = await ac.get("/recordings/peaks", params={"file_key": "sessions/u1/b.mp4"})
+    mock_s3_manager.get_object.assert_any_call("sessions/u1/a.mp4.peaks")
+    assert binary.content == sidecar
+    assert decoded.json() == {"duration": 1.5, "peaks_per_second": 10, "peaks": [[-100, 100], [-3, 2]]}
+    assert missing.status_code == 404
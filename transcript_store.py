@@ -0,0 +1,310 @@
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env.local")
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcript_sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    room_name TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    recording_key TEXT,
+    recording_user_id TEXT,
+    recording_started_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_sessions_user_id ON transcript_sessions (user_id);
+CREATE INDEX IF NOT EXISTS idx_transcript_sessions_recording_user_id ON transcript_sessions (recording_user_id);
+CREATE INDEX IF NOT EXISTS idx_transcript_sessions_room_name ON transcript_sessions (room_name, started_at);
+
+CREATE TABLE IF NOT EXISTS transcript_turns (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    spoken_at REAL NOT NULL,
+    offset_ms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_turns_session_id ON transcript_turns (session_id, offset_ms);
+
+CREATE TABLE IF NOT EXISTS transcript_recordings (
+    file_key TEXT PRIMARY KEY,
+    egress_id TEXT,
+    room_name TEXT NOT NULL,
+    user_id TEXT,
+    started_at REAL NOT NULL,
+    stopped_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_recordings_room_name ON transcript_recordings (room_name, started_at);
+CREATE INDEX IF NOT EXISTS idx_transcript_recordings_egress_id ON transcript_recordings (egress_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5(
+    text, content='transcript_turns', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS transcript_turns_ai AFTER INSERT ON transcript_turns BEGIN
+    INSERT INTO transcript_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS transcript_turns_ad AFTER DELETE ON transcript_turns BEGIN
+    INSERT INTO transcript_fts (transcript_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def fts_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query matching all words; a trailing * keeps prefix matching.
+    Quoting every word means punctuation and FTS operators in user input cannot break the query.
+    """
+    terms = []
+    for word in re.findall(r"[\w']+\*?", query):
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class TranscriptStore:
+    """
+    SQLite store of agent conversation transcripts with an FTS5 index over every turn.
+
+    The agent's job processes write sessions and turns; the API links recordings to the sessions of
+    the same room (from egress start/stop) and searches. Like the SQLite egress store it uses WAL
+    journaling and a busy timeout, so every process on the host can share one file.
+    """
+    def __init__(self, path: str = None):
+        # relative paths resolve against this directory, so the API and the agents open the same file
+        # whatever their working directory
+        self.path = os.path.join(BASE_DIR, path or os.getenv("TRANSCRIPT_DB_PATH", "transcripts.db"))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(SCHEMA)
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _start_session(self, session_id: str, user_id: str, room_name: str, started_at: float):
+        with self._lock:
+            # a recording of this room that is still running covers the new session
+            recording = self._conn.execute(
+                "SELECT file_key, user_id, started_at FROM transcript_recordings "
+                "WHERE room_name = ? AND stopped_at IS NULL ORDER BY started_at DESC LIMIT 1",
+                (room_name,),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcript_sessions "
+                "(session_id, user_id, room_name, started_at, recording_key, recording_user_id, recording_started_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, user_id, room_name, started_at,
+                 recording["file_key"] if recording else None,
+                 recording["user_id"] if recording else None,
+                 recording["started_at"] if recording else None),
+            )
+
+    async def start_session(self, session_id: str, user_id: str, room_name: str, started_at: float = None):
+        await asyncio.to_thread(self._start_session, session_id, user_id, room_name, started_at or time.time())
+
+    async def add_turn(self, session_id: str, role: str, text: str, spoken_at: float, session_started_at: float):
+        if not text.strip():
+            return
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO transcript_turns (session_id, role, text, spoken_at, offset_ms) VALUES (?, ?, ?, ?, ?)",
+            (session_id, role, text.strip(), spoken_at, max(0, round((spoken_at - session_started_at) * 1000))),
+        )
+
+    async def end_session(self, session_id: str, ended_at: float = None):
+        await asyncio.to_thread(
+            self._execute, "UPDATE transcript_sessions SET ended_at = ? WHERE session_id = ?", (ended_at or time.time(), session_id)
+        )
+
+    def _link_recording(self, file_key: str, egress_id: str, room_name: str, user_id: str, started_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcript_recordings (file_key, egress_id, room_name, user_id, started_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_key, egress_id, room_name, user_id, started_at),
+            )
+            self._conn.execute(
+                "UPDATE transcript_sessions SET recording_key = ?, recording_user_id = ?, recording_started_at = ? "
+                "WHERE room_name = ? AND (ended_at IS NULL OR ended_at >= ?)",
+                (file_key, user_id, started_at, room_name, started_at),
+            )
+
+    async def link_recording(self, info: dict):
+        """
+        EgressSession start listener: attach the recording to sessions of its room that are still going.
+        """
+        if not info.get("file_key"):
+            return
+        await asyncio.to_thread(
+            self._link_recording, info["file_key"], info.get("egress_id"), info["room_name"], info.get("user_id"),
+            info.get("started_at") or time.time(),
+        )
+
+    async def recording_stopped(self, info: dict):
+        """
+        EgressSession stop listener: sessions starting later in the room are no longer covered by the recording.
+        """
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE transcript_recordings SET stopped_at = ? WHERE egress_id = ?",
+            (info.get("stopped_at") or time.time(), info.get("egress_id")),
+        )
+
+    def _search(self, query: str, user_id: Optional[str], room_name: Optional[str], limit: int, turns_per_session: int) -> list:
+        match = fts_query(query)
+        if not match:
+            return []
+        filters, params = [], []
+        if user_id is not None:
+            filters.append("(s.user_id = ? OR s.recording_user_id = ?)")
+            params.extend([user_id, user_id])
+        if room_name is not None:
+            filters.append("s.room_name = ?")
+            params.append(room_name)
+        columns = (
+            "t.id, t.role, t.spoken_at, t.offset_ms, s.session_id, s.user_id, s.room_name, s.started_at, s.ended_at, "
+            "s.recording_key, s.recording_started_at"
+        )
+        # sessions join the matching turns only when a filter needs their columns
+        join = "JOIN transcript_sessions s ON s.session_id = t.session_id " if filters else ""
+        where = "".join(f" AND {f}" for f in filters)
+        # Sessions are ranked by their best turn (bm25 is lower for better matches) in SQL, so `limit`
+        # sessions come back however the matching turns are spread over them; only their top turns
+        # are ranked and joined. MATERIALIZED keeps bm25() inside the query that runs the MATCH.
+        rows = self._execute(
+            "WITH hits AS MATERIALIZED (SELECT t.id, t.session_id, bm25(transcript_fts) AS score FROM transcript_fts "
+            f"JOIN transcript_turns t ON t.id = transcript_fts.rowid {join}WHERE transcript_fts MATCH ?{where}), "
+            "best AS MATERIALIZED (SELECT session_id, MIN(score) AS score FROM hits "
+            "GROUP BY session_id ORDER BY score, session_id LIMIT ?), "
+            "ranked AS MATERIALIZED (SELECT id, session_id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY score, id) "
+            "AS turn_rank FROM hits WHERE session_id IN (SELECT session_id FROM best)) "
+            f"SELECT {columns} FROM best JOIN ranked r ON r.session_id = best.session_id AND r.turn_rank <= ? "
+            "JOIN transcript_turns t ON t.id = r.id JOIN transcript_sessions s ON s.session_id = r.session_id "
+            "ORDER BY best.score, best.session_id, r.turn_rank",
+            (match, *params, limit, turns_per_session),
+        )
+
+        sessions = {}
+        for row in rows:
+            session = sessions.get(row["session_id"])
+            if session is None:
+                session = sessions[row["session_id"]] = {
+                    "session_id": row["session_id"],
+                    "user_id": row["user_id"],
+                    "room_name": row["room_name"],
+                    "started_at": row["started_at"],
+                    "ended_at": row["ended_at"],
+                    "recording_key": row["recording_key"],
+                    "matches": [],
+                }
+            recording_offset = None
+            if row["recording_started_at"] is not None and row["spoken_at"] >= row["recording_started_at"]:
+                recording_offset = round((row["spoken_at"] - row["recording_started_at"]) * 1000)
+            session["matches"].append({
+                "turn_id": row["id"],
+                "role": row["role"],
+                "offset_ms": row["offset_ms"],
+                "recording_offset_ms": recording_offset,
+            })
+
+        # snippets only for the turns returned; computing them for every match dominates common-word queries
+        matches = [m for session in sessions.values() for m in session["matches"]]
+        if matches:
+            snippets = dict(self._execute(
+                "SELECT rowid, snippet(transcript_fts, 0, '[', ']', '...', 12) FROM transcript_fts "
+                f"WHERE transcript_fts MATCH ? AND rowid IN ({', '.join('?' * len(matches))})",
+                (match, *(m["turn_id"] for m in matches)),
+            ))
+            for m in matches:
+                m["snippet"] = snippets.get(m.pop("turn_id"))
+        return list(sessions.values())
+
+    async def search(self, query: str, user_id: str = None, room_name: str = None, limit: int = 20, turns_per_session: int = 3) -> list:
+        """
+        Sessions whose transcript matches every word of `query`, best match first, each with its best matching turns.
+        """
+        return await asyncio.to_thread(self._search, query, user_id, room_name, limit, turns_per_session)
+
+    async def get_session(self, session_id: str) -> Optional[dict]:
+        rows = await asyncio.to_thread(self._execute, "SELECT * FROM transcript_sessions WHERE session_id = ?", (session_id,))
+        if not rows:
+            return None
+        turns = await asyncio.to_thread(
+            self._execute,
+            "SELECT role, text, offset_ms FROM transcript_turns WHERE session_id = ? ORDER BY offset_ms, id",
+            (session_id,),
+        )
+        session = dict(rows[0])
+        session.pop("recording_user_id")
+        session["turns"] = [dict(turn) for turn in turns]
+        return session
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TranscriptRecorder:
+    """
+    Writes the turns of one VoicePipelineAgent session to a TranscriptStore as they are committed.
+
+    Turns are timestamped when the user or agent started speaking, not when the text was committed.
+    """
+    def __init__(self, store: TranscriptStore, session_id: str, user_id: str, room_name: str):
+        self.store = store
+        self.session_id = session_id
+        self.user_id = user_id
+        self.room_name = room_name
+        self.started_at = time.time()
+        self._user_started = None
+        self._agent_started = None
+        self._writes = set()
+
+    async def start(self):
+        await self.store.start_session(self.session_id, self.user_id, self.room_name, self.started_at)
+
+    def attach(self, agent):
+        agent.on("user_started_speaking", lambda *_: setattr(self, "_user_started", self._user_started or time.time()))
+        agent.on("agent_started_speaking", lambda *_: setattr(self, "_agent_started", time.time()))
+        agent.on("user_speech_committed", lambda msg: self._record("user", msg))
+        agent.on("agent_speech_committed", lambda msg: self._record("assistant", msg))
+        agent.on("agent_speech_interrupted", lambda msg: self._record("assistant", msg))
+
+    def _record(self, role: str, msg):
+        text = msg.content if isinstance(msg.content, str) else " ".join(p for p in msg.content or [] if isinstance(p, str))
+        if role == "user":
+            spoken_at, self._user_started = self._user_started or time.time(), None
+        else:
+            spoken_at, self._agent_started = self._agent_started or time.time(), None
+        task = asyncio.create_task(self.store.add_turn(self.session_id, role, text, spoken_at, self.started_at))
+        self._writes.add(task)
+        task.add_done_callback(self._write_done)
+
+    def _write_done(self, task: asyncio.Task):
+        self._writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to store a transcript turn of %s: %s", self.session_id, task.exception())
+
+    async def aclose(self):
+        # failures are logged by _write_done
+        await asyncio.gather(*self._writes, return_exceptions=True)
+        await self.store.end_session(self.session_id)
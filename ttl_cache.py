@@ -0,0 +1,133 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-key TTL and LRU eviction.
+
+    get_or_load() lets concurrent misses for the same key share a single load
+    instead of each hitting the backend.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: dict = {}
+        self._limits: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, or default if it is missing or expired.
+        """
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Store value under key for ttl seconds (defaults to the cache TTL), evicting the least recently used entry when full.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        limit = self._limits.get(key)
+        if limit is not None:
+            until, limit_ttl = limit
+            if until > time.monotonic():
+                ttl = min(ttl, limit_ttl)
+            else:
+                del self._limits[key]
+        if ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """
+        Drop key and detach any in-flight load so its result is not cached.
+        """
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def limit_ttl(self, key: Hashable, ttl: float, window: float):
+        """
+        For the next `window` seconds, keep key for at most ttl seconds, including the value cached now.
+        """
+        now = time.monotonic()
+        self._limits = {k: limit for k, limit in self._limits.items() if limit[0] > now}
+        self._limits[key] = (now + window, ttl)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now + ttl:
+            self._entries[key] = (now + ttl, entry[1])
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+        self._limits.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """
+        Return the cached value for key, awaiting loader() on a miss.
+
+        Concurrent callers missing on the same key await the same load.
+        """
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_loaded(key, t, ttl))
+        return await asyncio.shield(task)
+
+    def _on_loaded(self, key: Hashable, task: asyncio.Future, ttl: Optional[float]):
+        if self._inflight.get(key) is not task:
+            if not task.cancelled():
+                task.exception()
+            return
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.set(key, task.result(), ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
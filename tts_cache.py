@@ -0,0 +1,314 @@
+import os
+import mmap
+import struct
+import asyncio
+import hashlib
+import logging
+import tempfile
+import dataclasses
+from typing import Iterable, Optional
+from livekit import rtc
+from livekit.agents import tts, utils, APIConnectOptions, DEFAULT_API_CONNECT_OPTIONS
+from ttl_cache import TTLCache
+from prometheus_metrics import AGENT_TTS_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# On-disk entry: header followed by raw interleaved int16 PCM.
+_HEADER = struct.Struct("<4sHIH")
+_MAGIC = b"JTTS"
+_VERSION = 1
+
+
+def voice_id(provider_tts: tts.TTS) -> str:
+    """
+    Describe the voice settings of a TTS instance; anything that changes the rendered audio belongs here.
+    """
+    opts = getattr(provider_tts, "_opts", None)
+    fields = [provider_tts.label]
+    for name in ("model", "voice", "language", "speed", "emotion", "encoding"):
+        if hasattr(opts, name):
+            fields.append(f"{name}={getattr(opts, name)!r}")
+    return ";".join(fields)
+
+
+def cache_key(text: str, voice: str, sample_rate: int, num_channels: int) -> str:
+    digest = hashlib.sha256()
+    for part in (text.strip(), voice, str(sample_rate), str(num_channels)):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CachedAudio:
+    """
+    Synthesized PCM for one utterance; `pcm` is bytes or a read-only mmap of the disk entry.
+    """
+    def __init__(self, pcm, sample_rate: int, num_channels: int):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+
+    def frames(self, frame_ms: int = 100):
+        """
+        Split the PCM into AudioFrames of frame_ms milliseconds.
+        """
+        samples = self.sample_rate * frame_ms // 1000
+        step = samples * self.num_channels * 2
+        view = memoryview(self.pcm)
+        try:
+            for offset in range(0, len(view), step):
+                chunk = view[offset:offset + step]
+                yield rtc.AudioFrame(
+                    data=bytes(chunk),
+                    sample_rate=self.sample_rate,
+                    num_channels=self.num_channels,
+                    samples_per_channel=len(chunk) // (2 * self.num_channels),
+                )
+                chunk.release()
+        finally:
+            view.release()
+
+
+class TTSAudioCache:
+    """
+    Two-tier cache of synthesized utterances.
+
+    The memory tier is an LRU of the most recently used entries. The disk tier stores raw PCM files
+    under `directory`; they are read through mmap so every worker process on the host shares
+    the same page-cache copy. Entries are written to a temp file and renamed into place, so
+    processes can fill the cache concurrently. The directory is private to the user (0700) and
+    the least recently used files are evicted once it holds more than `max_bytes`.
+    """
+    def __init__(self, directory: Optional[str] = None, memory_size: int = None, max_bytes: int = None):
+        self.directory = directory if directory is not None else os.getenv(
+            "TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jarvis-tts-cache")
+        )
+        self.max_bytes = max_bytes or int(os.getenv("TTS_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        self.memory = TTLCache(
+            maxsize=memory_size or int(os.getenv("TTS_CACHE_MEMORY_SIZE", 64)),
+            ttl=float(os.getenv("TTS_CACHE_MEMORY_TTL", 86400)),
+        )
+        if self.directory:
+            self._open_directory()
+
+    def _open_directory(self):
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            info = os.stat(self.directory)
+            if info.st_uid != os.getuid():
+                raise PermissionError(f"owned by uid {info.st_uid}")
+            if info.st_mode & 0o077:
+                os.chmod(self.directory, 0o700)
+        except OSError as e:
+            # a directory another user controls could serve or read our audio; keep to the memory tier
+            logger.error("TTS disk cache disabled, cannot use %s: %s", self.directory, e)
+            self.directory = ""
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, key: str) -> Optional[CachedAudio]:
+        """
+        Return the cached audio for key from memory or disk, or None.
+        """
+        audio = self.memory.get(key)
+        if audio is not None:
+            AGENT_TTS_CACHE_LOOKUPS.labels("memory").inc()
+            return audio
+        audio = self._read(key) if self.directory else None
+        if audio is None:
+            AGENT_TTS_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+        AGENT_TTS_CACHE_LOOKUPS.labels("disk").inc()
+        try:
+            # the modification time orders eviction, so a hit marks the entry as recently used
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        self.memory.set(key, audio)
+        return audio
+
+    def contains(self, key: str) -> bool:
+        found, _ = self.memory._lookup(key)
+        return found or (bool(self.directory) and os.path.exists(self._path(key)))
+
+    def _read(self, key: str) -> Optional[CachedAudio]:
+        try:
+            with open(self._path(key), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            magic, version, sample_rate, num_channels = _HEADER.unpack_from(mapped)
+        except struct.error:
+            magic = None
+        if magic != _MAGIC or version != _VERSION:
+            logger.warning("Ignoring invalid TTS cache entry %s", key)
+            mapped.close()
+            return None
+        pcm = memoryview(mapped)[_HEADER.size:]
+        return CachedAudio(pcm, sample_rate, num_channels)
+
+    def put(self, key: str, pcm: bytes, sample_rate: int, num_channels: int) -> CachedAudio:
+        """
+        Store PCM for key in both tiers and return the cached entry.
+        """
+        audio = CachedAudio(pcm, sample_rate, num_channels)
+        self.memory.set(key, audio)
+        if self.directory:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, _VERSION, sample_rate, num_channels))
+                    f.write(pcm)
+                os.replace(tmp_path, self._path(key))
+                self._evict()
+            except OSError as e:
+                logger.error("Failed to write TTS cache entry %s: %s", key, e)
+        return audio
+
+    def _evict(self):
+        """
+        Delete the least recently used disk entries until the tier fits in max_bytes.
+        """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".pcm"):
+                    continue
+                try:
+                    info = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                # processes that mapped the file keep reading it until they unmap
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class CachedTTS(tts.TTS):
+    """
+    Wraps a streaming TTS and replays cached audio for utterances it has synthesized before.
+
+    Only `phrases`, the fixed utterances the agent says verbatim such as the greeting, are looked
+    up and stored, and only when a stream's whole input is that one text push. Anything else,
+    LLM replies included, passes straight through and is never written to the cache.
+    """
+    def __init__(self, provider: tts.TTS, cache: TTSAudioCache = None, voice: str = None,
+                 phrases: Iterable[str] = ()):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=True),
+            sample_rate=provider.sample_rate,
+            num_channels=provider.num_channels,
+        )
+        self.provider = provider
+        self.cache = cache or TTSAudioCache()
+        self.voice = voice or voice_id(provider)
+        self.phrases = frozenset(phrase.strip() for phrase in phrases)
+        # keep the provider's label so TTS metrics stay comparable
+        self._label = provider.label
+
+    def key(self, text: str) -> str:
+        return cache_key(text, self.voice, self.sample_rate, self.num_channels)
+
+    def cacheable(self, text) -> bool:
+        return isinstance(text, str) and text.strip() in self.phrases
+
+    def is_cached(self, text: str) -> bool:
+        return self.cache.contains(self.key(text))
+
+    def synthesize(self, text: str, *, conn_options: Optional[APIConnectOptions] = None) -> tts.ChunkedStream:
+        return self.provider.synthesize(text, conn_options=conn_options)
+
+    def stream(self, *, conn_options: Optional[APIConnectOptions] = None) -> "CachedSynthesizeStream":
+        return CachedSynthesizeStream(tts=self, conn_options=conn_options)
+
+    def prewarm(self) -> None:
+        self.provider.prewarm()
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+
+class CachedSynthesizeStream(tts.SynthesizeStream):
+    def __init__(self, *, tts: CachedTTS, conn_options: Optional[APIConnectOptions] = None):
+        # retries are left to the provider stream, the input consumed by _run cannot be replayed
+        self._provider_conn_options = conn_options or DEFAULT_API_CONNECT_OPTIONS
+        super().__init__(tts=tts, conn_options=dataclasses.replace(self._provider_conn_options, max_retry=0))
+        self._cached_tts = tts
+
+    async def _run(self) -> None:
+        cached_tts = self._cached_tts
+        items = []
+        cached = None
+        # Hold input only while it can still be a single cached utterance; a miss starts synthesis at once.
+        async for item in self._input_ch:
+            items.append(item)
+            if len(items) == 1:
+                self._mark_started()
+                if not cached_tts.cacheable(item):
+                    break
+                cached = cached_tts.cache.get(cached_tts.key(item))
+                if cached is None:
+                    break
+            elif len(items) > 2 or not isinstance(item, self._FlushSentinel):
+                break
+        else:
+            if cached is not None and len(items) == 2:
+                self._replay(cached)
+                return
+        await self._synthesize(items)
+
+    def _replay(self, cached: CachedAudio) -> None:
+        request_id = utils.shortuuid()
+        frames = list(cached.frames())
+        for i, frame in enumerate(frames):
+            self._event_ch.send_nowait(
+                tts.SynthesizedAudio(request_id=request_id, frame=frame, is_final=i == len(frames) - 1)
+            )
+
+    async def _synthesize(self, items: list) -> None:
+        cached_tts = self._cached_tts
+        provider_stream = cached_tts.provider.stream(conn_options=self._provider_conn_options)
+        pushed = []
+
+        async def forward_input():
+            for item in items:
+                pushed.append(item)
+                self._push(provider_stream, item)
+            async for item in self._input_ch:
+                pushed.append(item)
+                self._push(provider_stream, item)
+            provider_stream.end_input()
+
+        forward_task = asyncio.create_task(forward_input())
+        pcm = bytearray()
+        sample_rate, num_channels = cached_tts.sample_rate, cached_tts.num_channels
+        try:
+            async for audio in provider_stream:
+                sample_rate, num_channels = audio.frame.sample_rate, audio.frame.num_channels
+                pcm += audio.frame.data.cast("B")
+                self._event_ch.send_nowait(audio)
+            await forward_task
+        finally:
+            await utils.aio.gracefully_cancel(forward_task)
+            await provider_stream.aclose()
+
+        texts = [item for item in pushed if isinstance(item, str)]
+        if len(texts) == 1 and len(pushed) == 2 and pcm and cached_tts.cacheable(texts[0]):
+            cached_tts.cache.put(cached_tts.key(texts[0]), bytes(pcm), sample_rate, num_channels)
+            logger.info("Cached synthesized audio for %r", texts[0][:40])
+
+    def _push(self, provider_stream: tts.SynthesizeStream, item) -> None:
+        if isinstance(item, self._FlushSentinel):
+            provider_stream.flush()
+        else:
+            provider_stream.push_text(item)
@@ -0,0 +1,261 @@
+import io
+import os
+import time
+import struct
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+import av
+import numpy as np
+from livekit import api
+
+logger = logging.getLogger(__name__)
+
+PEAKS_SUFFIX = ".peaks"
+PEAKS_MAGIC = b"JPKS"
+PEAKS_VERSION = 1
+# magic, version, duration in seconds, peaks per second, number of peaks; then one int8 (min, max) pair per peak
+PEAKS_HEADER = struct.Struct("<4sHfHI")
+DECODE_RATE = 8000
+# stopped egresses that recorded something and upload (or have uploaded) it
+UPLOADING_STATUSES = ("EGRESS_ACTIVE", "EGRESS_ENDING", "EGRESS_COMPLETE", "EGRESS_LIMIT_REACHED")
+MAX_POLL_INTERVAL = 60
+
+
+def peaks_key(recording_key: str) -> str:
+    """
+    Key of the peaks sidecar stored next to a recording.
+    """
+    return recording_key + PEAKS_SUFFIX
+
+
+def encode_peaks(duration: float, peaks_per_second: int, peaks: np.ndarray) -> bytes:
+    peaks = np.asarray(peaks, dtype=np.int8).reshape(-1, 2)
+    return PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, duration, peaks_per_second, len(peaks)) + peaks.tobytes()
+
+
+def decode_peaks(data: bytes) -> dict:
+    """
+    Parse a sidecar into duration, peaks_per_second and a list of [min, max] pairs scaled to -128..127.
+    """
+    if len(data) < PEAKS_HEADER.size:
+        raise ValueError("Truncated peaks sidecar")
+    magic, version, duration, peaks_per_second, count = PEAKS_HEADER.unpack_from(data)
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+        raise ValueError("Not a peaks sidecar")
+    peaks = np.frombuffer(data, dtype=np.int8, count=count * 2, offset=PEAKS_HEADER.size).reshape(-1, 2)
+    return {"duration": round(duration, 3), "peaks_per_second": peaks_per_second, "peaks": peaks.tolist()}
+
+
+class PeakAccumulator:
+    """
+    Reduces a stream of mono float samples to the min and max of every 1/peaks_per_second window.
+    """
+    def __init__(self, sample_rate: int, peaks_per_second: int):
+        self.window = max(1, sample_rate // peaks_per_second)
+        self.samples = 0
+        self._pending = np.empty(0, dtype=np.float32)
+        self._mins = []
+        self._maxs = []
+
+    def add(self, samples: np.ndarray):
+        self.samples += samples.size
+        data = np.concatenate([self._pending, samples.astype(np.float32, copy=False)])
+        full = data.size - data.size % self.window
+        if full:
+            windows = data[:full].reshape(-1, self.window)
+            self._mins.append(windows.min(axis=1))
+            self._maxs.append(windows.max(axis=1))
+        self._pending = data[full:]
+
+    def finish(self) -> np.ndarray:
+        if self._pending.size:
+            self._mins.append(self._pending.min(keepdims=True))
+            self._maxs.append(self._pending.max(keepdims=True))
+            self._pending = np.empty(0, dtype=np.float32)
+        if not self._mins:
+            return np.empty((0, 2), dtype=np.int8)
+        peaks = np.stack([np.concatenate(self._mins), np.concatenate(self._maxs)], axis=1)
+        return np.clip(np.round(peaks * 127), -128, 127).astype(np.int8)
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable read-only file over an S3 object, fetched in `chunk_size` ranged GETs.
+
+    Used from a worker thread: each read hands the GET to the S3 session's event loop and waits for it.
+    The last few chunks are kept so demuxers that seek back and forth do not refetch them.
+    """
+    def __init__(self, s3_session, file_key: str, size: int, loop: asyncio.AbstractEventLoop,
+                 chunk_size: int = 1024 * 1024, cached_chunks: int = 4):
+        super().__init__()
+        self.s3_session = s3_session
+        self.file_key = file_key
+        self.size = size
+        self.chunk_size = chunk_size
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._loop = loop
+        self._position = 0
+        self._chunks = OrderedDict()
+        self._cached_chunks = cached_chunks
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def _chunk(self, index: int) -> bytes:
+        chunk = self._chunks.get(index)
+        if chunk is not None:
+            self._chunks.move_to_end(index)
+            return chunk
+        start = index * self.chunk_size
+        end = min(self.size, start + self.chunk_size) - 1
+        chunk = asyncio.run_coroutine_threadsafe(self.s3_session.read_range(self.file_key, start, end), self._loop).result()
+        self.requests += 1
+        self.bytes_fetched += len(chunk)
+        self._chunks[index] = chunk
+        if len(self._chunks) > self._cached_chunks:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self.size:
+            return 0
+        index, offset = divmod(self._position, self.chunk_size)
+        data = self._chunk(index)[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def compute_peaks(fileobj, peaks_per_second: int) -> tuple:
+    """
+    Decode the first audio stream of a recording and return (duration in seconds, int8 peak pairs).
+    """
+    with av.open(fileobj, mode="r") as container:
+        stream = next((s for s in container.streams if s.type == "audio"), None)
+        if stream is None:
+            raise ValueError("Recording has no audio stream")
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=DECODE_RATE)
+        accumulator = PeakAccumulator(DECODE_RATE, peaks_per_second)
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                accumulator.add(resampled.to_ndarray().reshape(-1))
+        for resampled in resampler.resample(None):
+            accumulator.add(resampled.to_ndarray().reshape(-1))
+    return accumulator.samples / DECODE_RATE, accumulator.finish()
+
+
+class WaveformProcessor:
+    """
+    Writes a duration and waveform peaks sidecar next to each recording once its egress is stopped.
+
+    Register on_egress_stopped as an EgressSession stop listener; failed or aborted egresses are skipped.
+    Egress uploads the file after the stop, so the processor waits for it for up to `wait_timeout`
+    seconds: recording_uploaded() (S3 notifications, completed egress webhooks) ends the wait, and
+    otherwise the object is checked after `poll_interval` seconds, then at doubling intervals. The
+    recording is then decoded from S3 with ranged reads (never holding the whole recording) into
+    sessions/{user_id}/<recording>.peaks. Only the decode counts against `concurrency`; recordings
+    still being uploaded wait outside it.
+    """
+    def __init__(self, s3_session, peaks_per_second: int = None, chunk_size: int = None, concurrency: int = None,
+                 wait_timeout: float = None, poll_interval: float = None):
+        self.s3_session = s3_session
+        self.peaks_per_second = peaks_per_second or int(os.getenv("WAVEFORM_PEAKS_PER_SECOND", 10))
+        self.chunk_size = chunk_size or int(os.getenv("WAVEFORM_READ_CHUNK", 1024 * 1024))
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(os.getenv("WAVEFORM_WAIT_TIMEOUT", 300))
+        self.poll_interval = poll_interval or float(os.getenv("WAVEFORM_POLL_INTERVAL", 2))
+        self._semaphore = asyncio.Semaphore(concurrency or int(os.getenv("WAVEFORM_CONCURRENCY", 2)))
+        self._tasks = set()
+        self._uploads = {}
+
+    def on_egress_stopped(self, info: dict):
+        file_key = info.get("file_key")
+        status = info.get("status")
+        # stop_egress() reports the status as a number, webhooks by name
+        if isinstance(status, int):
+            status = api.EgressStatus.Name(status)
+        # segmented (hls) recordings have no single file to decode
+        if not file_key or file_key.endswith(".m3u8") or status not in UPLOADING_STATUSES:
+            return
+        task = asyncio.create_task(self._process_logged(file_key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process_logged(self, file_key: str):
+        try:
+            await self.process(file_key)
+        except Exception as e:
+            logger.error("Failed to generate waveform peaks for %s: %s", file_key, e)
+
+    def recording_uploaded(self, file_key: str):
+        """
+        Wake the wait for a recording that has just been written to the bucket.
+        """
+        uploaded = self._uploads.get(file_key)
+        if uploaded is not None:
+            uploaded.set()
+
+    async def _wait_for_object(self, file_key: str) -> Optional[dict]:
+        deadline = time.monotonic() + self.wait_timeout
+        interval = self.poll_interval
+        uploaded = self._uploads.setdefault(file_key, asyncio.Event())
+        try:
+            while True:
+                head = await self.s3_session.head_object(file_key)
+                remaining = deadline - time.monotonic()
+                if head is not None or remaining <= 0:
+                    return head
+                try:
+                    await asyncio.wait_for(uploaded.wait(), min(interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                uploaded.clear()
+                interval = min(interval * 2, MAX_POLL_INTERVAL)
+        finally:
+            self._uploads.pop(file_key, None)
+
+    async def process(self, file_key: str) -> Optional[dict]:
+        """
+        Generate and upload the sidecar of one recording. Returns a summary, or None if the recording never appeared.
+        """
+        head = await self._wait_for_object(file_key)
+        if head is None:
+            logger.warning("Recording %s did not appear within %ss; no waveform generated", file_key, self.wait_timeout)
+            return None
+        async with self._semaphore:
+            started = time.perf_counter()
+            reader = S3RangeReader(self.s3_session, file_key, head["size"], asyncio.get_running_loop(), self.chunk_size)
+            duration, peaks = await asyncio.to_thread(compute_peaks, reader, self.peaks_per_second)
+            sidecar = encode_peaks(duration, self.peaks_per_second, peaks)
+            await self.s3_session.put_object(peaks_key(file_key), sidecar)
+            summary = {
+                "file_key": file_key,
+                "sidecar_key": peaks_key(file_key),
+                "duration": round(duration, 3),
+                "peaks": len(peaks),
+                "sidecar_bytes": len(sidecar),
+                "recording_bytes": head["size"],
+                "range_requests": reader.requests,
+                "bytes_fetched": reader.bytes_fetched,
+                "elapsed": round(time.perf_counter() - started, 3),
+            }
+            logger.info("Waveform peaks written for %s: %s", file_key, summary)
+            return summary
+
+    async def aclose(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)